@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+'''
+Extend the parameter samples to the number given on the command line,
+keeping the existing samples, then solve only the new samples with
+:mod:`run_samples`.
+'''
+
+import sys
+
+import model
+import run_samples
+
+
+def _main(nsamples):
+    model.parameters.extend_samples(nsamples)
+    run_samples._main()
+
+
+if __name__ == '__main__':
+    _main(int(sys.argv[1]))
@@ -0,0 +1,26 @@
+#!/usr/bin/python3
+'''
+Fit :class:`model.emulator.Emulator` to the vaccine sweep
+from ``run_vaccine_sweep.py`` and show its estimated errors.
+'''
+
+import numpy
+
+import model
+
+
+def _main():
+    sweep = model.vaccine_sweep.Sweep.load()
+    emulator = model.emulator.Emulator(sweep, seed = 1)
+    emulator.dump()
+    print('Root-mean-square error relative to the baseline:')
+    for (k, outcome) in enumerate(emulator.outcomes):
+        for (l, year) in enumerate(emulator.years):
+            print('{} in {}: median {:g}, max {:g}.'.format(
+                outcome, year,
+                numpy.median(emulator.error[:, k, l]),
+                numpy.max(emulator.error[:, k, l])))
+
+
+if __name__ == '__main__':
+    _main()
@@ -2,6 +2,8 @@
 ODEs representing the HIV model.
 '''
 
+import functools
+import time
 import warnings
 
 import numpy
@@ -9,6 +11,8 @@ from scipy import integrate
 import pandas
 
 from . import control_rates
+from . import exponential_integrator
+from . import sliding_mode
 
 
 variables = (
@@ -48,48 +52,88 @@ def get_infected(state):
 vars_log = [0, 3, 4, 5, 6, 7]
 # Variables to not log transform: Q, A, Z, R
 vars_nonlog = [1, 2, 8, 9]
+# The same as slices, which index without making copies.
+_slices_log = (slice(0, 1), slice(3, 8))
+_slices_nonlog = (slice(1, 3), slice(8, 10))
 
 
-def transform(state, _log0 = -20):
+def transform(state, out = None, _log0 = -20):
     '''
     Log transform some of the state variables.
+
+    The result is put in `out` if it is given,
+    which can be `state` itself.
+    '''
+    if out is None:
+        out = numpy.empty(numpy.shape(state))
+    for s in _slices_log:
+        # Non-positive and NaN values get `_log0`.
+        invalid = ~ (state[..., s] > 0)
+        with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+            numpy.log(state[..., s], out = out[..., s])
+        out[..., s][invalid] = _log0
+    for s in _slices_nonlog:
+        out[..., s] = state[..., s]
+    return out
+
+
+def transform_inv(state_trans, out = None):
+    '''
+    Inverse log transform some of the state variables.
+
+    The result is put in `out` if it is given,
+    which can be `state_trans` itself.
     '''
-    state_trans = numpy.empty(numpy.shape(state))
-    state_trans[..., vars_log] = numpy.ma.log(state[..., vars_log]).filled(
-        _log0)
-    state_trans[..., vars_nonlog] = state[..., vars_nonlog]
-    return state_trans
+    if out is None:
+        out = numpy.empty(numpy.shape(state_trans))
+    for s in _slices_log:
+        numpy.exp(state_trans[..., s], out = out[..., s])
+    for s in _slices_nonlog:
+        out[..., s] = state_trans[..., s]
+    return out
 
 
-def transform_inv(state_trans):
+def _put(dstate, out):
     '''
-    Inverse log transform some of the state variables.
+    Return the derivatives `dstate` as a list,
+    or put them in `out` if it is given.
     '''
-    state = numpy.empty(numpy.shape(state_trans))
-    state[..., vars_log] = numpy.exp(state_trans[..., vars_log])
-    state[..., vars_nonlog] = state_trans[..., vars_nonlog]
-    return state
+    if out is None:
+        return list(dstate)
+    for (i, d) in enumerate(dstate):
+        out[i] = d
+    return out
 
 
 def split_state(state):
     if isinstance(state, (pandas.Series, pandas.DataFrame)):
         state = state.values
-    return map(numpy.squeeze, numpy.split(state, state.shape[-1], -1))
+    # Views of the last axis, not copies.
+    return numpy.moveaxis(state, -1, 0)
 
 
-def rhs(t, state, target, parameters, vaccine_efficacy):
+def rhs(t, state, target, parameters, vaccine_efficacy,
+        controls = None, out = None):
+    '''
+    The derivatives of the state variables,
+    put in `out` if it is given.
+    '''
     # Force the state variables to be non-negative.
     # The last two state variables, dead from AIDS and new infections,
     # are cumulative numbers that are set to 0 at t = 0: these
     # can be negative if time goes backwards.
-    state[ : -2] = state[ : - 2].clip(0, numpy.inf)
+    numpy.maximum(state[ : -2], 0, out = state[ : -2])
 
     S, Q, A, U, D, T, V, W, Z, R = state
 
     # Total sexually active population.
     N = S + Q + A + U + D + T + V
 
-    control_rates_ =  control_rates.get(t, state, target, parameters)
+    if controls is None:
+        controls = control_rates.get_array
+    # The control rates in the order of `control_rates.names`.
+    (diagnosis, treatment, nonadherence, vaccination) = controls(
+        t, state, target, parameters)
 
     force_of_infection = (
         parameters.transmission_rate_acute * A
@@ -97,11 +141,11 @@ def rhs(t, state, target, parameters, vaccine_efficacy):
         + parameters.transmission_rate_suppressed * V) / N
 
     dS = (parameters.birth_rate * N
-          - control_rates_.vaccination * S
+          - vaccination * S
           - force_of_infection * S
           - parameters.death_rate * S)
 
-    dQ = (control_rates_.vaccination * S
+    dQ = (vaccination * S
           - (1 - vaccine_efficacy) * force_of_infection * Q
           - parameters.death_rate * Q)
 
@@ -111,24 +155,24 @@ def rhs(t, state, target, parameters, vaccine_efficacy):
           - parameters.death_rate * A)
 
     dU = (parameters.progression_rate_acute * A
-          - control_rates_.diagnosis * U
+          - diagnosis * U
           - parameters.death_rate * U
           - parameters.progression_rate_unsuppressed * U)
 
-    dD = (control_rates_.diagnosis * U
-          + control_rates_.nonadherence * (T + V)
-          - control_rates_.treatment * D
+    dD = (diagnosis * U
+          + nonadherence * (T + V)
+          - treatment * D
           - parameters.death_rate * D
           - parameters.progression_rate_unsuppressed * D)
 
-    dT = (control_rates_.treatment * D
-          - control_rates_.nonadherence * T
+    dT = (treatment * D
+          - nonadherence * T
           - parameters.suppression_rate * T
           - parameters.death_rate * T
           - parameters.progression_rate_unsuppressed * T)
 
     dV = (parameters.suppression_rate * T
-          - control_rates_.nonadherence * V
+          - nonadherence * V
           - parameters.death_rate * V
           - parameters.progression_rate_suppressed * V)
 
@@ -141,19 +185,30 @@ def rhs(t, state, target, parameters, vaccine_efficacy):
     dR = (force_of_infection * S
           + (1 - vaccine_efficacy) * force_of_infection * Q)
 
-    return [dS, dQ, dA, dU, dD, dT, dV, dW, dZ, dR]
+    return _put((dS, dQ, dA, dU, dD, dT, dV, dW, dZ, dR), out)
 
 
-def rhs_log(t, state_trans, target, parameters, vaccine_efficacy):
-    state = transform_inv(state_trans)
+def rhs_log(t, state_trans, target, parameters, vaccine_efficacy,
+            controls = None, out = None, state = None):
+    '''
+    The derivatives of the log-transformed state variables,
+    put in `out` if it is given.
+    The untransformed state variables are put in `state`
+    if it is given.
+    '''
+    state = transform_inv(state_trans, out = state)
     S, Q, A, U, D, T, V, W, Z, R = state
-    (S_log, U_log, D_log, T_log, V_log, W_log) = state_trans[vars_log]
+    (S_log, _, _, U_log, D_log, T_log, V_log, W_log, _, _) = state_trans
 
     # Total sexually active population.
     N = S + Q + A + U + D + T + V
     N_log = numpy.log(N)
 
-    control_rates_ =  control_rates.get(t, state, target, parameters)
+    if controls is None:
+        controls = control_rates.get_array
+    # The control rates in the order of `control_rates.names`.
+    (diagnosis, treatment, nonadherence, vaccination) = controls(
+        t, state, target, parameters)
 
     force_of_infection = (
         parameters.transmission_rate_acute * A / N
@@ -164,11 +219,11 @@ def rhs_log(t, state_trans, target, parameters, vaccine_efficacy):
         + parameters.transmission_rate_suppressed * numpy.exp(V_log - N_log))
 
     dS_log = (parameters.birth_rate * numpy.exp(N_log - S_log)
-              - control_rates_.vaccination
+              - vaccination
               - force_of_infection
               - parameters.death_rate)
 
-    dQ = (control_rates_.vaccination * numpy.exp(S_log)
+    dQ = (vaccination * numpy.exp(S_log)
           - (1 - vaccine_efficacy) * force_of_infection * Q
           - parameters.death_rate * Q)
 
@@ -178,25 +233,25 @@ def rhs_log(t, state_trans, target, parameters, vaccine_efficacy):
           - parameters.death_rate * A)
 
     dU_log = (parameters.progression_rate_acute * A * numpy.exp(- U_log)
-              - control_rates_.diagnosis
+              - diagnosis
               - parameters.death_rate
               - parameters.progression_rate_unsuppressed)
 
-    dD_log = (control_rates_.diagnosis * numpy.exp(U_log - D_log)
-              + control_rates_.nonadherence * (numpy.exp(T_log - D_log)
-                                               + numpy.exp(V_log - D_log))
-              - control_rates_.treatment
+    dD_log = (diagnosis * numpy.exp(U_log - D_log)
+              + nonadherence * (numpy.exp(T_log - D_log)
+                                + numpy.exp(V_log - D_log))
+              - treatment
               - parameters.death_rate
               - parameters.progression_rate_unsuppressed)
 
-    dT_log = (control_rates_.treatment * numpy.exp(D_log - T_log)
-              - control_rates_.nonadherence
+    dT_log = (treatment * numpy.exp(D_log - T_log)
+              - nonadherence
               - parameters.suppression_rate
               - parameters.death_rate
               - parameters.progression_rate_unsuppressed)
 
     dV_log = (parameters.suppression_rate * numpy.exp(T_log - V_log)
-              - control_rates_.nonadherence
+              - nonadherence
               - parameters.death_rate
               - parameters.progression_rate_suppressed)
 
@@ -212,89 +267,246 @@ def rhs_log(t, state_trans, target, parameters, vaccine_efficacy):
     dR = (force_of_infection * numpy.exp(S_log)
           + (1 - vaccine_efficacy) * force_of_infection * Q)
 
-    dstate = [dS_log, dQ, dA, dU_log, dD_log, dT_log, dV_log, dW_log, dZ, dR]
-    return dstate
+    dstate = (dS_log, dQ, dA, dU_log, dD_log, dT_log, dV_log, dW_log, dZ, dR)
+    return _put(dstate, out)
 
 
-def _solve_odeint(t, Y0, fcn, args = ()):
-    def fcn_swap_Yt(Y, t, *args):
-        return fcn(t, Y, *args)
-    return integrate.odeint(fcn_swap_Yt, Y0, t,
-                            args = args,
-                            mxstep = 2000,
-                            mxhnil = 1)
+
+# Solver statistics returned by :func:`solve` with `full_output`.
+# Those that an integrator doesn't report are NaN.
+solver_info_fields = (
+    'nfev',               # Right-hand-side evaluations.
+    'njev',               # Jacobian evaluations.
+    'nsteps',             # Accepted steps.
+    'nrejected',          # Rejected steps.
+    'nmethod_switches',   # LSODA switches between non-stiff and stiff.
+    'ncontrol_switches',  # Switches of the control rates with 'sliding'.
+    'nretries',           # Re-runs after NaNs.
+    'time',               # Wall time, in seconds.
+)
+
+
+def _get_solver_info(**kwds):
+    info = dict.fromkeys(solver_info_fields, numpy.nan)
+    info.update(kwds)
+    return info
 
 
-def _solve_ode(t, Y0, fcn, args = (), integrator = 'lsoda'):
-    solver = integrate.ode(fcn)
+def _count_switches(method):
+    return numpy.count_nonzero(numpy.diff(method) != 0)
+
+
+# 0-based indices of the statistics in `iwork`
+# of the :class:`scipy.integrate.ode` integrators.
+_iwork_indices = {
+    'lsoda': dict(nsteps = 10, nfev = 11, njev = 12),
+    'vode': dict(nsteps = 10, nfev = 11, njev = 12, nrejected = 20),
+    'dopri5': dict(nfev = 16, nsteps = 18, nrejected = 19),
+    'dop853': dict(nfev = 16, nsteps = 18, nrejected = 19),
+}
+# The method LSODA used for the last step.
+_iwork_lsoda_method = 18
+# These start the counts over on each call.
+_iwork_per_call = ('dopri5', 'dop853')
+
+
+def _solve_odeint(t, Y0, fcn, args = (), rtol = None, atol = None):
+    # The solver copies the derivatives,
+    # so the same buffer is reused for every evaluation.
+    dY = numpy.empty(len(Y0))
+    def fcn_swap_Yt(Y, t, *args):
+        return fcn(t, Y, *args, out = dY)
+    (Y, infodict) = integrate.odeint(fcn_swap_Yt, Y0, t,
+                                     args = args,
+                                     mxstep = 2000,
+                                     mxhnil = 1,
+                                     rtol = rtol,
+                                     atol = atol,
+                                     full_output = True)
+    # The counts are cumulative.  The method is only known
+    # at each time in `t`, so switches between them are missed.
+    info = _get_solver_info(nfev = infodict['nfe'][-1],
+                            njev = infodict['nje'][-1],
+                            nsteps = infodict['nst'][-1],
+                            nmethod_switches = _count_switches(
+                                infodict['mused']))
+    return (Y, info)
+
+
+def _solve_ode(t, Y0, fcn, args = (), integrator = 'lsoda', use_log = True,
+               rtol = None, atol = None):
+    dY = numpy.empty(len(Y0))
+    # Pass `args` here rather than with `solver.set_f_params()`,
+    # because the solver can't call functions with `*args`.
+    def fcn_out(t, Y):
+        return fcn(t, Y, *args, out = dY)
+    solver = integrate.ode(fcn_out)
     if integrator == 'lsoda':
         kwds = dict(max_hnil = 1)
     else:
         kwds = {}
+    # Leave the integrator's default tolerances unless given.
+    if rtol is not None:
+        kwds['rtol'] = rtol
+    if atol is not None:
+        kwds['atol'] = atol
     solver.set_integrator(integrator,
                           nsteps = 2000,
                           **kwds)
-    solver.set_f_params(*args)
     solver.set_initial_value(Y0, t[0])
+    # The counts start over when the solver is restarted,
+    # so add them up over the restarts.
+    indices = _iwork_indices.get(integrator, {})
+    counts = dict.fromkeys(indices, 0)
+    def add_counts():
+        for (k, j) in indices.items():
+            counts[k] += solver._integrator.iwork[j]
+    method = []
     Y = numpy.empty((len(t), len(Y0)))
     Y[0] = Y0
     for i in range(1, len(t)):
         Y[i] = solver.integrate(t[i])
-        if not use_log:
+        if integrator == 'lsoda':
+            method.append(solver._integrator.iwork[_iwork_lsoda_method])
+        elif integrator in _iwork_per_call:
+            add_counts()
+        if (not use_log) and numpy.any(Y[i, : -2] < 0):
             # Force to be non-negative.
-            Y[i, : -2] = Y[i, : -2].clip(0, numpy.inf)
+            # Only restart the solver when that changed something,
+            # because restarting throws away its step-size history.
+            numpy.clip(Y[i, : -2], 0, numpy.inf, out = Y[i, : -2])
+            if integrator not in _iwork_per_call:
+                add_counts()
             solver.set_initial_value(Y[i], t[i])
-        assert solver.successful()
-    return Y
+        assert solver.successful(), 'The solver failed at t = {}.'.format(t[i])
+    if integrator not in _iwork_per_call:
+        add_counts()
+    if integrator == 'lsoda':
+        counts['nmethod_switches'] = _count_switches(method)
+    return (Y, _get_solver_info(**counts))
 
 
-def solve(t, target, parameters,
-          integrator = 'odeint', use_log = True):
+def _solve(t, target, parameters, integrator, use_log, controls,
+           rtol = None, atol = None):
     '''
-    `integrator` is a
-    :class:`scipy.integrate.ode` integrator---``'lsoda'``,
-    ``'vode'``, ``'dopri5'``, ``'dop853'``---or
-    ``'odeint'`` to use :func:`scipy.integrate.odeint`.
+    Solve once, returning the solution and the solver statistics.
     '''
-
-    assert numpy.isfinite(parameters.R0)
-    assert not numpy.all(parameters.initial_conditions == 0)
-
-    Y0 = parameters.initial_conditions.copy().values
+    if integrator == 'expo':
+        (Y, info) = exponential_integrator.solve(t, target, parameters,
+                                                 full_output = True)
+        return (Y, _get_solver_info(nsteps = info['nsteps'],
+                                    use_log = False,
+                                    controls = 'expo'))
+
+    # A writable copy, which `transform` overwrites.
+    Y0 = numpy.array(parameters.initial_conditions, dtype = float)
     if use_log:
-        Y0 = transform(Y0)
-        fcn = rhs_log
+        Y0 = transform(Y0, out = Y0)
+        # Reuse one buffer for the untransformed state.
+        fcn = functools.partial(rhs_log, state = numpy.empty(len(Y0)))
     else:
         fcn = rhs
 
     # Scale time to start at 0 to avoid some solver warnings.
     t_scaled = t - t[0]
-    def fcn_scaled(t_scaled, *args):
-        return fcn(t_scaled + t[0], *args)
+    def fcn_scaled(t_scaled, *args, **kwargs):
+        return fcn(t_scaled + t[0], *args, **kwargs)
 
     try:
         vaccine_efficacy = target.vaccine_efficacy
     except AttributeError:
         vaccine_efficacy = 0
     args = (target, parameters, vaccine_efficacy)
-
-    if integrator == 'odeint':
-        Y = _solve_odeint(t_scaled, Y0, fcn_scaled, args)
+    # Reuse buffers for the control rates and the target values.
+    controls_ramp = functools.partial(
+        control_rates.get_array,
+        out = numpy.empty(len(control_rates.names)),
+        target_values = numpy.empty(len(control_rates.names)))
+
+    if controls == 'sliding':
+        (Y, info_sliding) = sliding_mode.solve(t_scaled, Y0, fcn_scaled, args,
+                                               t_offset = t[0],
+                                               use_log = use_log,
+                                               full_output = True)
+        info = _get_solver_info(
+            nfev = info_sliding['nfev'],
+            ncontrol_switches = info_sliding['nswitches'],
+            integrator = 'LSODA')
+    elif controls != 'ramp':
+        raise ValueError("Unknown controls '{}'!".format(controls))
+    elif integrator == 'odeint':
+        (Y, info) = _solve_odeint(t_scaled, Y0, fcn_scaled,
+                                  args + (controls_ramp, ),
+                                  rtol = rtol, atol = atol)
     else:
-        Y = _solve_ode(t_scaled, Y0, fcn_scaled, args,
-                       integrator = integrator)
+        (Y, info) = _solve_ode(t_scaled, Y0, fcn_scaled,
+                               args + (controls_ramp, ),
+                               integrator = integrator,
+                               use_log = use_log,
+                               rtol = rtol, atol = atol)
+
+    if use_log:
+        Y = transform_inv(Y, out = Y)
+    return (Y, info)
 
-    if numpy.any(numpy.isnan(Y)):
+
+def solve(t, target, parameters,
+          integrator = 'odeint', use_log = True, controls = 'ramp',
+          rtol = None, atol = None, full_output = False):
+    '''
+    `integrator` is a
+    :class:`scipy.integrate.ode` integrator---``'lsoda'``,
+    ``'vode'``, ``'dopri5'``, ``'dop853'``---or
+    ``'odeint'`` to use :func:`scipy.integrate.odeint`,
+    or ``'expo'`` to use the exponential integrator of
+    :mod:`model.exponential_integrator`, with its own steps,
+    which always uses its own control rates
+    and ignores `use_log` and `controls`.
+
+    `controls` is ``'ramp'`` to smooth the switching of the control
+    rates with :func:`model.control_rates.ramp`
+    or ``'sliding'`` to switch them exactly with event detection
+    using :mod:`model.sliding_mode`.
+    `integrator` is ignored with ``controls = 'sliding'``.
+
+    `rtol` and `atol` are the relative and absolute error tolerances
+    of the integrator, or ``None`` for its defaults.
+    They are ignored with ``integrator = 'expo'``
+    and with ``controls = 'sliding'``.
+
+    If `full_output` is true, also return a `dict` of the solver
+    statistics in :data:`solver_info_fields`
+    and the `integrator`, `use_log`, and `controls` that were
+    actually used.
+    '''
+
+    assert numpy.isfinite(parameters.R0), 'R0 is not finite.'
+    assert not numpy.all(parameters.initial_conditions == 0), \
+        'The initial conditions are all 0.'
+
+    time_start = time.time()
+    nretries = 0
+    while True:
+        (Y, info) = _solve(t, target, parameters,
+                           integrator, use_log, controls,
+                           rtol = rtol, atol = atol)
+        if not numpy.any(numpy.isnan(Y)):
+            break
         msg = ("country = '{}': NaN in solution!").format(parameters.country)
-        if use_log:
+        if use_log and (integrator != 'expo'):
             msg += "  Re-running with use_log = False."
             warnings.warn(msg)
-            return solve(t, target, parameters,
-                         integrator = integrator,
-                         use_log = False)
+            use_log = False
+            nretries += 1
         else:
             raise ValueError(msg)
-    elif use_log:
-        return transform_inv(Y)
+
+    if full_output:
+        info.setdefault('integrator', integrator)
+        info.setdefault('use_log', use_log)
+        info.setdefault('controls', controls)
+        info.update(nretries = nretries,
+                    time = time.time() - time_start)
+        return (Y, info)
     else:
         return Y
@@ -2,10 +2,24 @@
 HIV model.
 '''
 
+from . import adaptive
+from . import batched_modes
+from . import bootstrap
 from . import datasheet
+from . import differences
+from . import emulator
 from . import multicountry
 from . import parameters
+from . import prcc
 from . import regions
 from . import results
+from . import sampling
+from . import sensitivity
+from . import service
 from . import simulation
+from . import sobol
+from . import solver_stats
+from . import summaries
 from . import target
+from . import vaccine_sweep
+from . import work_queue
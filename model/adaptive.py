@@ -0,0 +1,177 @@
+'''
+Sequential Monte Carlo runs that stop once the quantiles of the
+key outcomes have converged.
+
+:class:`AdaptiveMultiSim` solves the samples in the chunks of
+:mod:`model.checkpoint` and, after each chunk, estimates the precision
+of the quantiles at :data:`levels` of :data:`stats` at :data:`years`,
+those in the tables, from bootstrap confidence intervals
+(:func:`model.bootstrap.quantile_CI`).  The precision of a quantile is
+the width of its confidence interval relative to the median.
+The run stops when the worst precision is at most `tolerance`,
+so a small epidemic whose bands settle quickly uses fewer samples
+and the samples go where the uncertainty is still large.
+The number of samples and the precisions reached are saved
+as a :class:`Convergence` alongside the results.
+'''
+
+import os
+import zlib
+
+import joblib
+import numpy
+import pandas
+
+from . import bootstrap
+from . import results
+from . import simulation
+
+
+stats = ('new_infections', 'infected', 'AIDS')
+
+years = (2025, 2035)
+
+levels = (0.25, 0.5, 0.75)
+
+
+def get_outcomes(res, stats = stats, years = years):
+    '''
+    The values of `stats` of `res` at `years`,
+    with shape ``(nsamples, len(stats), len(years))``.
+    '''
+    i_years = numpy.searchsorted(simulation.t, years)
+    return numpy.stack([numpy.asarray(getattr(res, stat))[:, i_years]
+                        for stat in stats],
+                       axis = 1)
+
+
+def get_seed(country, target, nsamples):
+    '''
+    The seed for the bootstrap after `nsamples` samples of the run
+    for `country` and `target`, so that rerunning stops at the same
+    number of samples.
+    '''
+    key = '{}/{!s}/{}'.format(country, target, nsamples)
+    return zlib.crc32(key.encode())
+
+
+def get_precision(outcomes, levels = levels, alpha = 0.05, nboot = 200,
+                  seed = None):
+    '''
+    The widths of the `1 - alpha` bootstrap confidence intervals of
+    the quantiles at `levels` of `outcomes` relative to their medians,
+    with shape ``(len(levels), ) + outcomes.shape[1 : ]``,
+    with the bootstrap resamples from `seed`.
+    '''
+    indices = bootstrap.get_indices(len(outcomes), nboot = nboot,
+                                    seed = seed)
+    CI = bootstrap.quantile_CI(outcomes, levels, alpha = alpha,
+                               indices = indices)
+    median = numpy.nanmedian(outcomes, axis = 0)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        return (CI[..., 1] - CI[..., 0]) / numpy.abs(median)
+
+
+class Convergence:
+    '''
+    How far a run of :class:`AdaptiveMultiSim` got.
+    :attr:`history` has the worst precision after each chunk,
+    indexed by the number of samples, and :attr:`precision`
+    has the precisions at the end, with rows for the levels
+    and columns for the stats and years.
+    '''
+    def __init__(self, tolerance, history, precision,
+                 levels = levels, stats = stats, years = years):
+        self.tolerance = tolerance
+        self.history = pandas.Series(history, name = 'precision')
+        self.history.index.name = 'nsamples'
+        if len(self.history) > 0:
+            (self.nsamples, self.worst) = (self.history.index[-1],
+                                           self.history.iloc[-1])
+        else:
+            # No samples.
+            (self.nsamples, self.worst) = (0, numpy.nan)
+            precision = numpy.full((len(levels), len(stats), len(years)),
+                                   numpy.nan)
+        self.converged = (self.worst <= tolerance)
+        columns = pandas.MultiIndex.from_product((stats, years),
+                                                 names = ('stat', 'year'))
+        self.precision = pandas.DataFrame(
+            numpy.reshape(precision, (len(levels), -1)),
+            index = pandas.Index(levels, name = 'level'),
+            columns = columns)
+
+
+class AdaptiveMultiSim(simulation.MultiSim):
+    '''
+    A :class:`model.simulation.MultiSim` that stops when the
+    quantiles have converged to within `tolerance`,
+    after at least `min_samples` samples.
+    '''
+    def __init__(self, params, target, *args, tolerance = 0.05,
+                 min_samples = 200, alpha = 0.05, **kwargs):
+        self.tolerance = tolerance
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self._history = {}
+        self._precision = None
+        super().__init__(params, target, *args, **kwargs)
+        self.convergence = Convergence(self.tolerance, self._history,
+                                       self._precision)
+
+    def _is_done(self, nsolved):
+        # Check the last chunk even if it is before `min_samples`.
+        if nsolved < min(self.min_samples, len(self.state)):
+            return False
+        res = simulation.MultiSim._from_state(self.parameters, self.target,
+                                              self.state[ : nsolved])
+        seed = get_seed(self.parameters.country, self.target, nsolved)
+        self._precision = get_precision(get_outcomes(res),
+                                        alpha = self.alpha,
+                                        seed = seed)
+        self._history[nsolved] = numpy.nanmax(self._precision)
+        return self._history[nsolved] <= self.tolerance
+
+    def dump(self):
+        # Save the convergence first, so that results without it
+        # are never taken to be from a run that wasn't adaptive.
+        path = get_path(self.parameters.country, self.target)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        filenames = list(results.dump_atomic(self.convergence, path))
+        filenames.extend(super().dump())
+        return filenames
+
+
+def get_path(country, target):
+    (root, ext) = os.path.splitext(results.get_path(country, target))
+    return root + '-convergence' + ext
+
+
+def exists(country, target):
+    return os.path.exists(get_path(country, target))
+
+
+def load(country, target):
+    '''
+    Load the :class:`Convergence` of the run for `country` and `target`.
+    '''
+    return joblib.load(get_path(country, target))
+
+
+def get_table(countries, targets):
+    '''
+    The number of samples and the worst precision of the runs
+    of `countries` and `targets` that were adaptive.
+    '''
+    rows = {}
+    for country in countries:
+        for target in targets:
+            if exists(country, target):
+                convergence = load(country, target)
+                rows[(country, str(target))] = dict(
+                    nsamples = convergence.nsamples,
+                    precision = convergence.worst,
+                    converged = convergence.converged)
+    table = pandas.DataFrame.from_dict(rows, orient = 'index')
+    table.index.names = ('country', 'target')
+    return table
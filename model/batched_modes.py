@@ -0,0 +1,60 @@
+'''
+Run the simulations with the modes of the parameter distributions
+for many countries and targets together in one process
+by solving them all at once with
+:func:`model.exponential_integrator.solve`.
+'''
+
+import time
+
+import numpy
+
+from . import datasheet
+from . import exponential_integrator
+from . import parameters as parameters_
+from . import results
+from . import simulation
+from . import target as target_
+
+
+def run(countries = None, targets = target_.all_, overwrite = False):
+    '''
+    Solve for each of `countries` and `targets` and save the results
+    like :class:`model.simulation.Simulation` with
+    :class:`model.parameters.Mode`.
+    Unless `overwrite`, the ones whose results already exist
+    are skipped.
+    '''
+    if countries is None:
+        countries = datasheet.get_country_list()
+    runs = [(country, target)
+            for country in countries
+            for target in targets
+            if overwrite or not results.exists(country, target, 'mode')]
+    if len(runs) == 0:
+        return
+    # Build the parameters once for each country.
+    parameters = {country: parameters_.Mode.from_country(country)
+                  for country in set(country for (country, _) in runs)}
+    time_start = time.time()
+    (state, info) = exponential_integrator.solve(
+        simulation.t,
+        exponential_integrator.StackedTargets(target
+                                              for (_, target) in runs),
+        [parameters[country] for (country, _) in runs],
+        full_output = True)
+    # Split the time evenly over the runs.
+    time_run = (time.time() - time_start) / len(runs)
+    for ((country, target), state_) in zip(runs, state):
+        if numpy.any(numpy.isnan(state_)):
+            # Fall back on solving this one alone.
+            sim = simulation.Simulation(parameters[country], target)
+        else:
+            sim = simulation.Simulation._from_state(parameters[country],
+                                                    target, state_)
+            sim.solver_stats = dict(nsteps = info['nsteps'],
+                                    time = time_run,
+                                    integrator = 'expo',
+                                    use_log = False,
+                                    controls = 'expo')
+        results.dump(sim, parameters_type = 'mode')
@@ -0,0 +1,125 @@
+'''
+Bootstrap confidence intervals for PRCCs and quantiles.
+
+The resamples are an index matrix from :func:`get_indices`,
+drawn once and reused for all the outcomes (and places), so that
+all the outcomes of a resample are handled together and the cost
+is linear in the number of outcomes.  The resamples are processed
+in batches, with :func:`model.prcc.pcc_batched` for the PRCCs,
+to bound the memory used.
+'''
+
+import unittest
+import warnings
+
+import numpy
+
+from . import prcc as prcc_
+
+
+nboot = 1000
+
+# The memory for a batch of resamples, in bytes.
+batch_memory = 2 ** 27
+
+
+def get_indices(nsamples, nboot = nboot, seed = None):
+    '''
+    The indices of `nboot` resamples, with replacement,
+    of `nsamples` samples, with shape ``(nboot, nsamples)``.
+    '''
+    return numpy.random.RandomState(seed).randint(nsamples,
+                                                  size = (nboot, nsamples))
+
+
+def get_batches(indices, size):
+    '''
+    Split the resamples `indices` into batches that fit in
+    :data:`batch_memory` when each sample has `size` floats.
+    '''
+    # A batch holds ``len(indices[0]) * size`` floats a few times over.
+    batch_size = max(1, batch_memory // (8 * 4 * indices.shape[1] * size))
+    for start in range(0, len(indices), batch_size):
+        yield indices[start : start + batch_size]
+
+
+def _get_CI(x, alpha):
+    # Suppress warnings about NaNs.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        CI = numpy.nanquantile(x, [alpha / 2, 1 - alpha / 2], axis = 0)
+    return numpy.moveaxis(CI, 0, -1)
+
+
+def prcc_CI(X, Y, alpha = 0.05, indices = None):
+    '''
+    The `1 - alpha` bootstrap percentile confidence intervals of
+    :func:`model.prcc.prcc` of `X`, with shape
+    ``(nsamples, nparameters)``, with `Y`, with shape
+    ``(nsamples, ...)``, on a new last axis, re-ranking each resample.
+    '''
+    X = numpy.asarray(X, dtype = float)
+    Y = numpy.asarray(Y, dtype = float)
+    Y_flat = Y.reshape((len(Y), -1))
+    if indices is None:
+        indices = get_indices(len(X))
+    rho = []
+    for ix in get_batches(indices, X.shape[1] + Y_flat.shape[1]):
+        rho.append(prcc_.pcc_batched(prcc_.rankdata(X[ix], axis = 1),
+                                     prcc_.rankdata(Y_flat[ix], axis = 1)))
+    rho = numpy.concatenate(rho)
+    CI = _get_CI(rho, alpha)
+    return CI.reshape(X.shape[1 : ] + Y.shape[1 : ] + (2, ))
+
+
+def quantile_CI(Y, q, alpha = 0.05, indices = None):
+    '''
+    The `1 - alpha` bootstrap percentile confidence intervals of
+    the quantiles `q` over the samples of `Y`, with shape
+    ``(nsamples, ...)``, ignoring NaNs, on a new last axis.
+    Use `q = 0.5` for the median.
+    '''
+    Y = numpy.asarray(Y, dtype = float)
+    if indices is None:
+        indices = get_indices(len(Y))
+    Y_flat = Y.reshape((len(Y), -1))
+    quantiles = []
+    for ix in get_batches(indices, Y_flat.shape[1]):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            quantiles.append(numpy.nanquantile(Y_flat[ix], q, axis = 1))
+    # The resamples are on the axis after those of `q`.
+    quantiles = numpy.concatenate(quantiles, axis = numpy.ndim(q))
+    CI = _get_CI(numpy.moveaxis(quantiles, numpy.ndim(q), 0), alpha)
+    return CI.reshape(numpy.shape(q) + Y.shape[1 : ] + (2, ))
+
+
+class TestBootstrap(unittest.TestCase):
+    seed = 1
+
+    def test_prcc_CI(self):
+        (n, k) = (200, 3)
+        random_state = numpy.random.RandomState(self.seed)
+        X = random_state.uniform(size = (n, k))
+        Y = numpy.column_stack((X @ [1, -1, 0], numpy.exp(X[:, 0])))
+        Y = Y + random_state.normal(scale = 0.5, size = (n, 2))
+        indices = get_indices(n, nboot = 200, seed = self.seed)
+        CI = prcc_CI(X, Y, indices = indices)
+        self.assertEqual(CI.shape, (k, Y.shape[1], 2))
+        rho = prcc_.prcc(X, Y)
+        self.assertTrue(numpy.all((CI[..., 0] <= rho) & (rho <= CI[..., 1])))
+        # The same resamples one outcome at a time.
+        self.assertTrue(numpy.allclose(prcc_CI(X, Y[:, 1],
+                                               indices = indices),
+                                       CI[:, 1]))
+
+    def test_quantile_CI(self):
+        random_state = numpy.random.RandomState(self.seed)
+        Y = random_state.normal(size = (500, 2))
+        q = (0.25, 0.5)
+        CI = quantile_CI(Y, q, indices = get_indices(len(Y), nboot = 200,
+                                                     seed = self.seed))
+        self.assertEqual(CI.shape, (len(q), Y.shape[1], 2))
+        expected = numpy.quantile(Y, q, axis = 0)
+        self.assertTrue(numpy.all((CI[..., 0] <= expected)
+                                  & (expected <= CI[..., 1])))
@@ -0,0 +1,96 @@
+'''
+Checkpoints of chunks of the samples of a
+:class:`model.simulation.MultiSim` run,
+so that an interrupted run can resume from the last complete chunk.
+
+The chunks are in a directory next to where the results will be,
+which :func:`model.results.dump` removes once the results are saved.
+'''
+
+import hashlib
+import os.path
+import shutil
+
+import joblib
+import numpy
+
+from . import output_dir
+from . import results
+
+
+# Samples per chunk.
+chunk_size = 100
+
+
+def get_chunks(nsamples):
+    '''
+    The `(start, stop)` of each chunk of `nsamples` samples.
+    '''
+    return [(start, min(start + chunk_size, nsamples))
+            for start in range(0, nsamples, chunk_size)]
+
+
+def get_dir(place, target):
+    return os.path.join(output_dir.output_dir, place,
+                        '{!s}-checkpoints'.format(target))
+
+
+def get_path(place, target, start, stop):
+    return os.path.join(get_dir(place, target),
+                        '{:05d}-{:05d}.pkl'.format(start, stop))
+
+
+def get_digest(values):
+    '''
+    A digest of the parameter `values` of a chunk, to put in its key,
+    so that a checkpoint is not reused after the samples have changed.
+    '''
+    return hashlib.sha1(numpy.ascontiguousarray(values).tobytes()).hexdigest()
+
+
+def dump(place, target, start, stop, key, state, solver_stats):
+    '''
+    Save the solutions for samples `start` to `stop`.
+    `key` identifies the solver settings that they were run with.
+    '''
+    os.makedirs(get_dir(place, target), exist_ok = True)
+    results.dump_atomic(dict(key = key,
+                             state = state,
+                             solver_stats = solver_stats),
+                        get_path(place, target, start, stop))
+
+
+def _load(place, target, start, stop, key, mmap_mode = None):
+    path = get_path(place, target, start, stop)
+    if not os.path.exists(path):
+        return None
+    chunk = joblib.load(path, mmap_mode = mmap_mode)
+    if chunk['key'] != key:
+        return None
+    return chunk
+
+
+def exists(place, target, start, stop, key):
+    '''
+    Whether there is a checkpoint for samples `start` to `stop`
+    with the same `key`.
+    '''
+    # Memory map to not read the solutions.
+    return (_load(place, target, start, stop, key, mmap_mode = 'r')
+            is not None)
+
+
+def load(place, target, start, stop, key):
+    '''
+    Load the solutions for samples `start` to `stop`
+    as `(state, solver_stats)`, or return `None` if there is no
+    checkpoint for them with the same `key`.
+    '''
+    chunk = _load(place, target, start, stop, key)
+    if chunk is None:
+        return None
+    return (chunk['state'], chunk['solver_stats'])
+
+
+def remove(place, target):
+    shutil.rmtree(get_dir(place, target), ignore_errors = True)
@@ -17,7 +17,17 @@ class ControlRatesMax:
     vaccination = 1
 
 
-def ramp(x, tol = 0.001):
+# The order of the control rates in :func:`get_array`.
+names = ('diagnosis', 'treatment', 'nonadherence', 'vaccination')
+
+_maxima = numpy.array([getattr(ControlRatesMax, n) for n in names])
+
+# +1 if the control is on when the proportion is below its target,
+# -1 if the control is on when the proportion is above its target.
+_signs = numpy.array((1, 1, -1, 1))
+
+
+def ramp(x, tol = 0.001, out = None):
     r'''
     Piecewise linear
 
@@ -31,8 +41,12 @@ def ramp(x, tol = 0.001):
               \end{cases}
 
     where :math:`\epsilon` is `tol`.
+    The result is put in `out` if it is given.
     '''
-    return numpy.clip(x / tol, 0, 1)
+    if out is None:
+        return numpy.clip(x / tol, 0, 1)
+    numpy.divide(x, tol, out = out)
+    return numpy.clip(out, 0, 1, out = out)
 
 
 def get(t, state, target, parameters):
@@ -89,31 +103,31 @@ def get(t, state, target, parameters):
     OK, so we actually use the piecewise linear function :func:`ramp`
     that smooths the transition in a tiny region.
     '''
-    proportions_ = proportions.get(state)
-
-    target_values = target(t, parameters)
-
-    names = []
-    arrays = []
-    
-    names.append('diagnosis')
-    arrays.append(ControlRatesMax.diagnosis
-                  * ramp(target_values.diagnosed
-                         - proportions_.diagnosed))
-
-    names.append('treatment')
-    arrays.append(ControlRatesMax.treatment
-                  * ramp(target_values.treated
-                         - proportions_.treated))
-
-    names.append('nonadherence')
-    arrays.append(ControlRatesMax.nonadherence
-                  * ramp(proportions_.suppressed
-                         - target_values.suppressed))
-
-    names.append('vaccination')
-    arrays.append(ControlRatesMax.vaccination
-                  * ramp(target_values.vaccinated
-                         - proportions_.vaccinated))
-
-    return numpy.rec.fromarrays(arrays, names = names)
+    return numpy.rec.fromarrays(
+        list(get_array(t, state, target, parameters)),
+        names = names)
+
+
+def get_array(t, state, target, parameters,
+              out = None, target_values = None):
+    '''
+    Like :func:`get`, but as an array with the control rates
+    in the order of `names` along the first axis,
+    put in `out` if it is given.
+    The target values are put in `target_values` if it is given.
+    '''
+    # `target_values` holds the denominators of the proportions
+    # until it is overwritten with the target values.
+    proportions_ = proportions.get_array(state, out = out,
+                                         denominators = target_values)
+    target_values = target.get_array(t, parameters, out = target_values)
+    if out is None:
+        out = numpy.empty(numpy.broadcast(target_values,
+                                          proportions_).shape)
+    numpy.subtract(target_values, proportions_, out = out)
+    # Broadcast the signs and maxima along the first axis.
+    shape = (len(names), ) + (1, ) * (numpy.ndim(out) - 1)
+    numpy.multiply(out, _signs.reshape(shape), out = out)
+    ramp(out, out = out)
+    numpy.multiply(out, _maxima.reshape(shape), out = out)
+    return out
@@ -0,0 +1,262 @@
+'''
+Differences between pairs of targets, paired by sample,
+computed in one pass over the results of each place.
+
+For each place, :func:`build` loads the results of each target once
+and saves a :class:`PlaceDifferences` with, for each of :data:`pairs`
+and :data:`stats`, the absolute differences, baseline minus
+intervention, and the relative differences, divided by the baseline,
+of each sample at :data:`years`, along with the percentiles of the
+absolute differences over time.
+:func:`build_all` then puts the quantiles at
+:data:`model.summaries.levels` for all the places
+together into a :class:`Cube`, for maps and tables.
+'''
+
+import os.path
+import warnings
+
+import joblib
+import numpy
+import pandas
+from scipy import integrate
+
+from . import datasheet
+from . import output_dir
+from . import parameters
+from . import regions
+from . import resources
+from . import results
+from . import simulation
+from . import summaries
+from . import target as target_
+
+
+cubefile = os.path.join(output_dir.output_dir, 'differences.pkl')
+
+# (baseline, intervention).
+pairs = [(target_.StatusQuo(), target_.UNAIDS90()),
+         (target_.StatusQuo(), target_.UNAIDS95()),
+         (target_.UNAIDS90(), target_.UNAIDS95())]
+pairs.extend((baseline, target_.Vaccine(treatment_target = baseline))
+             for baseline in target_._all_baselines)
+pairs.append((target_.StatusQuo(),
+              target_.Vaccine(treatment_target = target_.UNAIDS95())))
+
+stats = ('new_infections', 'infected', 'dead', 'AIDS',
+         'incidence_per_capita', 'infections_per_capita')
+
+years = (2025, 2035)
+
+# The percentiles over time of the absolute differences.
+percentiles = numpy.linspace(0, 100, 101)
+# Every quarter year.
+percentiles_t = simulation.t[ : : 30]
+
+
+def _get_pair_key(pair):
+    return tuple(map(str, pair))
+
+
+def get_infections_per_capita(res):
+    '''
+    The cumulative new infections divided by the average population
+    since the start of the simulation.
+    '''
+    person_years = integrate.cumulative_trapezoid(res.alive, simulation.t,
+                                                  initial = 0)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        exposure = person_years / (simulation.t - simulation.t[0])
+        return res.new_infections / exposure
+
+
+def _get_stat(res, stat):
+    if stat == 'infections_per_capita':
+        return get_infections_per_capita(res)
+    else:
+        return numpy.asarray(getattr(res, stat))
+
+
+def _quantile(x, q, axis = 0):
+    # Suppress warnings about NaNs.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return numpy.quantile(x, q, axis = axis)
+
+
+class PlaceDifferences:
+    '''
+    The differences for `place` of :data:`pairs`.
+    :attr:`absolute` and :attr:`relative` have shape
+    ``(len(pairs), len(stats), len(years), nsamples)``
+    and :attr:`percentiles` has shape
+    ``(len(pairs), len(stats), len(percentiles), len(percentiles_t))``.
+    A pair with missing results is NaN.
+    '''
+    def __init__(self, place, pairs = pairs, stats = stats, years = years):
+        self.place = place
+        self.pairs = [_get_pair_key(pair) for pair in pairs]
+        self.stats = list(stats)
+        self.years = numpy.asarray(years)
+        i_years = numpy.searchsorted(simulation.t, self.years)
+        i_percentiles_t = numpy.searchsorted(simulation.t, percentiles_t)
+        # Load each target once, keeping only the times needed.
+        values = {}
+        for target in set(str(t) for pair in self.pairs for t in pair):
+            try:
+                res = results.load(place, target)
+            except FileNotFoundError:
+                continue
+            values[target] = {}
+            for stat in self.stats:
+                x = _get_stat(res, stat)
+                values[target][stat] = (x[:, i_years],
+                                        x[:, i_percentiles_t])
+        # Runs from :class:`model.adaptive.AdaptiveMultiSim` can have
+        # fewer samples, so pair the samples that all the targets have.
+        nsamples = min((len(v[self.stats[0]][0]) for v in values.values()),
+                       default = 0)
+        shape = (len(self.pairs), len(self.stats), len(self.years), nsamples)
+        self.absolute = numpy.full(shape, numpy.nan, dtype = numpy.float32)
+        self.relative = numpy.full(shape, numpy.nan, dtype = numpy.float32)
+        self.percentiles = numpy.full(
+            (len(self.pairs), len(self.stats),
+             len(percentiles), len(percentiles_t)),
+            numpy.nan, dtype = numpy.float32)
+        for (i, (baseline, intervention)) in enumerate(self.pairs):
+            if (baseline not in values) or (intervention not in values):
+                continue
+            for (j, stat) in enumerate(self.stats):
+                (x, x_t) = (v[ : nsamples] for v in values[baseline][stat])
+                (y, y_t) = (v[ : nsamples]
+                            for v in values[intervention][stat])
+                with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+                    self.absolute[i, j] = (x - y).T
+                    self.relative[i, j] = ((x - y) / x).T
+                self.percentiles[i, j] = _quantile(x_t - y_t,
+                                                   percentiles / 100)
+
+    def _get_index(self, baseline, intervention, stat):
+        return (self.pairs.index(_get_pair_key((baseline, intervention))),
+                self.stats.index(stat))
+
+    def get(self, kind, baseline, intervention, stat, year):
+        '''
+        The `kind`, 'absolute' or 'relative', differences
+        of the samples in `year`.
+        '''
+        (i, j) = self._get_index(baseline, intervention, stat)
+        k = list(self.years).index(year)
+        return getattr(self, kind)[i, j, k]
+
+    def get_percentiles(self, baseline, intervention, stat):
+        '''
+        The percentiles of the absolute differences at
+        :data:`percentiles_t`, with shape
+        ``(len(percentiles), len(percentiles_t))``.
+        '''
+        (i, j) = self._get_index(baseline, intervention, stat)
+        return self.percentiles[i, j]
+
+
+class Cube:
+    '''
+    The quantiles at `levels` of the differences of
+    :class:`PlaceDifferences` for `places`.
+    :attr:`absolute` and :attr:`relative` have shape
+    ``(len(levels), len(places), len(pairs), len(stats), len(years))``.
+    '''
+    def __init__(self, places, levels = summaries.levels):
+        self.places = list(places)
+        self.levels = numpy.asarray(levels)
+        self.absolute = None
+        for (p, place) in enumerate(self.places):
+            diffs = load(place)
+            if self.absolute is None:
+                self.pairs = diffs.pairs
+                self.stats = diffs.stats
+                self.years = diffs.years
+                shape = ((len(self.levels), len(self.places))
+                         + diffs.absolute.shape[ : -1])
+                self.absolute = numpy.empty(shape, dtype = numpy.float32)
+                self.relative = numpy.empty(shape, dtype = numpy.float32)
+            self.absolute[:, p] = _quantile(diffs.absolute, self.levels,
+                                            axis = -1)
+            self.relative[:, p] = _quantile(diffs.relative, self.levels,
+                                            axis = -1)
+
+    def get(self, kind, baseline, intervention, stat, year, q = 0.5):
+        '''
+        The quantile `q` of the `kind`, 'absolute' or 'relative',
+        differences in `year` for each place.
+        '''
+        i = list(self.levels).index(q)
+        j = self.pairs.index(_get_pair_key((baseline, intervention)))
+        k = self.stats.index(stat)
+        l = list(self.years).index(year)
+        return pandas.Series(getattr(self, kind)[i, :, j, k, l],
+                             index = self.places)
+
+    def dump(self, path = None):
+        if path is None:
+            path = cubefile
+        results.dump_atomic(self, path)
+
+    @classmethod
+    def load(cls, path = None):
+        if path is None:
+            path = cubefile
+        return joblib.load(path)
+
+
+def get_path(place):
+    return os.path.join(output_dir.output_dir, place, 'differences.pkl')
+
+
+def exists(place):
+    return os.path.exists(get_path(place))
+
+
+def build(place, overwrite = False):
+    '''
+    Compute and save the differences for `place`,
+    unless they already exist and not `overwrite`.
+    '''
+    if overwrite or not exists(place):
+        results.dump_atomic(PlaceDifferences(place), get_path(place))
+
+
+def load(place):
+    if not exists(place):
+        build(place)
+    return joblib.load(get_path(place))
+
+
+def build_all(places = None, overwrite = False):
+    '''
+    Build the differences for each of `places` in parallel,
+    then the :class:`Cube` of all of them.
+    '''
+    if places is None:
+        places = list(regions.regions) + datasheet.get_country_list()
+    places = [place for place in places
+              if any(results.exists(place, target)
+                     for pair in pairs
+                     for target in pair)]
+    # Each job has the results of one target in memory at a time.
+    job_memory = resources.get_job_memory(parameters.nsamples)
+    with resources.parallel(job_memory) as parallel:
+        parallel(joblib.delayed(build)(place, overwrite)
+                 for place in places)
+    cube = Cube(places)
+    cube.dump()
+    return cube
+
+
+def load_cube():
+    '''
+    Load the :class:`Cube`, building it first if needed.
+    '''
+    if not os.path.exists(cubefile):
+        return build_all()
+    return Cube.load()
@@ -0,0 +1,214 @@
+'''
+Emulate the outcomes of :class:`model.target.Vaccine` designs
+for quick what-if queries.
+
+For each country, :class:`Emulator` fits a polynomial chaos expansion,
+i.e. a least-squares fit of Legendre polynomials in the design axes,
+to the outcomes of a :class:`model.vaccine_sweep.Sweep`
+relative to its baseline without a vaccine.
+Evaluating the polynomials for new designs takes milliseconds.
+The error is estimated on designs held out of the fit,
+and :meth:`Emulator.validate` compares with other full solves.
+
+The relative outcomes are from the modes of the parameter
+distributions.  :meth:`Emulator.predict_samples` approximates the
+distribution of the outcomes by scaling the outcomes of the sample runs
+of :class:`model.simulation.MultiSim` without a vaccine by these
+relative outcomes, so it leaves out how the effect of the vaccine
+varies with the other parameters.
+'''
+
+import itertools
+import os.path
+import unittest
+
+import joblib
+import numpy
+import pandas
+
+from . import ODEs
+from . import output_dir
+from . import results
+from . import simulation
+from . import vaccine_sweep
+
+
+emulatorfile = os.path.join(output_dir.output_dir, 'emulator.pkl')
+
+
+def _get_exponents(ndim, degree):
+    '''
+    The exponents of the products of polynomials
+    with total degree at most `degree`.
+    '''
+    return numpy.array([e
+                        for e in itertools.product(range(degree + 1),
+                                                   repeat = ndim)
+                        if sum(e) <= degree])
+
+
+class Emulator:
+    '''
+    Fit the outcomes of `sweep`, a :class:`model.vaccine_sweep.Sweep`,
+    for each of its countries with polynomials in the axes of `ranges`
+    of total degree at most `degree`.
+
+    A random `holdout` fraction of the designs, chosen with `seed`,
+    is left out of a first fit to estimate :attr:`error`,
+    the root-mean-square error of the outcomes relative to the baseline,
+    with shape ``(len(countries), len(outcomes), len(years))``.
+    The polynomials are then refit with all the designs.
+    '''
+    def __init__(self, sweep, degree = 3, ranges = vaccine_sweep.ranges,
+                 holdout = 0.1, seed = None):
+        self.countries = list(sweep.countries)
+        self.outcomes = list(sweep.outcomes)
+        self.years = numpy.asarray(sweep.years)
+        self.treatment_target = sweep.treatment_target
+        self.axes = [k for k in vaccine_sweep.axes if k in ranges]
+        self.ranges = {k: ranges[k] for k in self.axes}
+        self.exponents = _get_exponents(len(self.axes), degree)
+        self.baseline = sweep.baseline
+        X = self._get_basis(sweep.designs)
+        if len(X) <= len(self.exponents):
+            raise ValueError(
+                'Need more than {} designs to fit degree {}!'.format(
+                    len(self.exponents), degree))
+        Y = self._get_relative(sweep.values)
+        ntest = int(numpy.ceil(holdout * len(X)))
+        if len(X) - ntest > len(self.exponents):
+            test = numpy.random.RandomState(seed).permutation(
+                len(X))[ : ntest]
+            train = numpy.setdiff1d(numpy.arange(len(X)), test)
+            coef = self._fit(X[train], Y[:, train])
+            residuals = self._evaluate(coef, X[test]) - Y[:, test]
+            self.error = numpy.sqrt(numpy.mean(residuals ** 2, axis = 1))
+        else:
+            self.error = numpy.full(self.baseline.shape, numpy.nan)
+        self.coef = self._fit(X, Y)
+
+    def _get_basis(self, designs):
+        '''
+        The Legendre polynomials evaluated at `designs`,
+        scaled from :attr:`ranges` to [-1, 1].
+        '''
+        x = numpy.column_stack(
+            [2 * (designs[k] - a) / (b - a) - 1
+             for (k, (a, b)) in self.ranges.items()])
+        degree = self.exponents.max()
+        # P[n][:, j] is the degree-n polynomial in axis j.
+        P = [numpy.polynomial.legendre.legval(x, numpy.eye(degree + 1)[n])
+             for n in range(degree + 1)]
+        return numpy.prod([[P[n][:, j] for (j, n) in enumerate(e)]
+                           for e in self.exponents],
+                          axis = 1).T
+
+    def _get_relative(self, values):
+        return values / self.baseline[:, None]
+
+    @staticmethod
+    def _fit(X, Y):
+        # Y has shape (country, design, outcome, year).
+        Y_ = numpy.moveaxis(Y, 1, -1).reshape((-1, len(X))).T
+        (coef, _, _, _) = numpy.linalg.lstsq(X, Y_, rcond = None)
+        # To (country, basis, outcome, year).
+        return numpy.moveaxis(
+            coef.T.reshape(Y.shape[ : 1] + Y.shape[2 : ] + (-1, )),
+            -1, 1)
+
+    @staticmethod
+    def _evaluate(coef, X):
+        return numpy.einsum('db,cbot->cdot', X, coef)
+
+    def _get_country_index(self, countries):
+        if countries is None:
+            return slice(None)
+        return [self.countries.index(c) for c in countries]
+
+    def predict(self, designs, countries = None):
+        '''
+        The outcomes of `designs`, a :class:`pandas.DataFrame` like
+        those from :func:`model.vaccine_sweep.get_grid`, for `countries`,
+        or all of them, and their estimated errors,
+        both with shape
+        ``(len(countries), len(designs), len(outcomes), len(years))``.
+        '''
+        i = self._get_country_index(countries)
+        relative = self._evaluate(self.coef[i], self._get_basis(designs))
+        baseline = self.baseline[i][:, None]
+        error = numpy.broadcast_to(self.error[i][:, None] * baseline,
+                                   relative.shape)
+        return (relative * baseline, error)
+
+    def predict_samples(self, country, designs, parameters_type = 'sample'):
+        '''
+        An approximate distribution of the outcomes of `designs`
+        for `country`, with shape
+        ``(nsamples, len(designs), len(outcomes), len(years))``,
+        from scaling the outcomes of the runs of
+        :attr:`treatment_target` without a vaccine from
+        :mod:`model.results` by the predicted relative outcomes.
+        The relative outcomes are fit to runs with the modes of the
+        parameters, so this is the same for every sample, and the
+        spread is only that of the runs without a vaccine.
+        :attr:`error` does not include this approximation.
+        '''
+        i = self._get_country_index([country])
+        relative = self._evaluate(self.coef[i], self._get_basis(designs))[0]
+        sim = results.load(country, self.treatment_target, parameters_type)
+        i_years = numpy.searchsorted(simulation.t, self.years)
+        i_outcomes = [ODEs.variables.index(k) for k in self.outcomes]
+        # To (sample, outcome, year).
+        samples = numpy.swapaxes(
+            numpy.asarray(sim.state)[:, i_years][..., i_outcomes], 1, 2)
+        return samples[:, None] * relative
+
+    def validate(self, sweep):
+        '''
+        Compare the predictions with the full solves of `sweep`,
+        for designs not used in the fit, giving the root-mean-square
+        and maximum errors relative to the baseline
+        for each country, outcome, and year.
+        '''
+        (predicted, _) = self.predict(sweep.designs, sweep.countries)
+        i = self._get_country_index(sweep.countries)
+        errors = ((predicted - sweep.values)
+                  / self.baseline[i][:, None])
+        index = pandas.MultiIndex.from_product(
+            (sweep.countries, self.outcomes, self.years),
+            names = ('country', 'outcome', 'year'))
+        return pandas.DataFrame(
+            dict(rms = numpy.sqrt(numpy.mean(errors ** 2,
+                                             axis = 1)).ravel(),
+                 max = numpy.max(numpy.abs(errors), axis = 1).ravel(),
+                 estimated = self.error[i].ravel()),
+            index = index)
+
+    def dump(self, path = None):
+        if path is None:
+            path = emulatorfile
+        joblib.dump(self, path, protocol = -1)
+
+    @classmethod
+    def load(cls, path = None):
+        if path is None:
+            path = emulatorfile
+        return joblib.load(path)
+
+
+class TestEmulator(unittest.TestCase):
+    seed = 1
+
+    def test_validate(self):
+        countries = ['Nigeria']
+        emulator = Emulator(
+            vaccine_sweep.Sweep(countries,
+                                vaccine_sweep.get_lhs(60, seed = self.seed)),
+            seed = self.seed)
+        # Different designs to validate with.
+        comparison = emulator.validate(
+            vaccine_sweep.Sweep(countries,
+                                vaccine_sweep.get_lhs(10,
+                                                      seed = self.seed + 1)))
+        self.assertTrue(numpy.all(comparison['max'] < 0.01),
+                        str(comparison))
@@ -0,0 +1,498 @@
+r'''
+Exponential integrator for the ODEs, batched over parameter samples.
+
+Apart from the force of infection :math:`\lambda` and the control
+rates :math:`\mathbf{r}`, :func:`model.ODEs.rhs` is linear,
+
+.. math:: \frac{\mathrm{d}\mathbf{y}}{\mathrm{d}t}
+          = A(\lambda, \mathbf{r}) \mathbf{y}.
+
+Freezing :math:`\lambda` and :math:`\mathbf{r}` over each step of
+length :math:`h` gives the exponential midpoint method,
+
+.. math:: \mathbf{y}_{\frac{1}{2}}
+          = \mathrm{e}^{\frac{h}{2} A(\mathbf{y}_0)} \mathbf{y}_0,
+          \quad
+          \mathbf{y}_1
+          = \mathrm{e}^{h A(\mathbf{y}_{\frac{1}{2}})} \mathbf{y}_0.
+
+The off-diagonal entries of :math:`A` are non-negative, so
+:math:`\mathrm{e}^{h A}` is too, and the state stays non-negative
+without the log transform.
+
+This is stable for any step length, so the steps are taken over
+several of the output times at once, as many as keep the difference
+between one step and two half steps within the tolerances.
+The output times inside a step are filled in with the same frozen
+:math:`A`, which only needs one more matrix exponential
+for equally spaced output times.
+
+The smoothing of the control rates by :func:`model.control_rates.ramp`
+happens over a band far narrower than these steps can resolve, so the
+control rates are instead the discrete-time version of the equivalent
+controls of :mod:`model.sliding_mode`: over each step, each control
+rate is chosen to bring its proportion to its target at the end of the
+step, then clipped to :math:`[0, R]`.
+'''
+
+import time
+import types
+import unittest
+
+import numpy
+
+from . import control_rates
+from . import ODEs
+from . import sliding_mode
+
+
+_parameter_names = ('birth_rate',
+                    'death_rate',
+                    'death_rate_AIDS',
+                    'progression_rate_acute',
+                    'progression_rate_unsuppressed',
+                    'progression_rate_suppressed',
+                    'suppression_rate',
+                    'transmission_rate_acute',
+                    'transmission_rate_unsuppressed',
+                    'transmission_rate_suppressed')
+
+
+class _Stacked:
+    '''
+    The parameter values needed by the solver from several
+    parameter sets, stacked into arrays.
+    '''
+    def __init__(self, parameters):
+        self.country = parameters[0].country
+        for k in _parameter_names:
+            setattr(self, k, numpy.array([getattr(p, k) for p in parameters]))
+        self.initial_conditions = numpy.array(
+            [numpy.asarray(p.initial_conditions) for p in parameters])
+
+    def __len__(self):
+        return len(self.initial_conditions)
+
+
+class StackedTargets:
+    '''
+    A different target for each of the parameter sets
+    solved together by :func:`solve`:
+    ``targets[i]`` is the target for ``parameters[i]``.
+    '''
+    def __init__(self, targets):
+        self.targets = list(targets)
+        # Evaluate each target once for all of its parameter sets.
+        groups = {}
+        for (i, target) in enumerate(self.targets):
+            groups.setdefault(id(target), (target, []))[1].append(i)
+        self._groups = list(groups.values())
+        # A target that is evaluated for several parameter sets
+        # can have a different vaccine efficacy for each.
+        self.vaccine_efficacy = numpy.zeros(len(self.targets))
+        for (target, indices) in self._groups:
+            self.vaccine_efficacy[indices] = getattr(target,
+                                                     'vaccine_efficacy', 0)
+
+    def __call__(self, t, parameters):
+        values = None
+        for (target, indices) in self._groups:
+            # The targets only need the initial conditions.
+            parameters_ = types.SimpleNamespace(
+                initial_conditions = parameters.initial_conditions[indices])
+            v = target(t, parameters_)
+            if values is None:
+                values = numpy.recarray((len(self.targets), ) + v.shape[1 : ],
+                                        dtype = v.dtype)
+            values[indices] = v
+        return values
+
+
+def expm(A, order = 10, theta = 0.5):
+    '''
+    The matrix exponential of each matrix in the stack `A`,
+    using scaling and squaring with a Taylor polynomial.
+    Each matrix is scaled by its own norm, so that a matrix
+    with NaNs doesn't change the others.
+    '''
+    norm = numpy.abs(A).sum(-2).max(-1)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        s = numpy.ceil(numpy.log2(norm / theta))
+    s = numpy.where(norm > theta, s, 0).astype(int)
+    X = A / (2.0 ** s)[..., numpy.newaxis, numpy.newaxis]
+    I = numpy.eye(numpy.shape(A)[-1])
+    # Horner's rule.
+    E = I + X / order
+    for k in range(order - 1, 0, -1):
+        E = I + X @ E / k
+    for j in range(numpy.max(s, initial = 0)):
+        square = (s > j)
+        E[square] = E[square] @ E[square]
+    return E
+
+
+def get_matrix(parameters, state, rates, vaccine_efficacy):
+    r'''
+    Build the matrices :math:`A(\lambda, \mathbf{r})`
+    so that :math:`\frac{\mathrm{d}\mathbf{y}}{\mathrm{d}t}
+    = A \mathbf{y}` for each state in the stack `state`,
+    with control rates `rates` in the order of
+    :data:`model.sliding_mode.controls`.
+    '''
+    state = state.clip(0, numpy.inf)
+    S, Q, A, U, D, T, V, W, Z, R = numpy.moveaxis(state, -1, 0)
+    N = S + Q + A + U + D + T + V
+    force_of_infection = (
+        parameters.transmission_rate_acute * A
+        + parameters.transmission_rate_unsuppressed * (U + D + T)
+        + parameters.transmission_rate_suppressed * V) / N
+    (diagnosis, treatment, nonadherence, vaccination) = numpy.moveaxis(
+        rates, -1, 0)
+    (iS, iQ, iA, iU, iD, iT, iV, iW, iZ, iR) = range(len(ODEs.variables))
+    M = numpy.zeros(numpy.shape(state) + (len(ODEs.variables), ))
+
+    M[..., iS, : iW] = parameters.birth_rate[..., numpy.newaxis]
+    M[..., iS, iS] -= (vaccination + force_of_infection
+                       + parameters.death_rate)
+
+    M[..., iQ, iS] = vaccination
+    M[..., iQ, iQ] = - ((1 - vaccine_efficacy) * force_of_infection
+                        + parameters.death_rate)
+
+    M[..., iA, iS] = force_of_infection
+    M[..., iA, iQ] = (1 - vaccine_efficacy) * force_of_infection
+    M[..., iA, iA] = - (parameters.progression_rate_acute
+                        + parameters.death_rate)
+
+    M[..., iU, iA] = parameters.progression_rate_acute
+    M[..., iU, iU] = - (diagnosis
+                        + parameters.death_rate
+                        + parameters.progression_rate_unsuppressed)
+
+    M[..., iD, iU] = diagnosis
+    M[..., iD, iT] = nonadherence
+    M[..., iD, iV] = nonadherence
+    M[..., iD, iD] = - (treatment
+                        + parameters.death_rate
+                        + parameters.progression_rate_unsuppressed)
+
+    M[..., iT, iD] = treatment
+    M[..., iT, iT] = - (nonadherence
+                        + parameters.suppression_rate
+                        + parameters.death_rate
+                        + parameters.progression_rate_unsuppressed)
+
+    M[..., iV, iT] = parameters.suppression_rate
+    M[..., iV, iV] = - (nonadherence
+                        + parameters.death_rate
+                        + parameters.progression_rate_suppressed)
+
+    M[..., iW, iU] = parameters.progression_rate_unsuppressed
+    M[..., iW, iD] = parameters.progression_rate_unsuppressed
+    M[..., iW, iT] = parameters.progression_rate_unsuppressed
+    M[..., iW, iV] = parameters.progression_rate_suppressed
+    M[..., iW, iW] = - parameters.death_rate_AIDS
+
+    M[..., iZ, iW] = parameters.death_rate_AIDS
+
+    M[..., iR, iS] = force_of_infection
+    M[..., iR, iQ] = (1 - vaccine_efficacy) * force_of_infection
+
+    return M
+
+
+def _clip(x, rate_max):
+    # NaNs, from proportions that the control can't change, become 0.
+    return numpy.clip(numpy.nan_to_num(x), 0, rate_max)
+
+
+def get_control_rates(parameters, state, proportions_start, target_end, h,
+                      vaccine_efficacy):
+    '''
+    Get the control rates that bring the proportions from
+    `proportions_start` to `target_end` over the step of length `h`,
+    with the rates of change of the proportions from `state`.
+
+    As in :class:`model.sliding_mode.Controller`,
+    diagnosis and vaccination act alone on their proportions,
+    while treatment holds the proportion suppressed and nonadherence
+    holds the proportion treated together.  If that needs
+    a rate outside of :math:`[0, R]`, nonadherence is clipped
+    if it is the worse one, or otherwise switches on when the
+    proportion suppressed is above its target, like
+    :func:`model.control_rates.get`, and then treatment holds
+    the proportion treated alone.
+    '''
+    rates_max = numpy.array([getattr(control_rates.ControlRatesMax, c)
+                             for c in sliding_mode.controls])
+    zero = numpy.zeros(numpy.shape(state)[ : -1] + (len(rates_max), ))
+    drift = numpy.squeeze(
+        get_matrix(parameters, state, zero, vaccine_efficacy)
+        @ state[..., numpy.newaxis],
+        -1)
+    proportions_ = sliding_mode.get_proportions(state)
+    a = sliding_mode.get_proportions_rate(state, drift, proportions_)
+    B = sliding_mode.get_sensitivities(state, proportions_)
+    needed = (target_end - proportions_start) / h
+
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        diagnosis = _clip((needed[..., 0] - a[..., 0]) / B[..., 0, 0],
+                          rates_max[0])
+        vaccination = _clip((needed[..., 3] - a[..., 3]) / B[..., 3, 3],
+                            rates_max[3])
+        a_treated = a[..., 1] + B[..., 1, 0] * diagnosis
+        treatment_joint = (needed[..., 2] - a[..., 2]) / B[..., 2, 1]
+        nonadherence_joint = (needed[..., 1] - a_treated
+                              - B[..., 1, 1] * treatment_joint) / B[..., 1, 2]
+        violation_treatment = numpy.nan_to_num(numpy.maximum(
+            treatment_joint / rates_max[1] - 1,
+            - treatment_joint / rates_max[1]), nan = numpy.inf)
+        violation_nonadherence = numpy.nan_to_num(numpy.maximum(
+            nonadherence_joint / rates_max[2] - 1,
+            - nonadherence_joint / rates_max[2]), nan = numpy.inf)
+        # Clip nonadherence and let treatment hold the proportion treated.
+        nonadherence_0 = _clip(nonadherence_joint, rates_max[2])
+        treatment_0 = _clip((needed[..., 1] - a_treated
+                             - B[..., 1, 2] * nonadherence_0)
+                            / B[..., 1, 1],
+                            rates_max[1])
+        # Switch nonadherence and let treatment hold the proportion
+        # treated.
+        nonadherence_1 = numpy.where(proportions_[..., 2] > target_end[..., 2],
+                                     rates_max[2], 0)
+        treatment_1 = _clip((needed[..., 1] - a_treated
+                             - B[..., 1, 2] * nonadherence_1)
+                            / B[..., 1, 1],
+                            rates_max[1])
+    # Treatment can't change the proportion suppressed
+    # when nobody is diagnosed but untreated.
+    clip_nonadherence = ((violation_nonadherence >= violation_treatment)
+                         & numpy.isfinite(treatment_joint))
+    treatment = numpy.where(clip_nonadherence, treatment_0, treatment_1)
+    nonadherence = numpy.where(clip_nonadherence,
+                               nonadherence_0, nonadherence_1)
+    joint = numpy.maximum(violation_treatment, violation_nonadherence) < 0
+    treatment = numpy.where(joint, treatment_joint, treatment)
+    nonadherence = numpy.where(joint, nonadherence_joint, nonadherence)
+    return numpy.stack((diagnosis, treatment, nonadherence, vaccination),
+                       axis = -1)
+
+
+def _get_target_values(target, t, parameters):
+    target_values = target(t, parameters)
+    return numpy.stack([getattr(target_values, n)
+                        for n in sliding_mode.proportion_names],
+                       axis = -1)
+
+
+def _step(t, h, state, target, parameters, vaccine_efficacy):
+    '''
+    Take one step of the exponential midpoint method,
+    returning the state at the end of the step and the frozen matrix.
+    '''
+    proportions_start = sliding_mode.get_proportions(state)
+    target_end = _get_target_values(target, t + h, parameters)
+    state_half = state
+    for h_ in (h / 2, h):
+        rates = get_control_rates(parameters, state_half, proportions_start,
+                                  target_end, h, vaccine_efficacy)
+        A = get_matrix(parameters, state_half, rates, vaccine_efficacy)
+        state_half = numpy.squeeze(expm(h_ * A) @ state[..., numpy.newaxis],
+                                   -1)
+    return (state_half, A)
+
+
+def _fill(t, state, A, out):
+    '''
+    Fill in `out` with the states at the times `t[1 : -1]`
+    inside a step from `state` at `t[0]` with the frozen matrix `A`.
+    '''
+    dt = numpy.diff(t[ : -1])
+    if len(dt) == 0:
+        return
+    equal = numpy.allclose(dt, dt[0])
+    if equal:
+        E = expm(dt[0] * A)
+    for (i, dt_) in enumerate(dt):
+        if not equal:
+            E = expm(dt_ * A)
+        state = numpy.squeeze(E @ state[..., numpy.newaxis], -1)
+        out[:, i] = state
+
+
+def _get_error(state, state_ref, rtol, atol):
+    '''
+    The largest difference between `state` and `state_ref`
+    relative to the tolerances, ignoring the samples with NaNs.
+    '''
+    with numpy.errstate(invalid = 'ignore'):
+        error = (numpy.abs(state - state_ref)
+                 / (atol + rtol * numpy.abs(state_ref)))
+    return numpy.max(numpy.where(numpy.isfinite(error), error, 0),
+                     initial = 0)
+
+
+def solve(t, target, parameters, rtol = 1e-4, atol = 1,
+          max_outputs_per_step = 120, full_output = False):
+    '''
+    Solve the ODEs at the times `t`, with steps over as many as
+    `max_outputs_per_step` of the intervals between the times,
+    as long as the difference between one step and two half steps
+    is within `rtol` relative to the state plus `atol` people.
+    The steps are the same for all of the parameter sets,
+    ignoring the ones whose solutions have NaNs.
+
+    `parameters` is either one set of parameter values,
+    e.g. :class:`model.parameters.Mode`,
+    giving a solution with shape ``(len(t), len(ODEs.variables))``,
+    or an iterable of them, e.g. :class:`model.parameters.Samples`,
+    which are solved together, giving a solution with shape
+    ``(len(parameters), len(t), len(ODEs.variables))``.
+
+    `target` is used for all of the parameter sets, unless it is a
+    :class:`StackedTargets`, to solve for several targets together.
+
+    With `full_output`, also return a `dict` with the number of steps
+    in `'nsteps'`.
+    '''
+    try:
+        parameters_ = list(parameters)
+    except TypeError:
+        parameters_ = [parameters]
+        batched = False
+    else:
+        batched = True
+    stacked = _Stacked(parameters_)
+
+    try:
+        vaccine_efficacy = target.vaccine_efficacy
+    except AttributeError:
+        vaccine_efficacy = 0
+
+    Y = numpy.empty((len(stacked), len(t), len(ODEs.variables)))
+    Y[:, 0] = stacked.initial_conditions
+    # The step is over `m` intervals between the output times.
+    (i, m, nsteps) = (0, 2, 0)
+    step = None
+    # While the controls chatter, the error estimates fail
+    # even for the shortest steps, so take `nshortest` of them
+    # without estimating the error, more each time it fails again.
+    (nshortest, backoff) = (0, 1)
+    while i < len(t) - 1:
+        m = min(m, len(t) - 1 - i)
+        if (m == 1) or (nshortest > 0):
+            (Y[:, i + 1], _) = _step(t[i], t[i + 1] - t[i], Y[:, i],
+                                     target, stacked, vaccine_efficacy)
+            (i, m, nsteps, step) = (i + 1, 2, nsteps + 1, None)
+            nshortest -= 1
+            continue
+        if step is None:
+            (step, _) = _step(t[i], t[i + m] - t[i], Y[:, i],
+                              target, stacked, vaccine_efficacy)
+            nsteps += 1
+        j = i + m // 2
+        (state_mid, A_0) = _step(t[i], t[j] - t[i], Y[:, i],
+                                 target, stacked, vaccine_efficacy)
+        (state_end, A_1) = _step(t[j], t[i + m] - t[j], state_mid,
+                                 target, stacked, vaccine_efficacy)
+        nsteps += 2
+        error = _get_error(step, state_end, rtol, atol)
+        if (error <= 1) or (m == 2):
+            # Keep the two half steps.
+            _fill(t[i : j + 1], Y[:, i], A_0, Y[:, i + 1 : j])
+            _fill(t[j : i + m + 1], state_mid, A_1, Y[:, j + 1 : i + m])
+            (Y[:, j], Y[:, i + m]) = (state_mid, state_end)
+            i += m
+            if error > 1:
+                (nshortest, backoff) = (backoff,
+                                        min(2 * backoff,
+                                            max_outputs_per_step))
+            else:
+                backoff = 1
+                if 8 * error <= 1:
+                    # The error grows with the cube of the step length.
+                    m = min(2 * m, max_outputs_per_step)
+            step = None
+        else:
+            # The first half step is the next step to try.
+            (m, step) = (m // 2, state_mid)
+    if not batched:
+        Y = Y[0]
+    if full_output:
+        return (Y, dict(nsteps = nsteps))
+    else:
+        return Y
+
+
+def validate(parameters, target):
+    '''
+    Compare solving with the exponential integrator
+    against :func:`scipy.integrate.odeint`.
+
+    Returns the wall times of the two solves
+    and the maximum difference of each state variable
+    relative to its maximum over time.
+    '''
+    # :mod:`model.simulation` imports :mod:`model.ODEs`, which imports this.
+    from . import simulation
+    retval = {}
+    states = {}
+    for integrator in ('odeint', 'expo'):
+        time_start = time.time()
+        states[integrator] = ODEs.solve(simulation.t, target, parameters,
+                                        integrator = integrator)
+        retval['time_{}'.format(integrator)] = time.time() - time_start
+    diff = numpy.abs(states['expo'] - states['odeint']).max(0)
+    scale = numpy.abs(states['odeint']).max(0)
+    relative_difference = numpy.where(scale > 0, diff / scale, diff)
+    retval.update(zip(ODEs.variables, relative_difference))
+    return retval
+
+
+class TestExponentialIntegrator(unittest.TestCase):
+    def test_validate(self):
+        from . import parameters
+        from . import target
+        country = 'Nigeria'
+        params = parameters.Parameters(country).mode()
+        targ = target.UNAIDS90()
+        comparison = validate(params, targ)
+        for v in ODEs.variables:
+            with self.subTest(variable = v):
+                self.assertLess(comparison[v], 0.02)
+
+    def test_expm(self):
+        from scipy import linalg
+        A = numpy.random.normal(scale = 3, size = (2, 4, 4))
+        A[1, 0, 0] = numpy.nan
+        E = expm(A)
+        # The NaN doesn't change the scaling of the other matrix.
+        self.assertTrue(numpy.allclose(E[0], linalg.expm(A[0])))
+        self.assertTrue(numpy.all(numpy.isnan(E[1, :, 0])))
+
+    def test_batched(self):
+        from . import parameters
+        from . import simulation
+        from . import target
+        country = 'Nigeria'
+        samples = list(parameters.Samples(country))[ : 3]
+        targ = target.UNAIDS90()
+        t = simulation.t[ : : 120]
+        Y = solve(t, targ, samples)
+        self.assertEqual(Y.shape, (len(samples), len(t), len(ODEs.variables)))
+        for (p, y) in zip(samples, Y):
+            self.assertTrue(numpy.allclose(y, solve(t, targ, p)))
+
+    def test_stacked_targets(self):
+        from . import parameters
+        from . import simulation
+        from . import target
+        params = [parameters.Mode.from_country(country)
+                  for country in ('Nigeria', 'South Africa')]
+        targs = (target.StatusQuo(), target.Vaccine())
+        pairs = [(p, targ) for p in params for targ in targs]
+        t = simulation.t[ : : 120]
+        Y = solve(t, StackedTargets(targ for (_, targ) in pairs),
+                  [p for (p, _) in pairs])
+        for ((p, targ), y) in zip(pairs, Y):
+            self.assertTrue(numpy.allclose(y, solve(t, targ, p)))
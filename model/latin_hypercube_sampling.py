@@ -5,18 +5,23 @@ Latin Hypercube sampling.
 import numpy
 
 
-def _get_one(rv, nsamples):
+def _get_one(rv, nsamples, random_state):
     # Pick random quantiles in [0, 1/n), [1/n, 2/n), ..., [(n-1)/n, 1).
     bounds = numpy.linspace(0, 1, nsamples + 1)
-    quantiles = numpy.random.uniform(bounds[ : -1], bounds[1 : ])
+    quantiles = random_state.uniform(bounds[ : -1], bounds[1 : ])
     # Convert those quantiles into RV values.
     samples = rv.ppf(quantiles)
     # Shuffle.
-    return numpy.random.permutation(samples)
+    return random_state.permutation(samples)
 
 
-def lhs(rvs, nsamples):
-    samples = [_get_one(rv, nsamples) for rv in rvs]
+def lhs(rvs, nsamples, seed = None):
+    # Without `seed`, use the global random state.
+    if seed is None:
+        random_state = numpy.random
+    else:
+        random_state = numpy.random.RandomState(seed)
+    samples = [_get_one(rv, nsamples, random_state) for rv in rvs]
     return numpy.asarray(samples).T
 
 
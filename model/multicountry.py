@@ -2,27 +2,67 @@
 Aggregate multi-country (e.g. Global or regional) results.
 '''
 
+import types
+import unittest
+import zlib
+
+import joblib
 import numpy
 
+from . import adaptive
 from . import incidence
 from . import parameters
 from . import regions
+from . import resources
 from . import results
 from . import simulation
 from . import target
 
 
+def _get_resample(region, target, country, nsamples, nsamples_max):
+    '''
+    The indices of `nsamples_max` samples from the `nsamples`
+    of `country`: its own samples, then draws from them
+    with replacement, seeded by `region`, `target`, and `country`.
+    '''
+    key = '{}/{!s}/{}'.format(region, target, country)
+    rng = numpy.random.RandomState(zlib.crc32(key.encode()))
+    return numpy.concatenate((numpy.arange(nsamples),
+                              rng.randint(nsamples,
+                                          size = nsamples_max - nsamples)))
+
+
 class MultiCountry(simulation._Super):
     '''
     Class to hold the results of multiple countries,
     e.g. Global or regional.
+
+    The countries in `resample`, e.g. those run with
+    :class:`model.adaptive.AdaptiveMultiSim`, can have fewer samples
+    than the others: their samples are resampled with replacement
+    up to the most samples of the countries, so that they
+    aren't solved again.  The other countries must all have
+    that many samples.
     '''
-    def __init__(self, region, target, data):
+    def __init__(self, region, target, data, resample = ()):
         self.region = region
         self.target = target
         self.state = 0
-        for v in data.values():
-            self.state += v.state
+        nsamples = {k: len(v.state) for (k, v) in data.items()}
+        nsamples_max = max(nsamples.values())
+        short = {k: n for (k, n) in nsamples.items()
+                 if (n < nsamples_max) and (k not in resample)}
+        if len(short) > 0:
+            raise ValueError(
+                'The countries of {} have different numbers of samples: {}!'
+                .format(region, nsamples))
+        for (k, v) in data.items():
+            if nsamples[k] < nsamples_max:
+                self.state += v.state[_get_resample(region, target, k,
+                                                    nsamples[k],
+                                                    nsamples_max)]
+            else:
+                self.state += v.state
             try:
                 v.flush() # Free memory
             except AttributeError:
@@ -52,8 +92,8 @@ class Global(MultiCountry):
     global_incidence = 2e6  # CI (1.9e6, 2.2e6), UNAIDS 2014
     global_annual_AIDS_deaths = 1.2e6  # CI (0.98e6, 1.6e6), UNAIDS 2014
 
-    def __init__(self, target, data):
-        super().__init__('Global', target, data)
+    def __init__(self, target, data, resample = ()):
+        super().__init__('Global', target, data, resample = resample)
         self._normalize()
 
     def _normalize(self):
@@ -118,27 +158,72 @@ class Global(MultiCountry):
         return obj
 
 
-def build_regional(region, target_, parameters_type = 'sample'):
+def build_regional(region, target_, parameters_type = 'sample',
+                   overwrite = False):
     '''
-    From the results of the country simulations, build a regional result.
+    From the results of the country simulations, build a regional result,
+    unless it already exists and not `overwrite`.
+    The countries run with :class:`model.adaptive.AdaptiveMultiSim`
+    are resampled up to the number of samples of the others.
     '''
-    if not results.exists(region, target, parameters_type):
+    if overwrite or not results.exists(region, target_, parameters_type):
         print('Building {}: {}'.format(region, target_))
         data = {country: results.load(country, target_,
                                       parameters_type = parameters_type)
                 for country in regions.regions[region]}
+        if parameters_type == 'sample':
+            resample = {country for country in data
+                        if adaptive.exists(country, target_)}
+        else:
+            resample = ()
         if region == 'Global':
-            obj = Global(target_, data)
+            obj = Global(target_, data, resample = resample)
         else:
-            obj = MultiCountry(region, target_, data)
+            obj = MultiCountry(region, target_, data, resample = resample)
         results.dump(obj, parameters_type = parameters_type)
 
 
 def build_regionals(targets = target.all_,
-                    parameters_type = 'sample'):
+                    parameters_type = 'sample', overwrite = False):
     '''
     From the results of the country simulations, build the regional results.
     '''
-    for region in regions.regions:
-        for target_ in targets:
-                build_regional(region, target_, parameters_type)
+    # Each job holds the sum and the results for one country.
+    if parameters_type == 'sample':
+        nsamples = parameters.nsamples
+    else:
+        nsamples = 1
+    job_memory = 2 * resources.get_job_memory(nsamples)
+    with resources.parallel(job_memory) as parallel:
+        parallel(joblib.delayed(build_regional)(
+                     region, target_, parameters_type, overwrite)
+                 for region in regions.regions
+                 for target_ in targets)
+
+
+class TestMultiCountry(unittest.TestCase):
+    def test_nsamples(self):
+        state = numpy.ones((4, 3, 2))
+        data = dict(a = types.SimpleNamespace(state = state),
+                    b = types.SimpleNamespace(state = state))
+        obj = MultiCountry('Region', 'target', data)
+        self.assertTrue(numpy.array_equal(obj.state, 2 * state))
+        data['b'].state = state[ : 2]
+        with self.assertRaises(ValueError):
+            MultiCountry('Region', 'target', data)
+
+    def test_resample(self):
+        state = numpy.arange(4 * 3 * 2).reshape((4, 3, 2))
+        data = dict(a = types.SimpleNamespace(state = state),
+                    b = types.SimpleNamespace(state = state[ : 2]))
+        obj = MultiCountry('Region', 'target', data, resample = {'b'})
+        self.assertEqual(obj.state.shape, state.shape)
+        # The samples that 'b' has are kept in place.
+        self.assertTrue(numpy.array_equal(obj.state[ : 2],
+                                          2 * state[ : 2]))
+        # The others are drawn from them.
+        for s in (obj.state - state)[2 : ]:
+            self.assertTrue(any(numpy.array_equal(s, t)
+                                for t in state[ : 2]))
+        again = MultiCountry('Region', 'target', data, resample = {'b'})
+        self.assertTrue(numpy.array_equal(obj.state, again.state))
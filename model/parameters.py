@@ -14,20 +14,47 @@ from . import datasheet
 from . import latin_hypercube_sampling
 from . import output_dir
 from . import R0
+from . import sampling
 from . import transmission_rate
 
 
 nsamples = 1000
 samplesfile = os.path.join(output_dir.output_dir, 'samples.pkl')
+# The :class:`model.sampling.Design` of the samples.
+designfile = os.path.join(output_dir.output_dir, 'samples-design.pkl')
+# For new designs.  See :data:`model.sampling.methods`.
+sampling_method = 'lhs'
+
+
+def _get_design():
+    if os.path.exists(designfile):
+        return joblib.load(designfile)
+    rvs = Parameters.get_rvs()
+    if os.path.exists(samplesfile):
+        # Samples from before their design was saved.
+        samples = joblib.load(samplesfile)
+        return sampling.Design.from_samples(rvs, samples)
+    return sampling.Design(len(rvs), method = sampling_method)
+
+
+def extend_samples(nsamples):
+    '''
+    Add samples to make `nsamples` in total, keeping the existing ones,
+    so that only the new ones need to be simulated,
+    with :meth:`model.simulation.MultiSim.extend`.
+    '''
+    design = _get_design()
+    if nsamples > len(design):
+        design.extend(nsamples)
+        samples = design.get_samples(Parameters.get_rvs())
+        joblib.dump(design, designfile, protocol = -1)
+        joblib.dump(samples, samplesfile, protocol = -1)
 
 
 def _get_samples():
     if not os.path.exists(samplesfile):
-        samples = Parameters.generate_samples(nsamples)
-        joblib.dump(samples, samplesfile, protocol = -1)
-    else:
-        samples = joblib.load(samplesfile, mmap_mode = 'r')
-    return samples
+        extend_samples(nsamples)
+    return joblib.load(samplesfile, mmap_mode = 'r')
 
 
 def uniform(minimum, maximum):
@@ -148,14 +175,18 @@ class Parameters:
         return Mode(self)
 
     @classmethod
-    def generate_samples(cls, nsamples):
-        rvs = []
-        for k in dir(cls):
-            if not k.startswith('_'):
-                a = getattr(cls, k)
-                if hasattr(a, 'rvs'):
-                    rvs.append(a)
-        return latin_hypercube_sampling.lhs(rvs, nsamples)
+    def generate_samples(cls, nsamples, method = 'lhs'):
+        rvs = cls.get_rvs()
+        if method == 'lhs':
+            return latin_hypercube_sampling.lhs(rvs, nsamples)
+        else:
+            design = sampling.Design(len(rvs), method = method)
+            design.extend(nsamples)
+            return design.get_samples(rvs)
+
+    @classmethod
+    def get_rvs(cls):
+        return [getattr(cls, k) for k in cls.get_rv_names()]
 
     @classmethod
     def get_rv_names(cls):
@@ -330,8 +361,10 @@ class Samples:
     def __init__(self, country):
         self.country = country
         parameters = Parameters(self.country)
+        # The values of the random variables, one row per sample.
+        self.values = _get_samples()
         self._samples = [Sample(parameters, s)
-                         for s in _get_samples()]
+                         for s in self.values]
 
     def __iter__(self):
         return iter(self._samples)
@@ -0,0 +1,130 @@
+'''
+Partial rank correlation coefficients (PRCCs) of the parameters
+with many outcomes at once.
+
+The partial correlations come from the inverse of the correlation
+matrix of the parameters and an outcome, and the block structure
+of that matrix gives them for all the outcomes together with
+one inverse of the correlation matrix of the parameters.
+'''
+
+import unittest
+
+import numpy
+import scipy.stats
+
+
+def rankdata(X, axis = 0):
+    '''
+    The ranks of `X` along `axis`, with ties given their average rank,
+    like :func:`scipy.stats.rankdata`.
+    '''
+    X = numpy.moveaxis(numpy.asarray(X), axis, 0)
+    n = len(X)
+    order = numpy.argsort(X, axis = 0, kind = 'mergesort')
+    X_sorted = numpy.take_along_axis(X, order, axis = 0)
+    # The start and end of the runs of ties.
+    index = numpy.arange(n).reshape((-1, ) + (1, ) * (X.ndim - 1))
+    is_start = numpy.ones(X.shape, dtype = bool)
+    is_start[1 : ] = (X_sorted[1 : ] != X_sorted[ : -1])
+    is_end = numpy.ones(X.shape, dtype = bool)
+    is_end[ : -1] = is_start[1 : ]
+    start = numpy.maximum.accumulate(numpy.where(is_start, index, 0),
+                                     axis = 0)
+    end = numpy.minimum.accumulate(numpy.where(is_end, index, n - 1)[ : : -1],
+                                   axis = 0)[ : : -1]
+    ranks = numpy.empty(X.shape)
+    numpy.put_along_axis(ranks, order, (start + end) / 2 + 1, axis = 0)
+    return numpy.moveaxis(ranks, 0, axis)
+
+
+def _standardize(X, axis = 0):
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        return ((X - X.mean(axis = axis, keepdims = True))
+                / X.std(axis = axis, keepdims = True))
+
+
+def pcc_batched(X, Y):
+    '''
+    :func:`pcc` for each of a batch of `X`, with shape
+    ``(nbatch, nsamples, nparameters)``, and `Y`, with shape
+    ``(nbatch, nsamples, noutcomes)``, giving shape
+    ``(nbatch, nparameters, noutcomes)``.
+    '''
+    n = numpy.shape(X)[1]
+    Z_X = _standardize(X, axis = 1)
+    Z_Y = _standardize(Y, axis = 1)
+    C_XX = numpy.einsum('bni,bnj->bij', Z_X, Z_X) / n
+    C_XY = numpy.einsum('bni,bnm->bim', Z_X, Z_Y) / n
+    # With A the inverse of C_XX, the inverse of the correlation matrix
+    # [[C_XX, c], [c.T, 1]] of the parameters and one outcome, with c
+    # the column of C_XY for that outcome, is
+    # [[A + A c c.T A / s, - A c / s], [- c.T A / s, 1 / s]],
+    # where s = 1 - c.T A c.
+    A = numpy.linalg.inv(C_XX)
+    B = A @ C_XY
+    s = 1 - numpy.sum(C_XY * B, axis = 1, keepdims = True)
+    diag = numpy.diagonal(A, axis1 = 1, axis2 = 2)[..., None]
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        return B / numpy.sqrt(s * diag + B ** 2)
+
+
+def pcc(X, Y):
+    '''
+    The partial correlation coefficients of each of the columns of `X`,
+    with shape ``(nsamples, nparameters)``, with each of the outcomes
+    `Y`, with shape ``(nsamples, ...)``, controlling for the other
+    columns of `X`.  The result has shape ``(nparameters, ...)``.
+    '''
+    X = numpy.asarray(X, dtype = float)
+    Y = numpy.asarray(Y, dtype = float)
+    rho = pcc_batched(X[None], Y.reshape((1, len(X), -1)))[0]
+    return rho.reshape(X.shape[1 : ] + Y.shape[1 : ])
+
+
+def prcc(X, Y):
+    '''
+    The partial rank correlation coefficients of the columns of `X`
+    with `Y`.  See :func:`pcc`.
+    '''
+    return pcc(rankdata(X), rankdata(Y))
+
+
+def get_CI(rho, N, alpha = 0.05):
+    '''
+    The `1 - alpha` confidence intervals of the PRCCs `rho` from `N`
+    samples, from Fisher's z-transformation, on a new last axis.
+    '''
+    p = 1
+    z = numpy.arctanh(rho)
+    z_crit = scipy.stats.norm.ppf([alpha / 2, 1 - alpha / 2])
+    z_CI = z[..., numpy.newaxis] + z_crit / numpy.sqrt(N - p - 3)
+    return numpy.tanh(z_CI)
+
+
+class TestPRCC(unittest.TestCase):
+    def test_rankdata(self):
+        X = numpy.random.randint(5, size = (20, 3))
+        self.assertTrue(numpy.allclose(
+            rankdata(X),
+            numpy.column_stack([scipy.stats.rankdata(x) for x in X.T])))
+
+    def test_pcc(self):
+        # Partial correlation from the residuals of regressions
+        # on the other parameters.
+        def get_residuals(Z, b):
+            A = numpy.column_stack((numpy.ones(len(Z)), Z))
+            return b - A @ numpy.linalg.lstsq(A, b, rcond = None)[0]
+        (n, k) = (100, 4)
+        X = numpy.random.uniform(size = (n, k))
+        Y = numpy.column_stack(
+            (X @ numpy.random.normal(size = k),
+             numpy.exp(X[:, 0]) * X[:, 1] + numpy.random.normal(size = n)))
+        rho = pcc(X, Y)
+        self.assertEqual(rho.shape, (k, Y.shape[1]))
+        for i in range(k):
+            Z = numpy.delete(X, i, axis = 1)
+            for j in range(Y.shape[1]):
+                (expected, _) = scipy.stats.pearsonr(
+                    get_residuals(Z, X[:, i]), get_residuals(Z, Y[:, j]))
+                self.assertTrue(numpy.isclose(rho[i, j], expected))
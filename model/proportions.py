@@ -2,52 +2,68 @@
 Compute proportions diagnosed, treated, viral suppressed, and vaccinated.
 '''
 
-import warnings
-
 import numpy
 
 from . import ODEs
 
 
-def _safe_divide(a, b, fill_value = 0):
+# The order of the proportions in :func:`get_array`.
+names = ('diagnosed', 'treated', 'suppressed', 'vaccinated')
+
+# The compartments in the numerator and denominator of each proportion.
+_fractions = (('DTVW', 'AUDTVW'),
+              ('TVW', 'DTVW'),
+              ('V', 'TV'),
+              ('Q', 'SQ'))
+_numerators = numpy.array([[x in num for x in 'SQAUDTVWZR']
+                           for (num, den) in _fractions], dtype = float)
+_denominators = numpy.array([[x in den for x in 'SQAUDTVWZR']
+                             for (num, den) in _fractions], dtype = float)
+
+
+def _safe_divide(a, b, fill_value = 0, out = None):
     '''
     Return a / b,
     unless b == a == 0, then return 0.
+    The result is put in `out` if it is given.
     '''
     # Ignore divide-by-zero warnings.
-    with warnings.catch_warnings():
-        warnings.filterwarnings('ignore',
-                                module = 'numpy',
-                                message = ('divide by zero encountered in '
-                                           'true_divide'))
-        return numpy.where((a == 0) & (b == 0), 0, numpy.divide(a, b))
+    # This is much faster than filtering them with :mod:`warnings`.
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        if out is None:
+            return numpy.where((a == 0) & (b == 0), 0, numpy.divide(a, b))
+        zero = (a == 0) & (b == 0)
+        numpy.divide(a, b, out = out)
+    numpy.copyto(out, 0, where = zero)
+    return out
 
 
-def get(state):
+def get_array(state, out = None, denominators = None):
     '''
     Get the proportions diagnosed, treated, viral suppressed, and vaccinated
-    from the current number of people in the model compartments.
+    from the current number of people in the model compartments
+    as an array with the proportions in the order of `names`
+    along the first axis, put in `out` if it is given.
+    The denominators are put in `denominators` if it is given.
     '''
+    state = ODEs.split_state(state)
+    if out is None:
+        out = numpy.empty((len(names), ) + state.shape[1 : ])
+    if denominators is None:
+        denominators = numpy.empty_like(out)
+    # Sum the compartments with matrix products over 2-D views,
+    # which put the results in the buffers.
+    state = state.reshape((len(state), -1))
+    numpy.dot(_numerators, state, out = out.reshape((len(out), -1)))
+    numpy.dot(_denominators, state,
+              out = denominators.reshape((len(denominators), -1)))
+    return _safe_divide(out, denominators, out = out)
 
-    S, Q, A, U, D, T, V, W, Z, R = ODEs.split_state(state)
-
-    names = []
-    arrays = []
-
-    names.append('diagnosed')
-    # (D + T + V + W) / (A + U + D + T + V + W)
-    arrays.append(_safe_divide(D + T + V + W, A + U + D + T + V + W))
 
-    names.append('treated')
-    # (T + V + W) / (D + T + V + W)
-    arrays.append(_safe_divide(T + V + W, D + T + V + W))
-
-    names.append('suppressed')
-    # V / (T + V)
-    arrays.append(_safe_divide(V, T + V))
-
-    names.append('vaccinated')
-    # Q / (S + Q)
-    arrays.append(_safe_divide(Q, S + Q))
-
-    return numpy.rec.fromarrays(arrays, names = names)
+def get(state):
+    '''
+    Get the proportions diagnosed, treated, viral suppressed, and vaccinated
+    from the current number of people in the model compartments
+    as a record array.
+    '''
+    return numpy.rec.fromarrays(list(get_array(state)), names = names)
@@ -0,0 +1,109 @@
+'''
+The budget of worker processes, threads, and memory
+for running jobs in parallel.
+
+:func:`parallel` gives a :class:`joblib.Parallel` with as many
+workers as fit in the available memory, up to :data:`max_jobs`,
+with the BLAS and OpenMP threads of each worker limited to
+:data:`threads_per_job` so that the workers don't oversubscribe
+the cores.  The budget can be set with the environment variables
+``HIV_MAX_JOBS``, ``HIV_THREADS_PER_JOB``, ``HIV_MEMORY_FRACTION``,
+and ``HIV_WORKER_MEMORY``, or by changing the values here.
+'''
+
+import contextlib
+import os
+
+import joblib
+
+from . import ODEs
+from . import simulation
+
+
+# The most workers to run at once.
+max_jobs = int(os.environ.get('HIV_MAX_JOBS', os.cpu_count()))
+# BLAS and OpenMP threads in each worker.
+threads_per_job = int(os.environ.get('HIV_THREADS_PER_JOB', 1))
+# The fraction of the available memory to use.
+memory_fraction = float(os.environ.get('HIV_MEMORY_FRACTION', 0.8))
+# The memory used by a worker before it does anything, in bytes.
+worker_memory = float(os.environ.get('HIV_WORKER_MEMORY', 200e6))
+
+
+def _read_int(path):
+    try:
+        with open(path) as fp:
+            return int(fp.read())
+    except (OSError, ValueError):
+        # Missing or 'max'.
+        return None
+
+
+def _get_cgroup_available():
+    for (limit, usage) in (
+            # cgroup v2.
+            ('/sys/fs/cgroup/memory.max',
+             '/sys/fs/cgroup/memory.current'),
+            # cgroup v1.
+            ('/sys/fs/cgroup/memory/memory.limit_in_bytes',
+             '/sys/fs/cgroup/memory/memory.usage_in_bytes')):
+        (limit, usage) = (_read_int(limit), _read_int(usage))
+        if (limit is not None) and (usage is not None):
+            return limit - usage
+    return None
+
+
+def get_available_memory():
+    '''
+    The memory available for new processes, in bytes,
+    including any limit on this process's control group.
+    '''
+    try:
+        with open('/proc/meminfo') as fp:
+            meminfo = dict(line.split(':', 1) for line in fp)
+        # In kB.
+        available = 1024 * int(meminfo['MemAvailable'].split()[0])
+    except (OSError, KeyError):
+        available = (os.sysconf('SC_AVPHYS_PAGES')
+                     * os.sysconf('SC_PAGE_SIZE'))
+    available_cgroup = _get_cgroup_available()
+    if available_cgroup is not None:
+        available = min(available, available_cgroup)
+    return available
+
+
+def get_job_memory(nsamples):
+    '''
+    The memory for the solutions of `nsamples` samples, in bytes,
+    e.g. :data:`model.parameters.nsamples` for a job
+    with all the samples of a place and target.
+    '''
+    return nsamples * len(simulation.t) * len(ODEs.variables) * 8
+
+
+def get_n_jobs(job_memory = None):
+    '''
+    The number of jobs of `job_memory` bytes each
+    to run at once.  The default is the memory
+    for the solution of one sample.
+    '''
+    if job_memory is None:
+        job_memory = get_job_memory(1)
+    budget = memory_fraction * get_available_memory()
+    n_jobs = int(budget // (job_memory + worker_memory))
+    return max(1, min(n_jobs, max_jobs))
+
+
+@contextlib.contextmanager
+def parallel(job_memory = None, n_jobs = None, **kwargs):
+    '''
+    A :class:`joblib.Parallel` with :func:`get_n_jobs` workers,
+    unless `n_jobs` is given.
+    `kwargs` are passed on to :class:`joblib.Parallel`.
+    '''
+    if n_jobs is None:
+        n_jobs = get_n_jobs(job_memory)
+    with joblib.parallel_backend('loky',
+                                 inner_max_num_threads = threads_per_job):
+        with joblib.Parallel(n_jobs = n_jobs, **kwargs) as parallel_:
+            yield parallel_
@@ -5,7 +5,9 @@ Dump and load simulation results.
 import os
 
 import joblib
+import pandas
 
+from . import checkpoint
 from . import output_dir
 from . import multicountry
 from . import ODEs
@@ -23,6 +25,35 @@ def get_path(place, target, parameters_type = 'sample'):
     return os.path.join(output_dir.output_dir, place, filename)
 
 
+def _get_solver_stats_path(path):
+    (root, ext) = os.path.splitext(path)
+    return root + '-solver_stats' + ext
+
+
+def get_solver_stats_path(place, target, parameters_type = 'sample'):
+    '''
+    The path for the solver statistics saved alongside the results.
+    '''
+    return _get_solver_stats_path(get_path(place, target, parameters_type))
+
+
+def dump_atomic(value, path, **kwds):
+    '''
+    Dump `value` to `path` with :func:`joblib.dump`
+    by writing a temporary file and renaming it,
+    so that `path` is never left partly written.
+    '''
+    path_tmp = '{}.tmp-{}'.format(path, os.getpid())
+    try:
+        joblib.dump(value, path_tmp, protocol = -1, **kwds)
+        os.replace(path_tmp, path)
+    except BaseException:
+        if os.path.exists(path_tmp):
+            os.remove(path_tmp)
+        raise
+    return [path]
+
+
 def dump(obj, parameters_type = None, compress = False):
     if isinstance(obj, multicountry.MultiCountry):
         # Guess.
@@ -38,9 +69,19 @@ def dump(obj, parameters_type = None, compress = False):
                 parameters_type = 'mode'
         path = get_path(obj.parameters.country, obj.target,
                         parameters_type = parameters_type)
-    if not os.path.exists(os.path.dirname(path)):
-        os.mkdir(os.path.dirname(path))
-    return joblib.dump(obj.state, path, compress = compress, protocol = -1)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    solver_stats = getattr(obj, 'solver_stats', None)
+    if solver_stats is not None:
+        if isinstance(solver_stats, dict):
+            solver_stats = pandas.DataFrame([solver_stats])
+        dump_atomic(solver_stats, _get_solver_stats_path(path))
+    # Write the results last, because :func:`exists` checks for them.
+    filenames = dump_atomic(obj.state, path, compress = compress)
+    if ((not isinstance(obj, multicountry.MultiCountry))
+            and (parameters_type == 'sample')):
+        # The checkpoints of the run aren't needed any more.
+        checkpoint.remove(obj.parameters.country, obj.target)
+    return filenames
 
 
 def load(place, target, parameters_type = 'sample'):
@@ -62,7 +103,25 @@ def load(place, target, parameters_type = 'sample'):
                                       parameters_type)
 
 
+def load_solver_stats(place, target, parameters_type = 'sample'):
+    '''
+    Load the solver statistics saved alongside the results
+    as a :class:`pandas.DataFrame` with one row per run.
+    '''
+    return joblib.load(get_solver_stats_path(place, target,
+                                             parameters_type = parameters_type))
+
+
 def exists(place, target, parameters_type = 'sample'):
     path = get_path(place, target,
                     parameters_type = parameters_type)
     return os.path.exists(path)
+
+
+def get_nsamples(place, target):
+    '''
+    The number of samples in the results, which is less than in
+    :func:`model.parameters._get_samples` if the samples were extended
+    after the results were saved.
+    '''
+    return len(joblib.load(get_path(place, target), mmap_mode = 'r'))
@@ -0,0 +1,140 @@
+'''
+Designs of parameter samples that can be extended with more samples,
+keeping the samples already drawn, so that only the new samples need
+to be simulated.
+
+The points of a :class:`Design` are in the unit hypercube and are
+mapped through the quantile functions of the parameter distributions.
+The designs are
+
+* 'lhs': Latin hypercube sampling, extended by putting the new points
+  in the strata of the finer grid for the new number of samples that
+  have no points yet.  Growing by a whole multiple,
+  e.g. doubling, gives a Latin hypercube again.
+* 'sobol' and 'halton': scrambled quasi-Monte Carlo sequences from
+  :mod:`scipy.stats.qmc`, extended by continuing the sequence,
+  so that every prefix of the samples is a design.
+  For Sobol, the numbers of samples should be powers of 2.
+'''
+
+import unittest
+
+import numpy
+from scipy.stats import qmc
+
+
+methods = ('lhs', 'sobol', 'halton')
+
+
+def _extend_lhs(points, nsamples, rng):
+    (n, d) = points.shape
+    new = numpy.empty((nsamples - n, d))
+    for j in range(d):
+        occupied = numpy.zeros(nsamples, dtype = bool)
+        occupied[numpy.minimum(numpy.floor(points[:, j] * nsamples),
+                               nsamples - 1).astype(int)] = True
+        # There are at least `nsamples - n` empty strata.
+        strata = rng.choice(numpy.flatnonzero(~ occupied),
+                            nsamples - n, replace = False)
+        new[:, j] = ((strata + rng.uniform(size = len(strata)))
+                     / nsamples)
+    return new
+
+
+def _extend_qmc(method, seed, points, nsamples):
+    (n, d) = points.shape
+    engine_class = dict(sobol = qmc.Sobol, halton = qmc.Halton)[method]
+    engine = engine_class(d, seed = seed)
+    if n > 0:
+        engine.fast_forward(n)
+    return engine.random(nsamples - n)
+
+
+class Design:
+    '''
+    A design by `method`, one of :data:`methods`, with :attr:`points`
+    in the unit hypercube of dimension `d`, one row per sample.
+    `seed` fixes the scrambling of the quasi-Monte Carlo designs
+    and the random strata and points of the Latin hypercube designs.
+    '''
+    def __init__(self, d, method = 'lhs', seed = None):
+        if method not in methods:
+            raise ValueError("Unknown method '{}'!".format(method))
+        self.method = method
+        if seed is None:
+            seed = numpy.random.randint(2 ** 31)
+        self.seed = seed
+        self.points = numpy.empty((0, d))
+
+    def __len__(self):
+        return len(self.points)
+
+    def extend(self, nsamples):
+        '''
+        Add points to make `nsamples` in total,
+        returning the new points.
+        '''
+        if nsamples < len(self):
+            raise ValueError('The design already has {} samples!'.format(
+                len(self)))
+        if self.method == 'lhs':
+            # Seed with the current size too, so that each extension
+            # draws different points.
+            rng = numpy.random.default_rng((self.seed, len(self)))
+            new = _extend_lhs(self.points, nsamples, rng)
+        else:
+            new = _extend_qmc(self.method, self.seed, self.points, nsamples)
+        self.points = numpy.vstack((self.points, new))
+        return new
+
+    def get_samples(self, rvs, start = 0):
+        '''
+        The values of the random variables `rvs` of the points
+        from `start` on, one row per sample.
+        '''
+        return numpy.column_stack([rv.ppf(u)
+                                   for (rv, u) in zip(rvs,
+                                                      self.points[start : ].T)])
+
+    @classmethod
+    def from_samples(cls, rvs, samples):
+        '''
+        The Latin hypercube design of the values `samples`
+        of the random variables `rvs`, e.g. from
+        :func:`model.latin_hypercube_sampling.lhs`.
+        '''
+        design = cls(len(rvs), method = 'lhs')
+        design.points = numpy.column_stack([rv.cdf(x)
+                                            for (rv, x) in zip(rvs,
+                                                               samples.T)])
+        return design
+
+
+class TestSampling(unittest.TestCase):
+    def assertIsLHS(self, points):
+        strata = numpy.floor(points * len(points))
+        for s in strata.T:
+            self.assertEqual(len(numpy.unique(s)), len(points))
+
+    def test_lhs(self):
+        design = Design(3, method = 'lhs', seed = 1)
+        design.extend(10)
+        self.assertIsLHS(design.points)
+        old = design.points.copy()
+        design.extend(30)
+        self.assertTrue(numpy.array_equal(design.points[ : 10], old))
+        self.assertIsLHS(design.points)
+        again = Design(3, method = 'lhs', seed = 1)
+        again.extend(10)
+        again.extend(30)
+        self.assertTrue(numpy.array_equal(design.points, again.points))
+
+    def test_qmc(self):
+        for method in ('sobol', 'halton'):
+            with self.subTest(method = method):
+                design = Design(3, method = method, seed = 1)
+                design.extend(8)
+                design.extend(16)
+                whole = Design(3, method = method, seed = 1)
+                whole.extend(16)
+                self.assertTrue(numpy.allclose(design.points, whole.points))
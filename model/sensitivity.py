@@ -0,0 +1,198 @@
+'''
+Sensitivity of the differences between pairs of targets
+to the parameters over time.
+
+For each place, :func:`get_outcomes` extracts the differences,
+paired by sample, for each of :data:`model.differences.pairs` and
+:data:`stats` at the yearly :data:`times` once, and saves them.
+:func:`build_all` then computes the PRCCs of the parameters with
+all of these, for all the pairs, stats, and times of a place at once,
+with Fisher or bootstrap (:mod:`model.bootstrap`) confidence intervals,
+and saves them as :class:`Trajectories`.
+'''
+
+import os.path
+
+import joblib
+import numpy
+import pandas
+
+from . import bootstrap
+from . import datasheet
+from . import differences
+from . import output_dir
+from . import parameters
+from . import prcc
+from . import regions
+from . import resources
+from . import results
+from . import simulation
+
+
+trajectoriesfile = os.path.join(output_dir.output_dir, 'sensitivity.pkl')
+
+stats = ('new_infections', 'infected', 'dead', 'incidence_per_capita')
+
+# Yearly.
+times = numpy.arange(int(numpy.ceil(simulation.t[0])),
+                     int(numpy.floor(simulation.t[-1])) + 1)
+
+
+class Outcomes:
+    '''
+    The differences, baseline minus intervention, for `place`
+    of `pairs`, with :attr:`values` of shape
+    ``(nsamples, len(pairs), len(stats), len(times))``.
+    A pair with missing results is NaN.
+    '''
+    def __init__(self, place, pairs = differences.pairs, stats = stats,
+                 times = times):
+        self.place = place
+        self.pairs = [differences._get_pair_key(pair) for pair in pairs]
+        self.stats = list(stats)
+        self.times = numpy.asarray(times)
+        i_times = numpy.searchsorted(simulation.t, self.times)
+        # Load each target once, keeping only the times needed.
+        values = {}
+        for target in set(t for pair in self.pairs for t in pair):
+            try:
+                res = results.load(place, target)
+            except FileNotFoundError:
+                continue
+            values[target] = numpy.stack(
+                [differences._get_stat(res, stat)[:, i_times]
+                 for stat in self.stats],
+                axis = 1)
+        # Pair the samples that all the targets have.
+        # See :class:`model.adaptive.AdaptiveMultiSim`.
+        nsamples = min((len(v) for v in values.values()),
+                       default = parameters.nsamples)
+        self.values = numpy.full((nsamples, len(self.pairs),
+                                  len(self.stats), len(self.times)),
+                                 numpy.nan, dtype = numpy.float32)
+        for (i, (baseline, intervention)) in enumerate(self.pairs):
+            if (baseline in values) and (intervention in values):
+                self.values[:, i] = (values[baseline][ : nsamples]
+                                     - values[intervention][ : nsamples])
+
+
+def get_path(place):
+    return os.path.join(output_dir.output_dir, place, 'outcomes.pkl')
+
+
+def _build(place, overwrite):
+    # Don't send the outcomes back to the parent process.
+    get_outcomes(place, overwrite)
+
+
+def get_outcomes(place, overwrite = False):
+    '''
+    Load the :class:`Outcomes` for `place`,
+    extracting and saving them first if needed.
+    '''
+    path = get_path(place)
+    if overwrite or not os.path.exists(path):
+        outcomes = Outcomes(place)
+        results.dump_atomic(outcomes, path)
+        return outcomes
+    return joblib.load(path)
+
+
+def _get_prcc(place, X, alpha, nboot, seed):
+    '''
+    The PRCCs for `place` for all the pairs, stats, and times at once,
+    and their confidence intervals, from `nboot` bootstrap resamples,
+    or from Fisher's z-transformation if `nboot` is 0.
+    '''
+    values = get_outcomes(place).values
+    X = X[ : len(values)]
+    rho = prcc.prcc(X, values)
+    if nboot > 0:
+        # The same resamples for the places with the same samples.
+        indices = bootstrap.get_indices(len(values), nboot = nboot,
+                                        seed = seed)
+        CI = bootstrap.prcc_CI(X, values, alpha = alpha, indices = indices)
+    else:
+        CI = prcc.get_CI(rho, len(values), alpha = alpha)
+    return (rho, CI)
+
+
+class Trajectories:
+    '''
+    The PRCCs over time of the parameters with :class:`Outcomes`
+    for `places`, with :attr:`rho` of shape
+    ``(nparameters, len(places), len(pairs), len(stats), len(times))``,
+    and their `1 - alpha` confidence intervals :attr:`CI`,
+    with an extra last axis for the lower and upper bounds.
+    The confidence intervals are from `nboot` bootstrap resamples,
+    the same for the places with the same number of samples,
+    or, if `nboot` is 0, from Fisher's z-transformation.
+    The places are done in parallel with `parallel`.
+    '''
+    def __init__(self, places, alpha = 0.05, nboot = 0, parallel = None):
+        self.places = list(places)
+        self.parameter_names = parameters.Parameters.get_rv_names()
+        self.alpha = alpha
+        self.nboot = nboot
+        X = parameters._get_samples()
+        outcomes = get_outcomes(self.places[0])
+        self.pairs = outcomes.pairs
+        self.stats = outcomes.stats
+        self.times = outcomes.times
+        self.nsamples = len(outcomes.values)
+        del outcomes
+        seed = numpy.random.randint(2 ** 31)
+        if parallel is None:
+            parallel = joblib.Parallel(n_jobs = 1)
+        rho, CI = zip(*parallel(
+            joblib.delayed(_get_prcc)(place, X, alpha, nboot, seed)
+            for place in self.places))
+        self.rho = numpy.stack(rho, axis = 1)
+        self.CI = numpy.stack(CI, axis = 1)
+
+    def get(self, place, baseline, intervention, stat):
+        '''
+        The PRCCs for `place` as a :class:`pandas.DataFrame`
+        with rows for the parameters and columns for the times.
+        '''
+        i = self.places.index(place)
+        j = self.pairs.index(differences._get_pair_key((baseline,
+                                                        intervention)))
+        k = self.stats.index(stat)
+        return pandas.DataFrame(self.rho[:, i, j, k],
+                                index = self.parameter_names,
+                                columns = self.times)
+
+    def dump(self, path = None):
+        if path is None:
+            path = trajectoriesfile
+        results.dump_atomic(self, path)
+
+    @classmethod
+    def load(cls, path = None):
+        if path is None:
+            path = trajectoriesfile
+        return joblib.load(path)
+
+
+def build_all(places = None, overwrite = False, nboot = 0):
+    '''
+    Extract the :class:`Outcomes` for each of `places` in parallel,
+    then compute and save their :class:`Trajectories`,
+    also in parallel.
+    '''
+    if places is None:
+        places = list(regions.regions) + datasheet.get_country_list()
+    places = [place for place in places
+              if any(results.exists(place, target)
+                     for pair in differences.pairs
+                     for target in pair)]
+    # Each job has the results of one target in memory at a time.
+    job_memory = resources.get_job_memory(parameters.nsamples)
+    with resources.parallel(job_memory) as parallel:
+        parallel(joblib.delayed(_build)(place, overwrite)
+                 for place in places)
+        trajectories = Trajectories(places, nboot = nboot,
+                                    parallel = parallel)
+    trajectories.dump()
+    return trajectories
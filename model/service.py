@@ -0,0 +1,362 @@
+'''
+A long-lived local service that answers queries for results.
+
+:class:`Service` listens on a Unix socket, :data:`socket_path`,
+keeping the datasheet and the parameter samples in memory,
+and the most recently used results memory-mapped, so the operating
+system keeps as much of them in memory as there is room for.
+A query is for a statistic of the results for a place and target,
+e.g. ``prevalence``, optionally at some years and summarized
+over the samples.  Results that don't exist yet are solved
+in a pool of worker processes and saved with :mod:`model.results`.
+The answers to several queries are streamed back as each is ready.
+
+:class:`Client` talks to the service, and :meth:`Client.load`
+stands in for :func:`model.results.load`::
+
+    client = model.service.Client()
+    results = client.load('South Africa', model.target.StatusQuo(), 'mode')
+    results.prevalence
+
+The messages are pickled, so the service should only be reachable
+by trusted users, which the permissions of the socket ensure.
+'''
+
+import asyncio
+import collections
+import concurrent.futures
+import os
+import pickle
+import socket
+import struct
+import tempfile
+import unittest
+
+import numpy
+
+from . import datasheet
+from . import output_dir
+from . import parameters
+from . import resources
+from . import results
+from . import simulation
+from . import target as target_
+
+
+socket_path = os.environ.get(
+    'HIV_SERVICE_SOCKET',
+    os.path.join(tempfile.gettempdir(),
+                 'hiv-model-{}.sock'.format(os.getuid())))
+
+# The most results to keep memory-mapped.
+max_cached = 100
+
+# The summaries over the samples.
+summaries = dict(mean = numpy.mean,
+                 median = numpy.median,
+                 std = numpy.std,
+                 min = numpy.min,
+                 max = numpy.max)
+
+# Each message is its length followed by the pickled value.
+_header = struct.Struct('!Q')
+
+
+def _get_message(value):
+    data = pickle.dumps(value, protocol = -1)
+    return _header.pack(len(data)) + data
+
+
+async def _read_message(reader):
+    (size, ) = _header.unpack(await reader.readexactly(_header.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+def _solve(place, target, parameters_type):
+    '''
+    Solve and save the results for `place` and `target`.
+    This runs in the worker processes.
+    '''
+    if parameters_type == 'mode':
+        sim = simulation.Simulation(parameters.Mode.from_country(place),
+                                    target)
+    elif parameters_type == 'sample':
+        sim = simulation.MultiSim(parameters.Samples(place), target)
+    else:
+        raise ValueError(
+            "Unknown parameters_type '{}'!".format(parameters_type))
+    results.dump(sim, parameters_type = parameters_type)
+
+
+def get_stat(res, stat, years = None, summary = None):
+    '''
+    The statistic `stat` of `res` at `years`, or all times,
+    summarized over the samples with `summary`,
+    one of :data:`summaries` or a quantile or list of quantiles.
+    '''
+    x = numpy.asarray(getattr(res, stat))
+    if (years is not None) and (numpy.shape(x)[-1] == len(simulation.t)):
+        x = x[..., numpy.isin(simulation.t, years)]
+    if summary is None:
+        return x
+    elif summary in summaries:
+        return summaries[summary](x, axis = 0)
+    else:
+        return numpy.quantile(x, summary, axis = 0)
+
+
+class Service:
+    '''
+    Answer queries from :class:`Client` on `path`.
+
+    The missing results are solved with `executor`,
+    by default a :class:`concurrent.futures.ProcessPoolExecutor`
+    with as many workers as :func:`model.resources.get_n_jobs` allows.
+    '''
+    def __init__(self, path = socket_path, executor = None):
+        self.path = path
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(
+                resources.get_n_jobs())
+        self.executor = executor
+        # The results loaded, the most recently used last.
+        self.cache = collections.OrderedDict()
+        # The results being loaded or solved.
+        self.pending = {}
+        # Load the datasheet and the parameters of the countries
+        # to have them in memory.
+        self.countries = datasheet.get_country_list()
+        for country in self.countries:
+            simulation._get_country_parameters(country)
+
+    async def _load_or_solve(self, place, target, parameters_type):
+        if ((not results.exists(place, target, parameters_type))
+                and (place in self.countries)):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, _solve,
+                                       place, target, parameters_type)
+        # Keep the memmap rather than reading it into memory.
+        return results.load(place, target, parameters_type)
+
+    async def get_results(self, place, target, parameters_type = 'sample'):
+        key = (place, str(target), parameters_type)
+        try:
+            res = self.cache[key]
+        except KeyError:
+            pass
+        else:
+            self.cache.move_to_end(key)
+            return res
+        # Only load or solve once for simultaneous queries.
+        if key not in self.pending:
+            self.pending[key] = asyncio.ensure_future(
+                self._load_or_solve(place, target, parameters_type))
+        task = self.pending[key]
+        try:
+            res = await task
+        finally:
+            self.pending.pop(key, None)
+        self.cache[key] = res
+        while len(self.cache) > max_cached:
+            self.cache.popitem(last = False)
+        return res
+
+    async def query(self, place, target, stat, years = None,
+                    summary = None, parameters_type = 'sample'):
+        res = await self.get_results(place, target, parameters_type)
+        loop = asyncio.get_running_loop()
+        # Some statistics take a while to compute.
+        return await loop.run_in_executor(None, get_stat, res, stat,
+                                          years, summary)
+
+    async def _answer(self, i, query, writer):
+        try:
+            value = await self.query(**query)
+        except Exception as exception:
+            writer.write(_get_message((i, False, exception)))
+        else:
+            writer.write(_get_message((i, True, value)))
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    queries = await _read_message(reader)
+                except asyncio.IncompleteReadError:
+                    # The client closed the connection.
+                    break
+                await asyncio.gather(*(self._answer(i, query, writer)
+                                       for (i, query) in enumerate(queries)))
+                # Mark the end of the answers.
+                writer.write(_get_message((None, True, None)))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        # Only the user can connect, from when the socket is created.
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle,
+                                                     self.path)
+        finally:
+            os.umask(umask)
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        finally:
+            self.executor.shutdown()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class _Results:
+    '''
+    Stand in for results from :func:`model.results.load`,
+    getting the statistics from the service.
+    '''
+    def __init__(self, client, place, target, parameters_type):
+        self._client = client
+        self._query = dict(place = place, target = target,
+                           parameters_type = parameters_type)
+
+    def __getattr__(self, stat):
+        if stat.startswith('_'):
+            raise AttributeError(stat)
+        return self._client.get(stat = stat, **self._query)
+
+
+class Client:
+    '''
+    A connection to :class:`Service` on `path`.
+    '''
+    def __init__(self, path = socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.file = self.socket.makefile('rb')
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read(self, size):
+        data = self.file.read(size)
+        if len(data) < size:
+            raise ConnectionError('The service closed the connection!')
+        return data
+
+    def _read_message(self):
+        (size, ) = _header.unpack(self._read(_header.size))
+        return pickle.loads(self._read(size))
+
+    def query(self, queries):
+        '''
+        Send `queries`, each a `dict` of the arguments of
+        :meth:`Service.query`, and yield ``(i, value)`` for the `i`-th
+        query as each answer arrives.
+        '''
+        queries = list(queries)
+        self.socket.sendall(_get_message(queries))
+        error = None
+        while True:
+            (i, ok, value) = self._read_message()
+            if i is None:
+                break
+            elif not ok:
+                # Read the rest of the answers before raising.
+                if error is None:
+                    error = value
+            elif error is None:
+                yield (i, value)
+        if error is not None:
+            raise error
+
+    def get(self, place, target, stat, years = None, summary = None,
+            parameters_type = 'sample'):
+        '''
+        The statistic `stat` for `place` and `target`
+        at `years` summarized with `summary`.
+        See :func:`get_stat`.
+        '''
+        query = dict(place = place, target = target, stat = stat,
+                     years = years, summary = summary,
+                     parameters_type = parameters_type)
+        ((_, value), ) = self.query([query])
+        return value
+
+    def load(self, place, target, parameters_type = 'sample'):
+        '''
+        Like :func:`model.results.load`, but with the statistics
+        of the results from the service.
+        '''
+        return _Results(self, place, target, parameters_type)
+
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        import threading
+        self.dir = tempfile.TemporaryDirectory()
+        self.output_dir = output_dir.output_dir
+        output_dir.output_dir = self.dir.name
+        path = os.path.join(self.dir.name, 'service.sock')
+        self.service = Service(
+            path,
+            executor = concurrent.futures.ThreadPoolExecutor(1))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target = self.loop.run_forever)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_unix_server(self.service._handle, path),
+            self.loop).result()
+        self.client = Client(path)
+
+    def tearDown(self):
+        self.client.close()
+        asyncio.run_coroutine_threadsafe(self._close_server(),
+                                         self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.service.executor.shutdown()
+        output_dir.output_dir = self.output_dir
+        self.dir.cleanup()
+
+    async def _close_server(self):
+        self.server.close()
+        await self.server.wait_closed()
+        # Let the client's connection finish.
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        await asyncio.gather(*tasks)
+
+    def test_query(self):
+        country = 'Nigeria'
+        target = target_.StatusQuo()
+        years = [2020, 2035]
+        # This solves and caches the results.
+        res = self.client.load(country, target, 'mode')
+        prevalence = res.prevalence
+        sim = simulation.Simulation(parameters.Mode.from_country(country),
+                                    target)
+        self.assertTrue(numpy.allclose(prevalence, sim.prevalence))
+        queries = [dict(place = country, target = target, stat = stat,
+                        years = years, parameters_type = 'mode')
+                   for stat in ('infected', 'alive')]
+        answers = dict(self.client.query(queries))
+        for (i, query) in enumerate(queries):
+            self.assertTrue(numpy.allclose(
+                answers[i],
+                get_stat(sim, query['stat'], years = years)))
+        with self.assertRaises(AttributeError):
+            res.not_a_stat
@@ -3,20 +3,30 @@ Simulation of the HIV model.
 '''
 
 import copy
+import functools
+import os.path
+import tempfile
+import time
+import warnings
 
 import joblib
 import numpy
+import pandas
 
+from . import checkpoint
 from . import control_rates
 # from . import cost
 from . import effectiveness
+from . import exponential_integrator
 from . import incidence
 # from . import net_benefit
 from . import ODEs
 from . import parameters
 from . import plot
 from . import proportions
+from . import resources
 from . import results
+from . import solver_tuning
 
 
 t_start = 2015
@@ -25,6 +35,10 @@ pts_per_year = 120  # = 10 per month
 t = numpy.linspace(t_start, t_end,
                    numpy.abs(t_end - t_start) * pts_per_year + 1)
 
+# Where to put the memmaps shared with the worker processes:
+# a file system in memory, if there is one.
+_shared_memory_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
 
 def _add_ODE_vars_as_attrs(cls):
     '''
@@ -155,32 +169,300 @@ class Simulation(_Super):
         self.solve()
 
     def solve(self):
-        self.state = ODEs.solve(t, self.target, self.parameters,
-                                *self.args,
-                                **self.kwargs)
+        (self.state, self.solver_stats) = ODEs.solve(
+            t, self.target, self.parameters,
+            *self.args,
+            full_output = True,
+            **self.kwargs)
 
     def plot(self, *args, **kwargs):
         plot.simulation_(self, *args, **kwargs)
 
 
+# Solver settings to fall back on, in order, when a sample fails.
+# :func:`model.ODEs.solve` has already re-run with ``use_log = False``
+# when the solution had NaNs.
+# These are all adaptive solvers: a sample that none of them can solve
+# stays NaN, and is so excluded from the statistics, rather than
+# getting the less accurate solution of the exponential integrator.
+fallbacks = (
+    dict(integrator = 'odeint', use_log = False, rtol = 1e-6, atol = 1e-6),
+    dict(integrator = 'lsoda', use_log = False),
+    dict(integrator = 'lsoda', use_log = False, rtol = 1e-4, atol = 1e-4),
+)
+
+# The errors from a failed solve.
+_solver_errors = (ArithmeticError, AssertionError, RuntimeError, ValueError)
+
+
+def _solve_sample(params, target, args, kwargs, fallbacks = fallbacks):
+    '''
+    Solve for one sample, falling back on other solver settings
+    when it fails.  If they all fail, the solution is NaN
+    and `'failure'` in the solver statistics gives the reasons.
+    '''
+    time_start = time.time()
+    failures = []
+    tried = []
+    for kwds in (kwargs, ) + tuple(dict(kwargs, **f) for f in fallbacks):
+        if kwds in tried:
+            continue
+        tried.append(kwds)
+        try:
+            (state, info) = ODEs.solve(t, target, params, *args,
+                                       full_output = True, **kwds)
+        except _solver_errors as exc:
+            settings = {k: v for (k, v) in kwds.items()
+                        if k in solver_tuning.settings}
+            failures.append('{}: {}: {}'.format(settings,
+                                                type(exc).__name__,
+                                                exc))
+        else:
+            info.update(nfallbacks = len(failures),
+                        time = time.time() - time_start)
+            return (state, info)
+    failure = '; '.join(failures)
+    warnings.warn("country = '{}': all solvers failed!  {}".format(
+        getattr(params, 'country', None), failure))
+    state = numpy.full((len(t), len(ODEs.variables)), numpy.nan)
+    info = dict(nfallbacks = len(failures),
+                failure = failure,
+                time = time.time() - time_start)
+    return (state, info)
+
+
+def _get_solver_kwargs(params, kwargs):
+    # Use the solver settings tuned for the country, if any,
+    # for the settings that aren't given.
+    country = getattr(params, 'country', None)
+    return dict(solver_tuning.get_profile(country), **kwargs)
+
+
+@functools.lru_cache()
+def _get_country_parameters(country):
+    return parameters.Parameters(country)
+
+
+def _solve_sample_shared(country, values, i, target, args, kwargs, out):
+    '''
+    Solve for the sample with parameter values `values[i]`,
+    writing the solution into `out[i]` and returning the solver
+    statistics.  When `values` and `out` are memmaps, joblib passes
+    them to the worker by reference, so the samples and solutions
+    aren't copied between the processes.
+    '''
+    params = parameters.Sample(_get_country_parameters(country), values[i])
+    (out[i], info) = _solve_sample(params, target, args, kwargs)
+    return info
+
+
+def _solve_samples(params, start, stop, target, args, kwargs, parallel):
+    if kwargs.get('integrator') == 'expo':
+        # The exponential integrator solves all the samples together.
+        samples = list(params)[start : stop]
+        time_start = time.time()
+        (state, info) = exponential_integrator.solve(t, target, samples,
+                                                     full_output = True)
+        # Split the time evenly over the samples.
+        time_sample = (time.time() - time_start) / len(state)
+        solver_stats = [dict(nsteps = info['nsteps'],
+                             time = time_sample,
+                             integrator = 'expo',
+                             use_log = False,
+                             controls = 'expo',
+                             nfallbacks = 0)
+                        for _ in range(len(state))]
+        # Re-solve the samples that failed, one at a time.
+        failed = numpy.any(numpy.isnan(state), axis = (1, 2))
+        kwargs = {k: v for (k, v) in kwargs.items() if k != 'integrator'}
+        for i in numpy.flatnonzero(failed):
+            (state[i], solver_stats[i]) = _solve_sample(
+                samples[i], target, args, kwargs)
+            solver_stats[i]['nfallbacks'] += 1
+            solver_stats[i]['time'] += time_sample
+    elif isinstance(params, parameters.Samples):
+        # Pass the workers the parameter values,
+        # which are a memmap of :data:`model.parameters.samplesfile`,
+        # and have them write the solutions to a memmap.
+        with tempfile.TemporaryDirectory(dir = _shared_memory_dir) as dir_:
+            out = numpy.memmap(os.path.join(dir_, 'state'),
+                               dtype = float,
+                               mode = 'w+',
+                               shape = (stop - start,
+                                        len(t),
+                                        len(ODEs.variables)))
+            solver_stats = parallel(
+                joblib.delayed(_solve_sample_shared)(params.country,
+                                                     params.values[start
+                                                                   : stop],
+                                                     i, target, args, kwargs,
+                                                     out)
+                for i in range(stop - start))
+            state = numpy.array(out)
+            del out
+    else:
+        solutions = parallel(
+            joblib.delayed(_solve_sample)(p, target, args, kwargs)
+            for p in list(params)[start : stop])
+        state = numpy.array([s for (s, _) in solutions])
+        solver_stats = [info for (_, info) in solutions]
+    return (state, solver_stats)
+
+
+def solve_samples(samples, target, *args, parallel = None, **kwargs):
+    '''
+    Solve for each of the parameter sets `samples`,
+    e.g. a `list` of :class:`model.parameters.Sample`,
+    like the samples of :class:`MultiSim`, returning the solutions
+    and a `list` of the solver statistics.
+
+    `parallel` is a :class:`joblib.Parallel` to solve the samples with,
+    or ``None`` to solve them one at a time in this process.
+    '''
+    samples = list(samples)
+    if len(samples) > 0:
+        kwargs = _get_solver_kwargs(samples[0], kwargs)
+    if parallel is None:
+        parallel = joblib.Parallel(n_jobs = 1)
+    return _solve_samples(samples, 0, len(samples), target,
+                          args, kwargs, parallel)
+
+
+def get_checkpoint_key(params, start, stop, *args, **kwargs):
+    '''
+    The key of the :mod:`model.checkpoint` of samples `start` to `stop`
+    of `params`: the solver settings and a digest of the parameter
+    values, so only checkpoints of the same samples solved
+    with the same settings are reused.
+    '''
+    kwargs = _get_solver_kwargs(params, kwargs)
+    return (args, kwargs,
+            checkpoint.get_digest(params.values[start : stop]))
+
+
+def solve_chunk(params, target, start, stop, *args,
+                checkpoints = True, parallel = None, **kwargs):
+    '''
+    Solve for samples `start` to `stop` of `params`,
+    returning the solutions and a `list` of the solver statistics.
+
+    With `checkpoints`, the samples of :class:`model.parameters.Samples`
+    are saved by :mod:`model.checkpoint`, or loaded if they already
+    were with the same settings and parameter values.
+
+    `parallel` is a :class:`joblib.Parallel` to use,
+    or ``None`` to use one from :func:`model.resources.parallel`.
+    '''
+    kwargs = _get_solver_kwargs(params, kwargs)
+    use_checkpoints = (checkpoints
+                       and isinstance(params, parameters.Samples))
+    if use_checkpoints:
+        key = get_checkpoint_key(params, start, stop, *args, **kwargs)
+        chunk = checkpoint.load(params.country, target, start, stop, key)
+        if chunk is not None:
+            return chunk
+    if parallel is None:
+        with resources.parallel(verbose = 5) as parallel:
+            chunk = _solve_samples(params, start, stop, target,
+                                   args, kwargs, parallel)
+    else:
+        chunk = _solve_samples(params, start, stop, target,
+                               args, kwargs, parallel)
+    if use_checkpoints:
+        checkpoint.dump(params.country, target, start, stop, key, *chunk)
+    return chunk
+
+
 class MultiSim(_Super):
     '''
     A class to hold the multi-simulation information.
+
+    Each sample is solved separately, so one that fails doesn't stop
+    the others: it is re-solved with each of :data:`fallbacks` in turn
+    and, if they all fail, its solution is NaN and the reasons are
+    in the `'failure'` column of :attr:`solver_stats`.
+
+    With `checkpoints`, the samples of :class:`model.parameters.Samples`
+    are solved in chunks that are saved by :mod:`model.checkpoint`,
+    and the chunks already saved from an interrupted run are reused.
     '''
-    def __init__(self, params, target, *args, **kwargs):
+    def __init__(self, params, target, *args, checkpoints = True, **kwargs):
         self.parameters = params
         self.target = target
         self.args = args
         self.kwargs = kwargs
+        self.checkpoints = checkpoints
         self.solve()
 
-    def solve(self):
-        with joblib.Parallel(n_jobs = -1, verbose = 5) as parallel:
-            simulations = parallel(
-                joblib.delayed(Simulation)(p, self.target,
-                                           *self.args, **self.kwargs)
-                for p in self.parameters)
-        self.state = numpy.array([s.state for s in simulations])
+    def solve(self, state = None, solver_stats = None):
+        '''
+        Solve the samples, reusing the solutions `state`
+        and their `solver_stats` of the first samples, if given.
+        '''
+        nsamples = len(list(self.parameters))
+        nsolved = 0 if state is None else len(state)
+        # Fill in the chunks as they are solved.
+        self.state = numpy.empty((nsamples, len(t), len(ODEs.variables)))
+        if state is not None:
+            self.state[ : nsolved] = state
+        new_stats = []
+        with resources.parallel(verbose = 5) as parallel:
+            for (start, stop) in checkpoint.get_chunks(nsamples):
+                if stop <= nsolved:
+                    continue
+                start = max(start, nsolved)
+                (self.state[start : stop], stats) = solve_chunk(
+                    self.parameters, self.target, start, stop, *self.args,
+                    checkpoints = self.checkpoints,
+                    parallel = parallel,
+                    **self.kwargs)
+                new_stats.extend(stats)
+                nsolved = stop
+                if self._is_done(nsolved):
+                    break
+        self.state = self.state[ : nsolved]
+        new_stats = pandas.DataFrame(
+            new_stats,
+            columns = ODEs.solver_info_fields + ('integrator',
+                                                 'use_log',
+                                                 'controls',
+                                                 'nfallbacks',
+                                                 'failure'))
+        if solver_stats is not None:
+            new_stats = pandas.concat((solver_stats, new_stats),
+                                      ignore_index = True)
+        self.solver_stats = new_stats
+        self.solver_stats.index.name = 'sample'
+
+    def _is_done(self, nsolved):
+        '''
+        Whether to stop after solving the first `nsolved` samples.
+        See :class:`model.adaptive.AdaptiveMultiSim`.
+        '''
+        return False
+
+    @classmethod
+    def extend(cls, country, target, *args, checkpoints = True, **kwargs):
+        '''
+        Solve only the samples added by
+        :func:`model.parameters.extend_samples` since the results
+        for `country` and `target` were saved,
+        reusing the saved solutions of the others.
+        '''
+        obj = cls.__new__(cls)
+        obj.parameters = parameters.Samples(country)
+        obj.target = target
+        obj.args = args
+        obj.kwargs = kwargs
+        obj.checkpoints = checkpoints
+        path = results.get_path(country, target)
+        try:
+            solver_stats = results.load_solver_stats(country, target)
+        except FileNotFoundError:
+            solver_stats = None
+        obj.solve(state = joblib.load(path, mmap_mode = 'r'),
+                  solver_stats = solver_stats)
+        return obj
 
     def dump(self):
         return super().dump(parameters_type = 'sample')
@@ -0,0 +1,410 @@
+r'''
+Switch the control rates exactly when the proportions diagnosed,
+treated, suppressed, and vaccinated hit their targets,
+instead of smoothing the switch with :func:`model.control_rates.ramp`.
+
+Each control rate is either off, on at its maximum
+(:class:`model.control_rates.ControlRatesMax`), or sliding along the
+target of the proportion it controls.  The rates of change of the
+proportions :math:`\mathbf{p}` are affine in the control rates
+:math:`\mathbf{r}`,
+
+.. math:: \frac{\mathrm{d}\mathbf{p}}{\mathrm{d}t}
+          = \mathbf{a} + B \mathbf{r},
+
+so while the proportions in the set :math:`S` are at their targets
+:math:`\mathbf{T}(t)`, their control rates are the equivalent controls
+that keep them there,
+
+.. math:: B_{S S} \mathbf{r}_S
+          = \mathbf{T}_S'(t) - \mathbf{a}_S - B_{S \bar{S}}
+          \mathbf{r}_{\bar{S}}
+          + \frac{\mathbf{T}_S(t) - \mathbf{p}_S}{\tau},
+
+where the :math:`\tau` term stops the proportions from drifting off
+their targets.  The proportions must be solved for together because
+nonadherence does not change the proportion suppressed directly,
+only through the treatment rate needed to hold the proportion
+treated at its target.
+
+The solver stops at each event where a proportion hits its target or
+an equivalent control leaves :math:`[0, R]`, and restarts with the new
+modes.
+'''
+
+import time
+import unittest
+
+import numpy
+from scipy import integrate
+
+from . import control_rates
+from . import ODEs
+
+
+# In the order of :data:`model.control_rates.names`.
+controls = ('diagnosis', 'treatment', 'nonadherence', 'vaccination')
+
+# The proportion that each control acts on.
+proportion_names = ('diagnosed', 'treated', 'suppressed', 'vaccinated')
+
+# +1 if the control is on when the proportion is below its target,
+# -1 if the control is on when the proportion is above its target.
+_signs = numpy.array((1, 1, -1, 1))
+
+# The numerator and denominator of each proportion,
+# as in :func:`model.proportions.get`.
+_fractions = (('DTVW', 'AUDTVW'),
+              ('TVW', 'DTVW'),
+              ('V', 'TV'),
+              ('Q', 'SQ'))
+_numerators = numpy.array([[x in num for x in 'SQAUDTVWZR']
+                           for (num, den) in _fractions], dtype = float).T
+_denominators = numpy.array([[x in den for x in 'SQAUDTVWZR']
+                             for (num, den) in _fractions], dtype = float).T
+
+OFF = 'off'
+ON = 'on'
+SLIDING = 'sliding'
+
+# The tolerances used by :func:`scipy.integrate.odeint`.
+rtol = atol = 1.49012e-8
+
+
+def _divide(a, b):
+    '''
+    Return a / b, or 0 where b is 0.
+    '''
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        return numpy.where(b > 0, numpy.divide(a, b), 0)
+
+
+def get_proportions(state):
+    '''
+    The proportions diagnosed, treated, suppressed, and vaccinated,
+    stacked on the last axis.
+    '''
+    return _divide(state @ _numerators, state @ _denominators)
+
+
+def get_proportions_rate(state, dstate, proportions_):
+    '''
+    The rates of change of the proportions given the rate of change
+    of the state, `dstate`.
+    '''
+    return _divide(dstate @ _numerators
+                   - proportions_ * (dstate @ _denominators),
+                   state @ _denominators)
+
+
+_zero = numpy.zeros(len(controls))
+
+
+def _get_zero(t, state, target, parameters):
+    return _zero
+
+
+def get_sensitivities(state, proportions_):
+    r'''
+    The matrix :math:`B` of the derivatives of the rates of change of
+    the proportions with respect to the control rates.
+    '''
+    S, Q, A, U, D, T, V, W = numpy.moveaxis(state[..., : 8], -1, 0)
+    X = D + T + V + W
+    I = A + U + X
+    (diagnosed, treated, suppressed, vaccinated) = numpy.moveaxis(
+        proportions_, -1, 0)
+    B = numpy.zeros(numpy.shape(state)[ : -1]
+                    + (len(proportion_names), len(controls)))
+    # Diagnosis moves U to D.
+    B[..., 0, 0] = _divide(U, I)
+    B[..., 1, 0] = - treated * _divide(U, X)
+    # Treatment moves D to T.
+    B[..., 1, 1] = _divide(D, X)
+    B[..., 2, 1] = - suppressed * _divide(D, T + V)
+    # Nonadherence moves T and V to D.
+    B[..., 1, 2] = - _divide(T + V, X)
+    # Vaccination moves S to Q.
+    B[..., 3, 3] = _divide(S, S + Q)
+    return B
+
+
+class Controller:
+    '''
+    Control rates that switch exactly when the proportions
+    hit their targets.
+
+    Calling an instance gives the control rates like
+    :func:`model.control_rates.get`.
+    '''
+    # Proportions within this of their target are on the target.
+    tol = 1e-6
+    # Time scale for returning to the target while sliding.
+    tau = 1
+    # Time step for the derivative of the targets.
+    _dt = 1e-6
+
+    def __init__(self, target, parameters, vaccine_efficacy = 0):
+        self.target = target
+        self.parameters = parameters
+        self.vaccine_efficacy = vaccine_efficacy
+        self._rates_max = numpy.array(
+            [getattr(control_rates.ControlRatesMax, c) for c in controls])
+        self.modes = [OFF] * len(controls)
+        self._key = None
+
+    def _evaluate(self, t, state, update_modes = False):
+        '''
+        Get the switching functions, the equivalent controls,
+        and the control rates.
+        '''
+        key = (t, state.tobytes())
+        if (key == self._key) and not update_modes:
+            return self._values
+        # Force the state variables to be non-negative,
+        # like :func:`model.ODEs.rhs`.
+        state = state.copy()
+        state[ : -2] = state[ : -2].clip(0, numpy.inf)
+
+        target_values = self.target(numpy.array((t, t + self._dt)),
+                                    self.parameters)
+        target_values = numpy.array([getattr(target_values, n)
+                                     for n in proportion_names])
+        target_now = target_values[:, 0]
+        target_slope = (target_values[:, 1] - target_now) / self._dt
+
+        # The rate of change with no controls.
+        drift = numpy.asarray(ODEs.rhs(t, state.copy(), self.target,
+                                       self.parameters,
+                                       self.vaccine_efficacy,
+                                       controls = _get_zero))
+        proportions_ = get_proportions(state)
+        a = get_proportions_rate(state, drift, proportions_)
+        B = get_sensitivities(state, proportions_)
+        # The rates of change of the proportions that hold them
+        # on their targets.
+        needed = target_slope + (target_now - proportions_) / self.tau
+        switching = _signs * (target_now - proportions_)
+
+        if update_modes:
+            self._choose_modes(switching, target_slope, a, B, needed)
+
+        modes = numpy.array(self.modes)
+        rates = numpy.where(modes == ON, self._rates_max, 0.)
+        equivalent = numpy.full(len(controls), numpy.nan)
+        S = numpy.flatnonzero(modes == SLIDING)
+        if len(S) > 0:
+            equivalent[S] = numpy.linalg.solve(B[numpy.ix_(S, S)],
+                                               needed[S] - a[S]
+                                               - B[S] @ rates)
+            rates[S] = numpy.clip(equivalent[S], 0, self._rates_max[S])
+
+        self._key = key
+        self._values = dict(rates = rates,
+                            switching = switching,
+                            equivalent = equivalent)
+        return self._values
+
+    def _choose_modes(self, switching, target_slope, a, B, needed):
+        '''
+        Choose the mode of each control.
+        The controls on their targets slide together
+        unless that needs a control rate outside of :math:`[0, R]`.
+        '''
+        rates = numpy.zeros(len(controls))
+        S = []
+        for i in range(len(controls)):
+            if switching[i] > self.tol:
+                self.modes[i] = ON
+                rates[i] = self._rates_max[i]
+            elif switching[i] < - self.tol:
+                self.modes[i] = OFF
+            else:
+                S.append(i)
+        while len(S) > 0:
+            M = B[numpy.ix_(S, S)]
+            # Controls whose proportions can't be held on their targets
+            # by the controls in S are switched by which side of the
+            # target the proportion is on or heading to.
+            stuck = [i for (j, i) in enumerate(S) if not M[j].any()]
+            if (len(stuck) == 0) and (numpy.linalg.matrix_rank(M) < len(S)):
+                stuck = S[ : ]
+            if len(stuck) > 0:
+                for i in stuck:
+                    slope = _signs[i] * (target_slope[i] - a[i]
+                                         - B[i] @ rates)
+                    if ((switching[i] > 0)
+                        or ((switching[i] == 0) and (slope > 0))):
+                        self.modes[i] = ON
+                        rates[i] = self._rates_max[i]
+                    else:
+                        self.modes[i] = OFF
+                    S.remove(i)
+                continue
+            equivalent = numpy.linalg.solve(M,
+                                            needed[S] - a[S] - B[S] @ rates)
+            over = (equivalent - self._rates_max[S]) / self._rates_max[S]
+            under = - equivalent / self._rates_max[S]
+            worst = numpy.argmax(numpy.maximum(over, under))
+            if over[worst] >= 0:
+                self.modes[S[worst]] = ON
+                rates[S[worst]] = self._rates_max[S[worst]]
+                del S[worst]
+            elif under[worst] >= 0:
+                self.modes[S[worst]] = OFF
+                del S[worst]
+            else:
+                for i in S:
+                    self.modes[i] = SLIDING
+                break
+
+    def update_modes(self, t, state):
+        '''
+        Choose the mode of each control at time `t`.
+        '''
+        self._evaluate(t, state, update_modes = True)
+
+    def __call__(self, t, state, target, parameters):
+        return self._evaluate(t, state)['rates']
+
+    def get_events(self, t_offset = 0, to_state = None):
+        '''
+        Get event functions for :func:`scipy.integrate.solve_ivp`
+        that detect when the current modes end.
+        The solver time plus `t_offset` is the model time,
+        and `to_state` converts the solver variables
+        to the model state.
+        '''
+        if to_state is None:
+            to_state = numpy.asarray
+        events = []
+        for (i, mode) in enumerate(self.modes):
+            if mode == ON:
+                events.append(self._make_event('switching', i,
+                                               self.tol / 2, -1,
+                                               t_offset, to_state))
+            elif mode == OFF:
+                events.append(self._make_event('switching', i,
+                                               - self.tol / 2, 1,
+                                               t_offset, to_state))
+            else:
+                events.append(self._make_event(
+                    'equivalent', i, - self._rates_max[i] * (1 + self.tol), 1,
+                    t_offset, to_state))
+                events.append(self._make_event(
+                    'equivalent', i, self._rates_max[i] * self.tol, -1,
+                    t_offset, to_state))
+        return events
+
+    def _make_event(self, which, i, offset, direction, t_offset, to_state):
+        def event(t, y):
+            values = self._evaluate(t + t_offset, to_state(y))
+            return values[which][i] + offset
+        event.terminal = True
+        event.direction = direction
+        return event
+
+
+def solve(t, Y0, fcn, args, t_offset = 0, use_log = True,
+          max_switches = 10000, full_output = False):
+    '''
+    Solve `fcn`, :func:`model.ODEs.rhs_log` if `use_log` is true
+    or :func:`model.ODEs.rhs` otherwise, at the times `t` using
+    :func:`scipy.integrate.solve_ivp` with LSODA,
+    restarting the solver each time a control rate switches.
+
+    `args` is ``(target, parameters, vaccine_efficacy)``
+    and `t_offset` is added to the solver time
+    to get the model time.
+
+    If `full_output` is true, also return a `dict` with the number
+    of right-hand-side evaluations, the number of switches,
+    and the wall time.
+    '''
+    if use_log:
+        to_state = ODEs.transform_inv
+    else:
+        to_state = numpy.asarray
+    controller = Controller(*args)
+    args_ = tuple(args) + (controller, )
+    def fcn_args(t_, y):
+        return fcn(t_, y, *args_)
+
+    time_start = time.time()
+    Y = numpy.empty((len(t), len(Y0)))
+    Y[0] = Y0
+    info = dict(nfev = 0, nswitches = 0)
+    t_switch, Y_switch = t[0], Y0
+    i = 1
+    while True:
+        controller.update_modes(t_switch + t_offset, to_state(Y_switch))
+        sol = integrate.solve_ivp(
+            fcn_args, (t_switch, t[-1]), Y_switch,
+            method = 'LSODA',
+            dense_output = True,
+            events = controller.get_events(t_offset, to_state),
+            rtol = rtol,
+            atol = atol)
+        if sol.status < 0:
+            raise RuntimeError(sol.message)
+        n = numpy.searchsorted(t[i : ], sol.t[-1], side = 'right')
+        if n > 0:
+            Y[i : i + n] = sol.sol(t[i : i + n]).T
+        i += n
+        info['nfev'] += sol.nfev
+        if (sol.status == 0) or (i == len(t)):
+            break
+        # Restart from the first event.
+        k = numpy.argmin([te[0] if len(te) > 0 else numpy.inf
+                          for te in sol.t_events])
+        t_switch = sol.t_events[k][0]
+        Y_switch = sol.y_events[k][0]
+        info['nswitches'] += 1
+        if info['nswitches'] > max_switches:
+            raise RuntimeError(
+                'More than {} switches of the control rates!'.format(
+                    max_switches))
+    info['time'] = time.time() - time_start
+    if full_output:
+        return (Y, info)
+    else:
+        return Y
+
+
+def validate(parameters, target, use_log = True):
+    '''
+    Compare solving with the control rates switched exactly
+    against smoothing them with :func:`model.control_rates.ramp`.
+
+    Returns the wall times of the two solves
+    and the maximum difference of each state variable
+    relative to its maximum over time.
+    '''
+    # :mod:`model.simulation` imports :mod:`model.ODEs`, which imports this.
+    from . import simulation
+    retval = {}
+    states = {}
+    for controls_ in ('ramp', 'sliding'):
+        time_start = time.time()
+        states[controls_] = ODEs.solve(simulation.t, target, parameters,
+                                       use_log = use_log,
+                                       controls = controls_)
+        retval['time_{}'.format(controls_)] = time.time() - time_start
+    diff = numpy.abs(states['sliding'] - states['ramp']).max(0)
+    scale = numpy.abs(states['ramp']).max(0)
+    relative_difference = numpy.where(scale > 0, diff / scale, diff)
+    retval.update(zip(ODEs.variables, relative_difference))
+    return retval
+
+
+class TestSlidingMode(unittest.TestCase):
+    def test_validate(self):
+        from . import parameters
+        from . import target
+        country = 'Nigeria'
+        params = parameters.Parameters(country).mode()
+        targ = target.UNAIDS90()
+        comparison = validate(params, targ)
+        for v in ODEs.variables:
+            with self.subTest(variable = v):
+                self.assertLess(comparison[v], 0.02)
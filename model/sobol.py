@@ -0,0 +1,239 @@
+'''
+Variance-based (Sobol) sensitivity indices of the outcomes
+to the parameters.
+
+The parameter values are the Saltelli matrices :math:`A`, :math:`B`,
+and :math:`A_B^{(i)}`, :math:`A` with column :math:`i` from :math:`B`,
+from a scrambled Sobol sequence mapped through the parameter
+distributions of :class:`model.parameters.Parameters`, for
+:math:`N (d + 2)` runs with :math:`d` parameters.  The runs are solved
+in chunks in parallel with :func:`model.simulation.solve_samples`,
+keeping only the outcomes.  The first-order indices use the estimator
+of Saltelli et al (2010) and the total indices that of Jansen (1999),
+with bootstrap confidence intervals.
+'''
+
+import os.path
+import unittest
+
+import joblib
+import numpy
+import pandas
+from scipy.stats import qmc
+
+from . import bootstrap as bootstrap_
+from . import checkpoint
+from . import ODEs
+from . import parameters as parameters_
+from . import resources
+from . import results
+from . import simulation
+
+
+stats = ('new_infections', 'infected', 'dead', 'incidence_per_capita')
+
+years = (2025, 2035)
+
+
+def get_rvs():
+    return parameters_.Parameters.get_rvs()
+
+
+def get_matrices(N, seed = None):
+    '''
+    The parameter values for `N` base samples, with shape
+    ``(d + 2, N, d)``, stacking :math:`A`, :math:`B`, and
+    :math:`A_B^{(i)}` for each parameter :math:`i`.
+    `N` should be a power of 2 for the balance of the Sobol sequence.
+    '''
+    rvs = get_rvs()
+    d = len(rvs)
+    U = qmc.Sobol(2 * d, seed = seed).random(N)
+    X = numpy.column_stack([rv.ppf(u)
+                            for (rv, u) in zip(rvs + rvs, U.T)])
+    (A, B) = (X[:, : d], X[:, d : ])
+    matrices = numpy.empty((d + 2, N, d))
+    matrices[0] = A
+    matrices[1] = B
+    for i in range(d):
+        matrices[2 + i] = A
+        matrices[2 + i, :, i] = B[:, i]
+    return matrices
+
+
+def _solve_chunk(country, values, target, stats, years, kwargs):
+    '''
+    The outcomes, with shape ``(len(values), len(stats), len(years))``,
+    for the parameter values `values`.
+    '''
+    parameters = parameters_.Parameters(country)
+    samples = [parameters_.Sample(parameters, v) for v in values]
+    (state, _) = simulation.solve_samples(samples, target, **kwargs)
+    res = simulation.MultiSim._from_state(None, target, state)
+    i_years = numpy.searchsorted(simulation.t, years)
+    return numpy.stack([numpy.asarray(getattr(res, stat))[:, i_years]
+                        for stat in stats],
+                       axis = 1)
+
+
+def get_indices(f, axis = 1):
+    '''
+    The first-order and total indices from the outcomes `f` of the
+    matrices from :func:`get_matrices`, with shape ``(d + 2, N, ...)``,
+    or with the base samples on another `axis`.
+    The indices have shape ``(d, ...)``, without the axis of the
+    base samples.
+    '''
+    (f_A, f_B, f_AB) = (f[0], f[1], f[2 : ])
+    variance = numpy.var(numpy.concatenate((f_A, f_B), axis = axis - 1),
+                         axis = axis - 1)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        S1 = numpy.mean(f_B * (f_AB - f_A), axis = axis) / variance
+        ST = numpy.mean((f_A - f_AB) ** 2, axis = axis) / 2 / variance
+    return (S1, ST)
+
+
+def bootstrap(f, nboot = 1000, level = 0.95, seed = None):
+    '''
+    Bootstrap confidence intervals at `level` for the indices from
+    :func:`get_indices`, resampling the base samples with
+    :func:`model.bootstrap.get_indices` and `seed`,
+    on a new last axis.
+    '''
+    f = numpy.asarray(f)
+    N = f.shape[1]
+    indices = bootstrap_.get_indices(N, nboot = nboot, seed = seed)
+    S1 = []
+    ST = []
+    for ix in bootstrap_.get_batches(indices, f.size // N):
+        # The resamples are on axis 1 and the base samples on axis 2.
+        (S1_, ST_) = get_indices(f[:, ix], axis = 2)
+        S1.append(S1_)
+        ST.append(ST_)
+    q = [(1 - level) / 2, (1 + level) / 2]
+    return (numpy.moveaxis(numpy.quantile(numpy.concatenate(S1, axis = 1),
+                                          q, axis = 1), 0, -1),
+            numpy.moveaxis(numpy.quantile(numpy.concatenate(ST, axis = 1),
+                                          q, axis = 1), 0, -1))
+
+
+class Indices:
+    '''
+    The Sobol indices for `country` and `target`
+    from `N` base samples, :math:`N (d + 2)` runs.
+
+    :attr:`S1` and :attr:`ST` are the first-order and total indices,
+    with shape ``(d, len(stats), len(years))``, and
+    :attr:`S1_CI` and :attr:`ST_CI` are their confidence intervals
+    at `level`, with an extra last axis for the lower and upper bounds.
+
+    `seed` fixes the Sobol sequence and the bootstrap resamples.
+    `integrator` and the other keyword arguments are the solver settings
+    for :func:`model.simulation.solve_samples`.  The default,
+    ``integrator = 'expo'``, solves each chunk together with
+    :mod:`model.exponential_integrator`, which is much faster
+    for the :math:`N (d + 2)` runs, but its discrete-time control rates
+    and looser step tolerances put the solutions within about 2%
+    of :func:`scipy.integrate.odeint`'s rather than within
+    the solver tolerances.  That is below the sampling error
+    of the indices for the default `N`; use ``integrator = 'odeint'``
+    to match the results of :class:`model.simulation.MultiSim`.
+    '''
+    def __init__(self, country, target, N = 1024, stats = stats,
+                 years = years, nboot = 1000, level = 0.95,
+                 parallel = None, seed = None, integrator = 'expo',
+                 **kwargs):
+        self.country = country
+        self.target = target
+        self.N = N
+        self.parameter_names = parameters_.Parameters.get_rv_names()
+        self.stats = list(stats)
+        self.years = numpy.asarray(years)
+        self.level = level
+        matrices = get_matrices(N, seed = seed)
+        values = matrices.reshape((-1, matrices.shape[-1]))
+        # Only the outcomes of each chunk come back.
+        chunks = checkpoint.get_chunks(len(values))
+        if parallel is None:
+            parallel = joblib.Parallel(n_jobs = 1)
+        f = parallel(
+            joblib.delayed(_solve_chunk)(country, values[start : stop],
+                                         target, self.stats, self.years,
+                                         dict(kwargs,
+                                              integrator = integrator))
+            for (start, stop) in chunks)
+        self.outcomes = numpy.concatenate(f).reshape(
+            matrices.shape[ : -1] + (len(self.stats), len(self.years)))
+        (self.S1, self.ST) = get_indices(self.outcomes)
+        (self.S1_CI, self.ST_CI) = bootstrap(self.outcomes, nboot = nboot,
+                                             level = level, seed = seed)
+
+    def to_frame(self):
+        '''
+        The indices and their confidence intervals as a
+        :class:`pandas.DataFrame` with rows for the parameters.
+        '''
+        columns = pandas.MultiIndex.from_product(
+            (self.stats, self.years,
+             ('S1', 'S1_lower', 'S1_upper', 'ST', 'ST_lower', 'ST_upper')),
+            names = ('stat', 'year', 'index'))
+        values = numpy.stack((self.S1, self.S1_CI[..., 0], self.S1_CI[..., 1],
+                              self.ST, self.ST_CI[..., 0], self.ST_CI[..., 1]),
+                             axis = -1)
+        return pandas.DataFrame(values.reshape((len(self.parameter_names),
+                                                -1)),
+                                index = self.parameter_names,
+                                columns = columns)
+
+
+def get_path(country, target):
+    (root, ext) = os.path.splitext(results.get_path(country, target))
+    return root + '-sobol' + ext
+
+
+def dump(indices):
+    path = get_path(indices.country, indices.target)
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    return results.dump_atomic(indices, path)
+
+
+def load(country, target):
+    return joblib.load(get_path(country, target))
+
+
+def run(country, target, N = 1024, **kwargs):
+    '''
+    Compute and save the indices for `country` and `target`,
+    solving the chunks of runs in parallel.
+    '''
+    job_memory = resources.get_job_memory(checkpoint.chunk_size)
+    with resources.parallel(job_memory) as parallel:
+        indices = Indices(country, target, N = N, parallel = parallel,
+                          **kwargs)
+    dump(indices)
+    return indices
+
+
+class TestSobol(unittest.TestCase):
+    def test_additive(self):
+        # For f(x) = sum(a * x) with independent x,
+        # S1 = ST = a ** 2 var(x) / sum(a ** 2 var(x)).
+        (N, d) = (2 ** 12, 3)
+        a = numpy.array([1, 2, 3])
+        U = qmc.Sobol(2 * d, seed = 1).random(N)
+        (A, B) = (U[:, : d], U[:, d : ])
+        matrices = [A, B]
+        for i in range(d):
+            AB = A.copy()
+            AB[:, i] = B[:, i]
+            matrices.append(AB)
+        f = numpy.array(matrices) @ a
+        (S1, ST) = get_indices(f)
+        expected = a ** 2 / numpy.sum(a ** 2)
+        self.assertTrue(numpy.allclose(S1, expected, atol = 0.02))
+        self.assertTrue(numpy.allclose(ST, expected, atol = 0.02))
+        (S1_CI, ST_CI) = bootstrap(f, nboot = 100, seed = 1)
+        self.assertEqual(S1_CI.shape, (d, 2))
+        self.assertTrue(numpy.all(S1_CI[:, 0] <= S1_CI[:, 1]))
+        self.assertTrue(numpy.array_equal(
+            (S1_CI, ST_CI), bootstrap(f, nboot = 100, seed = 1)))
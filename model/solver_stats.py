@@ -0,0 +1,55 @@
+'''
+Report the solver statistics saved alongside the simulation results
+to find the expensive countries, targets, and samples.
+'''
+
+import os.path
+
+import pandas
+
+from . import datasheet
+from . import results
+from . import target as target_
+
+
+def load_all(countries = None, targets = target_.all_,
+             parameters_type = 'sample'):
+    '''
+    Load the solver statistics of all the runs that have them,
+    indexed by country, target, and sample.
+    '''
+    if countries is None:
+        countries = datasheet.get_country_list()
+    stats = {}
+    for country in countries:
+        for target in targets:
+            path = results.get_solver_stats_path(
+                country, target, parameters_type = parameters_type)
+            if os.path.exists(path):
+                stats[(country, str(target))] = results.load_solver_stats(
+                    country, target, parameters_type = parameters_type)
+    if len(stats) == 0:
+        return pandas.DataFrame()
+    return pandas.concat(stats, names = ['country', 'target', 'sample'])
+
+
+def get_slowest(stats, n = 20):
+    '''
+    The `n` slowest runs.
+    '''
+    return stats.sort_values('time', ascending = False).head(n)
+
+
+def get_totals(stats):
+    '''
+    Add up the statistics over the samples of each country and target,
+    slowest first.
+    '''
+    grouped = stats.groupby(level = ['country', 'target'])
+    totals = grouped[['time', 'nfev', 'njev', 'nsteps', 'nretries']].sum()
+    totals['nruns'] = grouped.size()
+    # Statistics saved before the fallbacks were added don't have these.
+    if 'nfallbacks' in stats:
+        totals['nfallbacks'] = grouped['nfallbacks'].sum()
+        totals['nfailures'] = grouped['failure'].count()
+    return totals.sort_values('time', ascending = False)
@@ -0,0 +1,131 @@
+'''
+Tune the solver settings for each country.
+
+:func:`tune` tries each of :data:`configurations` on the modes of the
+parameter distributions of a country and keeps the fastest whose
+solutions for all of the targets stay within `max_error` of those with
+the default settings of :func:`model.ODEs.solve`.
+The profiles are saved in :data:`profilesfile`
+and :class:`model.simulation.MultiSim` uses them for the sample runs,
+for the settings that aren't given explicitly.
+'''
+
+import os.path
+import warnings
+
+import joblib
+import numpy
+
+from . import ODEs
+from . import output_dir
+from . import parameters as parameters_
+from . import simulation
+from . import target as target_
+
+
+profilesfile = os.path.join(output_dir.output_dir, 'solver_profiles.pkl')
+
+# The keyword arguments of :func:`model.ODEs.solve` that are tuned.
+settings = ('integrator', 'use_log', 'rtol', 'atol')
+
+
+def _get_configurations():
+    configurations = []
+    for integrator in ('odeint', 'lsoda'):
+        for use_log in (True, False):
+            # `None` is the integrator's default tolerance.
+            for tol in (None, 1e-6, 1e-4):
+                config = dict(integrator = integrator, use_log = use_log)
+                if tol is not None:
+                    config.update(rtol = tol, atol = tol)
+                configurations.append(config)
+    configurations.append(dict(integrator = 'expo'))
+    return configurations
+
+
+configurations = _get_configurations()
+
+
+def _get_error(Y, Y_ref):
+    '''
+    The largest error relative to the maximum of each variable.
+    '''
+    scale = numpy.max(numpy.abs(Y_ref), axis = 0)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        err = numpy.max(numpy.abs(Y - Y_ref), axis = 0) / scale
+    # Variables that are always 0, like Q, have no relative error.
+    return numpy.nanmax(err)
+
+
+def tune(country, targets = target_.all_, max_error = 1e-3):
+    '''
+    Find the fastest of :data:`configurations` whose error,
+    relative to the default settings, is at most `max_error`
+    for all of `targets`.
+
+    Returns a `dict` of the settings along with the total solve
+    `time` and the largest `error` over `targets`,
+    and `time_default`, the total solve time with the defaults.
+    Raises :exc:`RuntimeError` if none of them is good enough.
+    '''
+    parameters = parameters_.Mode.from_country(country)
+    references = []
+    time_default = 0
+    for target in targets:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            (Y, info) = ODEs.solve(simulation.t, target, parameters,
+                                   full_output = True)
+        references.append(Y)
+        time_default += info['time']
+
+    best = None
+    for config in configurations:
+        time_ = 0
+        error = 0
+        try:
+            for (target, Y_ref) in zip(targets, references):
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    (Y, info) = ODEs.solve(simulation.t, target, parameters,
+                                           full_output = True,
+                                           **config)
+                # Re-runs after NaNs are included in the time.
+                time_ += info['time']
+                error = max(error, _get_error(Y, Y_ref))
+                if (error > max_error) or (best and time_ >= best['time']):
+                    break
+            else:
+                best = dict(config, time = time_, error = error)
+        except (ValueError, AssertionError):
+            # The solver failed.
+            pass
+    if best is None:
+        raise RuntimeError(
+            "country = '{}': no solver configuration was within "
+            "max_error = {:g}!".format(country, max_error))
+    best['time_default'] = time_default
+    return best
+
+
+def load_profiles():
+    '''
+    The saved profiles, keyed by country.
+    '''
+    if os.path.exists(profilesfile):
+        return joblib.load(profilesfile)
+    else:
+        return {}
+
+
+def dump_profiles(profiles):
+    joblib.dump(profiles, profilesfile, protocol = -1)
+
+
+def get_profile(country):
+    '''
+    The tuned keyword arguments of :func:`model.ODEs.solve`
+    for `country`, or an empty `dict` if it hasn't been tuned.
+    '''
+    profile = load_profiles().get(country, {})
+    return {k: v for (k, v) in profile.items() if k in settings}
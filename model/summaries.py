@@ -0,0 +1,165 @@
+'''
+Quantiles over the samples of the results, computed once and saved
+alongside the results, so that plotting the medians and confidence
+intervals doesn't need to load all the samples.
+
+:func:`load` gives a :class:`Summary` with the quantiles at
+:data:`levels` of each of :data:`stats` at each time.
+If the summary hasn't been saved yet, it is computed from the
+results and saved.  Anything else, e.g. the sensitivity analyses,
+still needs the full results from :func:`model.results.load`.
+'''
+
+import os.path
+import types
+import unittest
+import warnings
+
+import joblib
+import numpy
+
+from . import datasheet
+from . import parameters
+from . import regions
+from . import resources
+from . import results
+from . import target as target_
+
+
+# The quantile levels to keep.  These give the median and
+# the 50%, 90%, and 95% confidence intervals.
+levels = (0.025, 0.05, 0.25, 0.5, 0.75, 0.95, 0.975)
+
+# The statistics to summarize.
+stats = ('infected', 'prevalence', 'incidence_per_capita', 'AIDS',
+         'dead', 'new_infections', 'proportions')
+
+
+class Summary:
+    '''
+    The quantiles at `levels` over the samples of `stats` of `res`,
+    results from :func:`model.results.load`.
+    The quantiles of each statistic are stored in single precision
+    with the levels on the first axis.
+    '''
+    def __init__(self, res, levels = levels, stats = stats):
+        self.levels = numpy.asarray(levels)
+        self.quantiles = {}
+        for stat in stats:
+            x = getattr(res, stat)
+            names = numpy.asarray(x).dtype.names
+            if names is None:
+                self.quantiles[stat] = self._get_quantiles(x)
+            else:
+                # :attr:`model.simulation.MultiSim.proportions`
+                # is a record array.
+                self.quantiles[stat] = numpy.rec.fromarrays(
+                    [self._get_quantiles(x[k]) for k in names],
+                    names = names)
+
+    def _get_quantiles(self, x):
+        # Suppress warnings about NaNs.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            return numpy.quantile(numpy.asarray(x), self.levels,
+                                  axis = 0).astype(numpy.float32)
+
+    def quantile(self, stat, q):
+        '''
+        The quantiles of `stat` at `q`, which must be in :attr:`levels`.
+        '''
+        # The nearest levels, allowing for round-off in `q`.
+        i = numpy.argmin(numpy.abs(numpy.subtract.outer(q, self.levels)),
+                         axis = -1)
+        if not numpy.all(numpy.isclose(self.levels[i], q)):
+            raise ValueError(
+                'Quantile {} is not one of the levels {}!'.format(
+                    q, tuple(self.levels)))
+        return self.quantiles[stat][i]
+
+    def median(self, stat):
+        return self.quantile(stat, 0.5)
+
+    def confidence_interval(self, stat, level):
+        '''
+        Like :func:`plots.stats.confidence_interval`.
+        '''
+        return self.quantile(stat, [(1 - level) / 2, (1 + level) / 2])
+
+
+def get_path(place, target):
+    (root, ext) = os.path.splitext(results.get_path(place, target))
+    return root + '-summary' + ext
+
+
+def exists(place, target):
+    '''
+    Whether the summary exists and is newer than the results,
+    if they exist.
+    '''
+    path = get_path(place, target)
+    path_results = results.get_path(place, target)
+    return (os.path.exists(path)
+            and ((not os.path.exists(path_results))
+                 or (os.path.getmtime(path)
+                     >= os.path.getmtime(path_results))))
+
+
+def dump(summary, place, target):
+    return results.dump_atomic(summary, get_path(place, target),
+                               compress = 3)
+
+
+def build(place, target, overwrite = False):
+    '''
+    Compute and save the summary of the results for `place`
+    and `target`, unless it already exists and not `overwrite`.
+    '''
+    if overwrite or not exists(place, target):
+        summary = Summary(results.load(place, target))
+        dump(summary, place, target)
+        return summary
+
+
+def load(place, target):
+    '''
+    Load the summary of the results for `place` and `target`,
+    building it first if needed.
+    '''
+    if not exists(place, target):
+        summary = build(place, target)
+        if summary is not None:
+            return summary
+    return joblib.load(get_path(place, target))
+
+
+def build_all(places = None, targets = target_.all_, overwrite = False):
+    '''
+    Build the summaries for all the results of `places`
+    and `targets` that exist.
+    '''
+    if places is None:
+        places = list(regions.regions) + datasheet.get_country_list()
+    runs = [(place, target)
+            for place in places
+            for target in targets
+            if results.exists(place, target)]
+    # Each job loads all the samples of one result.
+    job_memory = resources.get_job_memory(parameters.nsamples)
+    with resources.parallel(job_memory) as parallel:
+        parallel(joblib.delayed(build)(place, target, overwrite)
+                 for (place, target) in runs)
+
+
+class TestSummary(unittest.TestCase):
+    def test_confidence_interval(self):
+        x = numpy.random.RandomState(1).normal(size = (1000, 3))
+        summary = Summary(types.SimpleNamespace(infected = x),
+                          stats = ('infected', ))
+        CI = summary.confidence_interval('infected', 0.95)
+        expected = numpy.quantile(x, (0.025, 0.975), axis = 0)
+        self.assertTrue(numpy.allclose(CI, expected, rtol = 1e-6))
+        self.assertTrue(numpy.allclose(summary.median('infected'),
+                                       numpy.median(x, axis = 0)))
+        with self.assertRaises(ValueError):
+            summary.quantile('infected', 0.1)
@@ -10,6 +10,20 @@ from . import proportions
 from . import simulation
 
 
+def _outer_sum(initial_proportion, *terms):
+    '''
+    `initial_proportion` plus the sum of `value * amount` for
+    `(value, amount)` in `terms`, where `initial_proportion` and `value`
+    have the shape of the samples and `amount` has the shape of the times.
+    '''
+    amount_shape = numpy.shape(terms[0][1])
+    retval = numpy.multiply.outer(initial_proportion,
+                                  numpy.ones(amount_shape))
+    for (value, amount) in terms:
+        retval = retval + numpy.multiply.outer(value, amount)
+    return retval
+
+
 class OneTargetZero:
     '''
     Fixed at 0.
@@ -18,8 +32,8 @@ class OneTargetZero:
         if numpy.ndim(initial_proportion) == 0:
             return numpy.zeros_like(t, dtype = float)
         else:
-            return numpy.outer(initial_proportion,
-                               numpy.zeros_like(t, dtype = float))
+            return numpy.multiply.outer(initial_proportion,
+                                        numpy.zeros_like(t, dtype = float))
 
 
 class OneTargetStatusQuo:
@@ -30,8 +44,8 @@ class OneTargetStatusQuo:
         if numpy.ndim(initial_proportion) == 0:
             return initial_proportion * numpy.ones_like(t, dtype = float)
         else:
-            return numpy.outer(initial_proportion,
-                               numpy.ones_like(t, dtype = float))
+            return numpy.multiply.outer(initial_proportion,
+                                        numpy.ones_like(t, dtype = float))
 
 
 class OneTargetLinear:
@@ -47,16 +61,14 @@ class OneTargetLinear:
         self.time_to_target = time_to_target
 
     def __call__(self, initial_proportion, t):
-        target_value_ = max(self.target_value, initial_proportion)
-        amount_implemented = numpy.where(
-            t < self.time_to_start, 0,
-            numpy.where(
-                t < self.time_to_target,
-                (t - self.time_to_start)
-                / (self.time_to_target - self.time_to_start),
-                1))
-        return (initial_proportion
-                + (target_value_ - initial_proportion) * amount_implemented)
+        target_value_ = numpy.maximum(self.target_value, initial_proportion)
+        amount_implemented = numpy.clip(
+            (t - self.time_to_start)
+            / (self.time_to_target - self.time_to_start),
+            0, 1)
+        return _outer_sum(
+            initial_proportion,
+            (target_value_ - initial_proportion, amount_implemented))
 
 
 class OneTarget90(OneTargetLinear):
@@ -90,23 +102,20 @@ class OneTarget95:
     time_2 = 2030
 
     def __call__(self, initial_proportion, t):
-        target_value_0_ = max(self.target_value_0, initial_proportion)
-        target_value_1_ = max(self.target_value_1, initial_proportion)
-        amount_implemented_0 = numpy.where(
-            t < self.time_0, 0,
-            numpy.where(
-                t < self.time_1,
-                (t - self.time_0) / (self.time_1 - self.time_0),
-                1))
-        amount_implemented_1 = numpy.where(
-            t < self.time_1, 0,
-            numpy.where(
-                t < self.time_2,
-                (t - self.time_1) / (self.time_2 - self.time_1),
-                1))
-        return (initial_proportion
-                + (target_value_0_ - initial_proportion) * amount_implemented_0
-                + (target_value_1_ - target_value_0_) * amount_implemented_1)
+        target_value_0_ = numpy.maximum(self.target_value_0,
+                                        initial_proportion)
+        target_value_1_ = numpy.maximum(self.target_value_1,
+                                        initial_proportion)
+        amount_implemented_0 = numpy.clip(
+            (t - self.time_0) / (self.time_1 - self.time_0),
+            0, 1)
+        amount_implemented_1 = numpy.clip(
+            (t - self.time_1) / (self.time_2 - self.time_1),
+            0, 1)
+        return _outer_sum(
+            initial_proportion,
+            (target_value_0_ - initial_proportion, amount_implemented_0),
+            (target_value_1_ - target_value_0_, amount_implemented_1))
 
 
 class Target:
@@ -124,15 +133,23 @@ class Target:
         '''
         Get numerical values for the target at different points in time.
         '''
+        return numpy.rec.fromarrays(list(self.get_array(t, parameters)),
+                                    names = proportions.names)
+
+    def get_array(self, t, parameters, out = None):
+        '''
+        Like :meth:`__call__`, but as an array with the targets
+        in the order of :data:`model.proportions.names`
+        along the first axis, put in `out` if it is given.
+        '''
         t = numpy.asarray(t)
-        initial_proportions = proportions.get(parameters.initial_conditions)
-        names = initial_proportions.dtype.names
-        arrays = []
-        for n in names:
-            targ = getattr(self, n)
-            ip = getattr(initial_proportions, n)
-            arrays.append(targ(ip, t))
-        return numpy.rec.fromarrays(arrays, names = names)
+        initial_proportions = proportions.get_array(
+            parameters.initial_conditions)
+        if out is None:
+            out = numpy.empty(numpy.shape(initial_proportions) + t.shape)
+        for (i, n) in enumerate(proportions.names):
+            out[i] = getattr(self, n)(initial_proportions[i], t)
+        return out
 
     @classmethod
     def __str__(cls):
@@ -6,8 +6,19 @@ import unittest
 
 # Import tests from other modules.
 # These get automatically run without any further code.
+from .bootstrap import TestBootstrap
 from .cost import TestRelativeCostOfEffort
 from .effectiveness import TestDALYsQALYs
+from .emulator import TestEmulator
+from .exponential_integrator import TestExponentialIntegrator
+from .multicountry import TestMultiCountry
+from .prcc import TestPRCC
+from .sampling import TestSampling
+from .service import TestService
+from .sliding_mode import TestSlidingMode
+from .sobol import TestSobol
+from .summaries import TestSummary
+from .work_queue import TestClaim
 
 
 class TestEffectiveness(unittest.TestCase):
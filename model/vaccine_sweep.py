@@ -0,0 +1,222 @@
+'''
+Sweep the design space of :class:`model.target.Vaccine`,
+its efficacy, coverage, start date, and scale-up time,
+for several countries.
+
+The designs for each country are solved together with
+:func:`model.exponential_integrator.solve` using the modes of the
+parameter distributions, and :class:`Sweep` keeps a dense cube of the
+outcomes at chosen years, indexed by country, design, outcome, and year.
+'''
+
+import copy
+import inspect
+import itertools
+import os.path
+
+import joblib
+import numpy
+import pandas
+
+from . import exponential_integrator
+from . import latin_hypercube_sampling
+from . import ODEs
+from . import output_dir
+from . import parameters as parameters_
+from . import simulation
+from . import target as target_
+
+
+sweepfile = os.path.join(output_dir.output_dir, 'vaccine_sweep.pkl')
+
+# The arguments of :class:`model.target.Vaccine` that are swept.
+axes = ('efficacy', 'coverage', 'time_to_start', 'time_to_fifty_percent')
+
+# The defaults for the axes that aren't swept.
+defaults = {k: v.default
+            for (k, v) in inspect.signature(target_.Vaccine).parameters.items()
+            if k in axes}
+
+# The ranges for :func:`get_lhs`, spanning
+# :data:`model.target.vaccine_scenarios`.
+ranges = dict(efficacy = (0.3, 0.7),
+              coverage = (0.5, 0.9),
+              time_to_start = (2020, 2025),
+              time_to_fifty_percent = (2, 5))
+
+
+def get_grid(**values):
+    '''
+    The designs on the grid of the `values` given for each axis,
+    with the others at their :data:`defaults`.
+    '''
+    values_ = [numpy.atleast_1d(values.get(k, defaults[k])) for k in axes]
+    return pandas.DataFrame(list(itertools.product(*values_)),
+                            columns = axes)
+
+
+def get_lhs(ndesigns, ranges = ranges, seed = None):
+    '''
+    A Latin hypercube sample of `ndesigns` designs
+    uniform over `ranges`, with the axes not in `ranges`
+    at their :data:`defaults`.  `seed` fixes the sample.
+    '''
+    designs = pandas.DataFrame(index = range(ndesigns), columns = axes,
+                               dtype = float)
+    swept = [k for k in axes if k in ranges]
+    rvs = [parameters_.uniform(*ranges[k]) for k in swept]
+    designs[swept] = latin_hypercube_sampling.lhs(rvs, ndesigns,
+                                                  seed = seed)
+    for k in axes:
+        if k not in ranges:
+            designs[k] = defaults[k]
+    return designs
+
+
+class _OneTargetLinearStacked:
+    '''
+    :class:`model.target.OneTargetLinear` with a different
+    `target_value`, `time_to_start`, and `time_to_target`
+    for each of the stacked parameter sets.
+    '''
+    def __init__(self, target_value, time_to_start, time_to_target):
+        self.target_value = numpy.asarray(target_value)
+        self.time_to_start = numpy.asarray(time_to_start)
+        self.time_to_target = numpy.asarray(time_to_target)
+
+    def __call__(self, initial_proportion, t):
+        t = numpy.asarray(t)
+        # Put the parameter sets on the first axis and time on the last.
+        shape = numpy.shape(self.target_value) + (1, ) * numpy.ndim(t)
+        def expand(x):
+            return numpy.reshape(x, shape)
+        amount_implemented = numpy.clip(
+            (t - expand(self.time_to_start))
+            / (expand(self.time_to_target) - expand(self.time_to_start)),
+            0, 1)
+        initial_proportion = expand(initial_proportion)
+        target_value_ = numpy.maximum(expand(self.target_value),
+                                      initial_proportion)
+        return (initial_proportion
+                + (target_value_ - initial_proportion) * amount_implemented)
+
+
+class _VaccineDesigns(target_.Target):
+    '''
+    :class:`model.target.Vaccine` for each of `designs`,
+    for as many stacked parameter sets, evaluated together.
+    '''
+    def __init__(self, treatment_target, designs):
+        self.vaccine_efficacy = designs['efficacy'].values
+        self.diagnosed = treatment_target.diagnosed
+        self.treated = treatment_target.treated
+        self.suppressed = treatment_target.suppressed
+        # As in :class:`model.target.Vaccine`.
+        time_to_target = (designs['coverage'] / 0.5
+                          * designs['time_to_fifty_percent']
+                          + designs['time_to_start'])
+        self.vaccinated = _OneTargetLinearStacked(
+            designs['coverage'].values,
+            designs['time_to_start'].values,
+            time_to_target.values)
+
+
+class Sweep:
+    '''
+    Solve for each of `designs`, from :func:`get_grid` or
+    :func:`get_lhs`, with `treatment_target`, for each of `countries`.
+
+    :attr:`values` is the cube of `outcomes`, which are
+    :data:`model.ODEs.variables`, at `years`, with shape
+    ``(len(countries), len(designs), len(outcomes), len(years))``,
+    and :attr:`baseline` is the same for `treatment_target`
+    without a vaccine, with shape
+    ``(len(countries), len(outcomes), len(years))``.
+    The default outcomes are cumulative since the start
+    of the simulations.
+
+    The designs are solved `chunk_size` at a time
+    to bound the memory used.
+    '''
+    def __init__(self, countries, designs,
+                 treatment_target = target_.UNAIDS95(),
+                 years = (2025, 2035),
+                 outcomes = ('new_infections', 'dead'),
+                 chunk_size = 1000):
+        self.countries = list(countries)
+        self.designs = designs.reset_index(drop = True)
+        self.treatment_target = treatment_target
+        self.years = numpy.asarray(years)
+        self.outcomes = list(outcomes)
+        self.values = numpy.empty((len(self.countries), len(self.designs),
+                                   len(self.outcomes), len(self.years)))
+        self.baseline = numpy.empty((len(self.countries),
+                                     len(self.outcomes), len(self.years)))
+        # Only solve up to the last year.
+        t = simulation.t[simulation.t <= self.years.max()]
+        i_years = numpy.searchsorted(t, self.years)
+        i_outcomes = [ODEs.variables.index(k) for k in self.outcomes]
+        for (i, country) in enumerate(self.countries):
+            parameters = parameters_.Mode.from_country(country)
+            for start in range(0, len(self.designs), chunk_size):
+                designs_chunk = self.designs[start : start + chunk_size]
+                vaccines = _VaccineDesigns(treatment_target, designs_chunk)
+                # Solve for the baseline with the first chunk.
+                targets = [vaccines] * len(designs_chunk)
+                if start == 0:
+                    targets.append(treatment_target)
+                state = exponential_integrator.solve(
+                    t,
+                    exponential_integrator.StackedTargets(targets),
+                    [parameters] * len(targets))
+                values = state[:, i_years][..., i_outcomes]
+                # To (design, outcome, year).
+                values = numpy.swapaxes(values, 1, 2)
+                if start == 0:
+                    self.baseline[i] = values[-1]
+                    values = values[ : -1]
+                self.values[i, start : start + len(designs_chunk)] = values
+
+    def to_frame(self):
+        '''
+        The cube as a :class:`pandas.DataFrame` with rows indexed by
+        country and design, and columns by outcome and year,
+        with the designs joined on.
+        '''
+        index = pandas.MultiIndex.from_product(
+            (self.countries, self.designs.index),
+            names = ('country', 'design'))
+        columns = pandas.MultiIndex.from_product(
+            (self.outcomes, self.years),
+            names = ('outcome', 'year'))
+        values = pandas.DataFrame(
+            self.values.reshape((len(index), len(columns))),
+            index = index, columns = columns)
+        designs = pandas.DataFrame(
+            self.designs.loc[index.get_level_values('design')].values,
+            index = index,
+            columns = pandas.MultiIndex.from_product(
+                (('design', ), self.designs.columns)))
+        return pandas.concat((designs, values), axis = 'columns')
+
+    @classmethod
+    def concat(cls, sweeps):
+        '''
+        Join sweeps of the same designs for different countries.
+        '''
+        obj = copy.copy(sweeps[0])
+        obj.countries = sum((s.countries for s in sweeps), [])
+        obj.values = numpy.concatenate([s.values for s in sweeps])
+        obj.baseline = numpy.concatenate([s.baseline for s in sweeps])
+        return obj
+
+    def dump(self, path = None):
+        if path is None:
+            path = sweepfile
+        joblib.dump(self, path, protocol = -1)
+
+    @classmethod
+    def load(cls, path = None):
+        if path is None:
+            path = sweepfile
+        return joblib.load(path)
@@ -0,0 +1,318 @@
+'''
+A work queue on a shared file system to run the simulations
+with workers on several hosts.
+
+A worker claims a task by creating a lock file next to the task's
+output with :data:`os.O_EXCL`, touches the lock file every
+:data:`heartbeat_interval` seconds while it works,
+and removes it when it is done.
+A lock file that hasn't been touched for :data:`stale_after` seconds
+is taken to be from a worker that died and the task is reclaimed,
+so the hosts' clocks need to roughly agree.
+A worker reclaims a task by first renaming the stale lock file
+to a name of its own, which only one worker can do,
+so two workers reclaiming the same task at once
+don't remove each other's new lock files.
+
+The tasks for the sample runs are the chunks of
+:mod:`model.checkpoint` for each country and target,
+and then putting the chunks together into the results.
+'''
+
+import contextlib
+import io
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+
+import numpy
+
+from . import checkpoint
+from . import datasheet
+from . import output_dir
+from . import parameters
+from . import resources
+from . import results
+from . import simulation
+from . import target as target_
+
+
+# In seconds.
+heartbeat_interval = 30
+stale_after = 300
+# How long to wait for the tasks claimed by other workers.
+poll_interval = 10
+
+
+def get_worker_id():
+    return '{}:{}'.format(socket.gethostname(), os.getpid())
+
+
+def _create_lock(lockfile):
+    try:
+        fd = os.open(lockfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as fp:
+        fp.write(get_worker_id())
+    return True
+
+
+def _is_stale(lockfile):
+    try:
+        mtime = os.path.getmtime(lockfile)
+    except FileNotFoundError:
+        # It was just released.
+        return True
+    return (time.time() - mtime > stale_after)
+
+
+def _take_over(lockfile):
+    '''
+    Replace the stale `lockfile` with a new lock,
+    returning whether it was claimed.
+    '''
+    # Only one worker can move the lock file away.
+    moved = '{}.{}'.format(lockfile, uuid.uuid4().hex)
+    try:
+        os.rename(lockfile, moved)
+    except FileNotFoundError:
+        # It was released or another worker moved it first.
+        return _create_lock(lockfile)
+    if not _is_stale(moved):
+        # Another worker took it over after it was checked,
+        # so put its lock back.
+        try:
+            os.link(moved, lockfile)
+        except FileExistsError:
+            pass
+        os.remove(moved)
+        return False
+    os.remove(moved)
+    return _create_lock(lockfile)
+
+
+class Claim:
+    '''
+    A context manager to claim the task whose output is `path`.
+    It gives whether the task was claimed
+    and, if it was, releases it on exit.
+    '''
+    def __init__(self, path):
+        self.lockfile = path + '.lock'
+        self.claimed = False
+
+    def _heartbeat(self):
+        while not self._stop.wait(heartbeat_interval):
+            try:
+                os.utime(self.lockfile)
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.lockfile), exist_ok = True)
+        self.claimed = _create_lock(self.lockfile)
+        if (not self.claimed) and _is_stale(self.lockfile):
+            self.claimed = _take_over(self.lockfile)
+        if self.claimed:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target = self._heartbeat,
+                                            daemon = True)
+            self._thread.start()
+        return self.claimed
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.claimed:
+            self._stop.set()
+            self._thread.join()
+            try:
+                os.remove(self.lockfile)
+            except FileNotFoundError:
+                pass
+            self.claimed = False
+
+
+def _run_mode(country, target):
+    '''
+    Returns whether the task was run here.
+    '''
+    path = results.get_path(country, target, 'mode')
+    with Claim(path) as claimed:
+        # Check again now that it is claimed.
+        if claimed and not results.exists(country, target, 'mode'):
+            print('{}: Running {}, {!s}.'.format(get_worker_id(),
+                                                 country, target))
+            params = parameters.Mode.from_country(country)
+            results.dump(simulation.Simulation(params, target))
+            return True
+    return False
+
+
+def _run_samples(country, target, parallel):
+    '''
+    Run the chunks of samples that haven't been run or claimed,
+    then, if all the chunks are done, put them together.
+    Returns whether any task was run here.
+    '''
+    params = parameters.Samples(country)
+    chunks = checkpoint.get_chunks(len(list(params)))
+    keys = {(start, stop): simulation.get_checkpoint_key(params, start, stop)
+            for (start, stop) in chunks}
+    ran = False
+    for (start, stop) in chunks:
+        key = keys[(start, stop)]
+        if checkpoint.exists(country, target, start, stop, key):
+            continue
+        with Claim(checkpoint.get_path(country, target,
+                                       start, stop)) as claimed:
+            # Check again now that it is claimed.
+            if (claimed
+                and not checkpoint.exists(country, target, start, stop, key)
+                and not results.exists(country, target)):
+                print('{}: Running {}, {!s}, samples {}-{}.'.format(
+                    get_worker_id(), country, target, start, stop))
+                simulation.solve_chunk(params, target, start, stop,
+                                       parallel = parallel)
+                ran = True
+    if all(checkpoint.exists(country, target, start, stop,
+                             keys[(start, stop)])
+           for (start, stop) in chunks):
+        with Claim(results.get_path(country, target)) as claimed:
+            if claimed and not results.exists(country, target):
+                # This loads the chunks from the checkpoints.
+                results.dump(simulation.MultiSim(params, target))
+                ran = True
+    return ran
+
+
+def work(countries = None, targets = target_.all_,
+         parameters_type = 'sample', n_jobs = None):
+    '''
+    Run tasks until all the results for `countries` and `targets`
+    exist, waiting for the tasks that other workers have claimed.
+
+    The samples of each chunk are run in parallel with
+    `n_jobs` processes, or as many as
+    :func:`model.resources.get_n_jobs` allows.
+    '''
+    if countries is None:
+        countries = datasheet.get_country_list()
+    with resources.parallel(n_jobs = n_jobs) as parallel:
+        while True:
+            pending = False
+            ran = False
+            for country in countries:
+                for target in targets:
+                    if results.exists(country, target, parameters_type):
+                        continue
+                    pending = True
+                    if parameters_type == 'mode':
+                        ran |= _run_mode(country, target)
+                    elif parameters_type == 'sample':
+                        ran |= _run_samples(country, target, parallel)
+                    else:
+                        raise ValueError(
+                            "Unknown parameters_type '{}'!".format(
+                                parameters_type))
+            if not pending:
+                break
+            elif not ran:
+                time.sleep(poll_interval)
+
+
+class TestClaim(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'task.pkl')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_exclusive(self):
+        with Claim(self.path) as claimed:
+            self.assertTrue(claimed)
+            with Claim(self.path) as claimed_again:
+                self.assertFalse(claimed_again)
+        self.assertFalse(os.path.exists(self.path + '.lock'))
+        with Claim(self.path) as claimed:
+            self.assertTrue(claimed)
+
+    def test_stale(self):
+        _create_lock(self.path + '.lock')
+        with Claim(self.path) as claimed:
+            self.assertFalse(claimed)
+        # Make the lock look like it is from a worker that died.
+        mtime = time.time() - 2 * stale_after
+        os.utime(self.path + '.lock', (mtime, mtime))
+        with Claim(self.path) as claimed:
+            self.assertTrue(claimed)
+
+    def test_take_over(self):
+        lockfile = self.path + '.lock'
+        _create_lock(lockfile)
+        mtime = time.time() - 2 * stale_after
+        os.utime(lockfile, (mtime, mtime))
+        with Claim(self.path) as claimed:
+            self.assertTrue(claimed)
+            # Another worker that found the lock stale before it
+            # was taken over doesn't take over the new lock.
+            self.assertFalse(_take_over(lockfile))
+            self.assertTrue(os.path.exists(lockfile))
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_run_samples(self):
+        (country, target) = ('Nigeria', target_.StatusQuo())
+        params = parameters.Samples(country)
+        chunks = checkpoint.get_chunks(len(list(params)))
+        output_dir_ = output_dir.output_dir
+        solve_chunk = simulation.solve_chunk
+        solved = []
+
+        def _solve_chunk(params, target, start, stop, **kwargs):
+            solved.append((start, stop))
+            key = simulation.get_checkpoint_key(params, start, stop)
+            checkpoint.dump(country, target, start, stop, key,
+                            numpy.zeros((stop - start, 1, 1)), [])
+
+        output_dir.output_dir = self.dir.name
+        simulation.solve_chunk = _solve_chunk
+        try:
+            # A stale lock from a worker that died
+            # and one from a worker that is still running.
+            (stale, running) = (
+                checkpoint.get_path(country, target, *chunks[0]) + '.lock',
+                checkpoint.get_path(country, target, *chunks[1]) + '.lock')
+            os.makedirs(os.path.dirname(stale))
+            _create_lock(stale)
+            mtime = time.time() - 2 * stale_after
+            os.utime(stale, (mtime, mtime))
+            _create_lock(running)
+            # Keep the progress messages out of the test output.
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertTrue(_run_samples(country, target, None))
+            self.assertEqual(solved, chunks[ : 1] + chunks[2 : ])
+            self.assertFalse(os.path.exists(stale))
+            self.assertTrue(os.path.exists(running))
+            # Not all the chunks are done.
+            self.assertFalse(results.exists(country, target))
+        finally:
+            simulation.solve_chunk = solve_chunk
+            output_dir.output_dir = output_dir_
+
+    def test_heartbeat(self):
+        global heartbeat_interval
+        heartbeat_interval_ = heartbeat_interval
+        heartbeat_interval = 0.01
+        try:
+            with Claim(self.path) as claimed:
+                self.assertTrue(claimed)
+                mtime = time.time() - 2 * stale_after
+                os.utime(self.path + '.lock', (mtime, mtime))
+                time.sleep(10 * heartbeat_interval)
+                self.assertFalse(_is_stale(self.path + '.lock'))
+        finally:
+            heartbeat_interval = heartbeat_interval_
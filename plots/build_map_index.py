@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+'''
+Build the index of country coordinates for the maps,
+:func:`mapplot.locators.build_index`, from the Natural Earth borders.
+The maps build it when it is missing, so this is only needed to build
+it ahead of time, e.g. to copy `mapplot/_index` to hosts without
+network access.
+'''
+
+import os.path
+import sys
+
+from matplotlib import pyplot
+
+sys.path.append(os.path.dirname(__file__))  # For Sphinx.
+import mapplot
+
+
+def _main():
+    m = mapplot.Basemap()
+    locations = mapplot.locators.build_index({**m.tiny_points,
+                                              **m.borders})
+    pyplot.close(m.fig)
+    print('{} countries in {}.'.format(len(locations),
+                                       mapplot.locators.get_index_path()))
+
+
+if __name__ == '__main__':
+    _main()
@@ -3,7 +3,9 @@ Common plotting settings etc.
 '''
 
 import collections
+from concurrent import futures
 import copy
+import functools
 import inspect
 import operator
 import os
@@ -13,9 +15,11 @@ import tempfile
 import time
 import unicodedata
 
+import joblib
 import matplotlib
 from matplotlib import cm
 from matplotlib import colors
+from matplotlib import pyplot
 from matplotlib import ticker
 from matplotlib.backends import backend_pdf
 from matplotlib.backends import backend_cairo
@@ -149,6 +153,126 @@ def get_country_results(country,
     return results
 
 
+def get_country_summaries(country,
+                          targets = model.target.all_):
+    '''
+    Like :func:`get_country_results`, but the quantiles over the samples
+    from :func:`model.summaries.load`.
+    '''
+    summaries = {}
+    for target in targets:
+        try:
+            summaries[target] = model.summaries.load(country, target)
+        except FileNotFoundError:
+            summaries[target] = None
+    return summaries
+
+
+class Prefetcher:
+    '''
+    Get `load(key)` for each of `keys`, e.g. :func:`get_country_results`
+    for each country, with ``prefetcher[key]``, while loading
+    the `lookahead` keys after it on a pool of threads,
+    so that the loading overlaps with the plotting.
+    The `maxsize` most recently used are kept,
+    so the memory is bounded.
+    '''
+    def __init__(self, load, keys, lookahead = 2, maxsize = None):
+        self._load = load
+        self._keys = list(keys)
+        self._index = {key: i for (i, key) in enumerate(self._keys)}
+        self.lookahead = lookahead
+        # At least the key asked for and the ones after it.
+        if maxsize is None:
+            maxsize = lookahead + 1
+        self.maxsize = max(maxsize, lookahead + 1)
+        self._executor = futures.ThreadPoolExecutor(max_workers = lookahead)
+        # The futures of the loads, least recently used first.
+        self._cache = collections.OrderedDict()
+
+    def _get_future(self, key):
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            self._cache[key] = self._executor.submit(self._load, key)
+        return self._cache[key]
+
+    def __getitem__(self, key):
+        future = self._get_future(key)
+        i = self._index.get(key)
+        if i is not None:
+            for key_next in self._keys[i + 1 : i + 1 + self.lookahead]:
+                self._get_future(key_next)
+        while len(self._cache) > self.maxsize:
+            (_, future_old) = self._cache.popitem(last = False)
+            future_old.cancel()
+        return future.result()
+
+    def __iter__(self):
+        '''
+        Go through `keys` in order once, then :meth:`close`.
+        '''
+        try:
+            for key in self._keys:
+                yield (key, self[key])
+        finally:
+            self.close()
+
+    def close(self):
+        for future in self._cache.values():
+            future.cancel()
+        self._cache.clear()
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _readahead(path):
+    # Have the kernel read the file into the page cache
+    # for the memory map of the results.
+    if os.path.exists(path) and hasattr(os, 'posix_fadvise'):
+        with open(path, 'rb') as fd:
+            os.posix_fadvise(fd.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+
+
+def _load_country_results(country, targets, parameters_type):
+    for target in targets:
+        _readahead(model.results.get_path(country, target,
+                                          parameters_type = parameters_type))
+    return get_country_results(country, targets = targets,
+                               parameters_type = parameters_type)
+
+
+def prefetch_country_results(countries,
+                             targets = model.target.all_,
+                             parameters_type = 'sample',
+                             lookahead = 2):
+    '''
+    A :class:`Prefetcher` of :func:`get_country_results`
+    for `countries`.
+    '''
+    return Prefetcher(functools.partial(_load_country_results,
+                                        targets = targets,
+                                        parameters_type = parameters_type),
+                      countries, lookahead = lookahead)
+
+
+def prefetch_country_summaries(countries,
+                               targets = model.target.all_,
+                               lookahead = 2):
+    '''
+    A :class:`Prefetcher` of :func:`get_country_summaries`
+    for `countries`.
+    '''
+    return Prefetcher(functools.partial(get_country_summaries,
+                                        targets = targets),
+                      countries, lookahead = lookahead)
+
+
 def get_filebase():
     stack = inspect.stack()
     caller = stack[-1]
@@ -439,6 +563,22 @@ def pdfoptimize(filename):
         raise RuntimeWarning("'pdftocairo' not found.  PDF not optimized.")
 
 
+def pdfmerge(filenames, outfile):
+    '''
+    Use pdfunite or pdftk to merge the PDFs `filenames`,
+    in order, into `outfile`.
+    '''
+    if _has_bin('pdfunite'):
+        args = ['pdfunite'] + list(filenames) + [outfile]
+    elif _has_bin('pdftk'):
+        args = ['pdftk'] + list(filenames) + ['cat', 'output', outfile]
+    else:
+        raise RuntimeWarning("'pdfunite' and 'pdftk' not found.  "
+                             + 'PDFs not merged.')
+    cp = subprocess.run(args)
+    cp.check_returncode()  # Make sure it succeeded.
+
+
 _keymap = {'Author': 'Artist',
            'Title': 'ImageDescription'}
 
@@ -504,3 +644,57 @@ def savefig(fig, filename, title = None, **kwargs):
         fig.savefig(filename, **kwargs)
         # Use PIL etc to set metadata.
         image_add_info(filename, **info)
+
+
+def _render_one(page, filename, rc):
+    # The workers don't run the plotting script,
+    # so use its settings.
+    with matplotlib.rc_context(rc):
+        fig = page()
+        fig.savefig(filename)
+    pyplot.close(fig)
+
+
+def render(pages, filenames, job_memory = None):
+    '''
+    Save the figures from `pages`, functions that each make a figure,
+    e.g. :func:`functools.partial` of a `plot_one()`,
+    to `filenames` in parallel, each worker with its own figures.
+    The default `job_memory` allows for each page loading the results
+    of a country.
+    '''
+    if job_memory is None:
+        job_memory = model.resources.get_job_memory(model.parameters.nsamples)
+    # Not the interactive backend of this process.
+    rc = {k: v for (k, v) in matplotlib.rcParams.items()
+          if not k.startswith('backend')}
+    with model.resources.parallel(job_memory, verbose = 5) as parallel:
+        parallel(joblib.delayed(_render_one)(page, filename, rc)
+                 for (page, filename) in zip(pages, filenames))
+
+
+def render_pages(pages, filename, optimize = True, job_memory = None):
+    '''
+    Make the PDF `filename` with a page for each of the figures
+    from `pages`, functions that each make a figure.
+    The pages are rendered in parallel with :func:`render`
+    into separate files that are merged in order with :func:`pdfmerge`,
+    or, without pdfunite or pdftk, rendered one after another.
+    With `optimize` and pdftocairo, the PDF is then made smaller with
+    :func:`pdfoptimize`, e.g. to share the fonts between the pages.
+    '''
+    pages = list(pages)
+    if _has_bin('pdfunite') or _has_bin('pdftk'):
+        with tempfile.TemporaryDirectory() as tempdir:
+            filenames = [os.path.join(tempdir, '{:05d}.pdf'.format(i))
+                         for i in range(len(pages))]
+            render(pages, filenames, job_memory = job_memory)
+            pdfmerge(filenames, filename)
+    else:
+        with backend_pdf.PdfPages(filename) as pdf:
+            for page in pages:
+                fig = page()
+                pdf.savefig(fig)
+                pyplot.close(fig)
+    if optimize and _has_bin('pdftocairo'):
+        pdfoptimize(filename)
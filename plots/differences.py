@@ -3,6 +3,7 @@
 Plot differences for samples from uncertainty analysis.
 '''
 
+import functools
 import operator
 import os.path
 import sys
@@ -12,7 +13,6 @@ from matplotlib import colors
 from matplotlib import gridspec
 from matplotlib import pyplot
 from matplotlib import ticker
-from matplotlib.backends import backend_pdf
 import numpy
 import seaborn
 
@@ -31,31 +31,30 @@ _cmap_base = 'cubehelix'
 cmap = common.cmap_reflected(_cmap_base)
 
 
-def _get_percentiles(x):
-    p = numpy.linspace(0, 100, 101)
+def _get_percentiles(q):
+    '''
+    Reorder `q`, the percentiles at
+    :data:`model.differences.percentiles`.
+    '''
+    p = model.differences.percentiles
     # Plot the points near 50% last, so they show up clearest.
     # This gives [0, 100, 1, 99, 2, 98, ..., 48, 52, 49, 51, 50].
     M = len(p) // 2
-    p_ = numpy.column_stack((p[ : M], p[-1 : -(M + 1) : -1]))
-    p_ = p_.flatten()
+    i = numpy.column_stack((numpy.arange(M), numpy.arange(-1, -(M + 1), -1)))
+    i = i.flatten()
     if len(p) % 2 == 1:
-        p_ = numpy.hstack((p_, p[M]))
-    q = numpy.percentile(x, p_, axis = 0)
-    C = numpy.outer(p_, numpy.ones(numpy.shape(x)[1]))
-    return (q, C)
+        i = numpy.hstack((i, M))
+    C = numpy.outer(p[i], numpy.ones(numpy.shape(q)[1]))
+    return (q[i], C)
 
 
-def _plot_cell(ax, results, country, targets, stat,
+def _plot_cell(ax, differences, country, targets, stat,
                country_label = None, stat_label = None,
                space_to_newline = False):
     info = common.get_stat_info(stat)
 
-    if ((results[targets[0]] is not None)
-        and (results[targets[1]] is not None)):
-        v_base = getattr(results[targets[0]], stat)
-        v_intv = getattr(results[targets[1]], stat)
-        data = v_base - v_intv
-        # data = (v_base - v_intv) / v_base
+    if differences is not None:
+        data = differences.get_percentiles(targets[0], targets[1], stat)
         # Drop infinite data.
         ix = numpy.all(numpy.isfinite(data), axis = 0)
         q, C = _get_percentiles(data[:, ix])
@@ -65,7 +64,8 @@ def _plot_cell(ax, results, country, targets, stat,
         if info.units is None:
             info.autounits(data)
 
-        col = ax.pcolormesh(common.t[ix], q / info.scale, C,
+        t = model.differences.percentiles_t
+        col = ax.pcolormesh(t[ix], q / info.scale, C,
                             cmap = cmap)
                             # shading = 'gouraud')
 
@@ -88,6 +88,13 @@ def _plot_cell(ax, results, country, targets, stat,
         return col
 
 
+def _load(country):
+    try:
+        return model.differences.load(country)
+    except FileNotFoundError:
+        return None
+
+
 def plot_selected():
     for targs in targets:
         baseline = targs[0]
@@ -100,16 +107,16 @@ def plot_selected():
         gs = gridspec.GridSpec(nrows, ncols,
                                height_ratios = ((1, ) * (nrows - 1)
                                                 + (legend_height_ratio, )))
-        for (col, country) in enumerate(common.countries_to_plot):
+        differences_all = common.Prefetcher(_load, common.countries_to_plot)
+        for (col, (country, differences)) in enumerate(differences_all):
             print('\t', country)
-            results = common.get_country_results(country, targs)
             for (row, stat) in enumerate(common.effectiveness_measures):
                 ax = fig.add_subplot(gs[row, col])
 
                 stat_label = 'ylabel' if ax.is_first_col() else None
                 country_label = 'title' if ax.is_first_row() else None
 
-                _plot_cell(ax, results, country, targs, stat,
+                _plot_cell(ax, differences, country, targs, stat,
                            country_label = country_label,
                            stat_label = stat_label)
 
@@ -128,6 +135,29 @@ def plot_selected():
         common.savefig(fig, '{}.png'.format(fileroot))
 
 
+def _plot_page(country, targs):
+    nrows = len(common.effectiveness_measures) + 1
+    ncols = 1
+    legend_height_ratio = 1 / 3
+    gs = gridspec.GridSpec(nrows, ncols,
+                           height_ratios = ((1, ) * (nrows - 1)
+                                            + (legend_height_ratio, )))
+    differences = _load(country)
+    fig = pyplot.figure(figsize = (8.5, 11))
+    for (row, stat) in enumerate(common.effectiveness_measures):
+        ax = fig.add_subplot(gs[row, 0])
+
+        stat_label = 'ylabel' if ax.is_first_col() else None
+        country_label = 'title' if ax.is_first_row() else None
+
+        _plot_cell(ax, differences, country, targs, stat,
+                   country_label = country_label,
+                   stat_label = stat_label,
+                   space_to_newline = True)
+    fig.tight_layout()
+    return fig
+
+
 def plot_all():
     countries = common.all_regions_and_countries
 
@@ -136,31 +166,9 @@ def plot_all():
         print(baseline)
         filename = '{}_{}_all.pdf'.format(common.get_filebase(),
                                           str(baseline).replace(' ', '_'))
-        with backend_pdf.PdfPages(filename) as pdf:
-            nrows = len(common.effectiveness_measures) + 1
-            ncols = 1
-            legend_height_ratio = 1 / 3
-            gs = gridspec.GridSpec(nrows, ncols,
-                                   height_ratios = ((1, ) * (nrows - 1)
-                                                    + (legend_height_ratio, )))
-            for country in common.countries_to_plot:
-                print('\t', country)
-                results = common.get_country_results(country, targs)
-                fig = pyplot.figure(figsize = (8.5, 11))
-                for (row, stat) in enumerate(common.effectiveness_measures):
-                    ax = fig.add_subplot(gs[row, 0])
-
-                    stat_label = 'ylabel' if ax.is_first_col() else None
-                    country_label = 'title' if ax.is_first_row() else None
-
-                    _plot_cell(ax, results, country, targs, stat,
-                               country_label = country_label,
-                               stat_label = stat_label,
-                               space_to_newline = True)
-                fig.tight_layout()
-                pdf.savefig(fig)
-                pyplot.close(fig)
-                break
+        common.render_pages((functools.partial(_plot_page, country, targs)
+                             for country in countries),
+                            filename)
 
 
 if __name__ == '__main__':
@@ -15,7 +15,6 @@ import seaborn
 
 sys.path.append(os.path.dirname(__file__))  # For Sphinx.
 import common
-import stats
 sys.path.append('..')
 import model
 
@@ -32,7 +31,7 @@ def _set_clip_on(obj, val):
                 _set_clip_on(x, val)
 
 
-def _plot_cell(ax, results, country, targets, stat,
+def _plot_cell(ax, summaries, country, targets, stat,
                confidence_level, ci_bar,
                plotevery = 1, scale = None, units = None,
                country_label = None, stat_label = None,
@@ -52,26 +51,26 @@ def _plot_cell(ax, results, country, targets, stat,
         # Find scale and units.
         data = []
         for target in targets:
-            if results[target] is not None:
-                v = getattr(results[target], stat)
+            s = summaries[target]
+            if s is not None:
                 # Store the largest one.
                 if ci_bar > confidence_level:
-                    data.append(stats.confidence_interval(v[:, -1], ci_bar))
+                    data.append(s.confidence_interval(stat, ci_bar)[:, -1])
                 elif confidence_level > 0:
-                    data.append(stats.confidence_interval(v[:, : : plotevery],
-                                                          confidence_level))
+                    data.append(s.confidence_interval(
+                        stat, confidence_level)[:, : : plotevery])
                 else:
-                    data.append(stats.median(v[:, : : plotevery]))
+                    data.append(s.median(stat)[: : plotevery])
         if info.scale is None:
             info.autoscale(data)
         if info.units is None:
             info.autounits(data)
 
     for (i, target) in enumerate(targets):
-        if results[target] is not None:
-            v = getattr(results[target], stat) / info.scale
+        s = summaries[target]
+        if s is not None:
             t = common.t[ : : plotevery]
-            y = stats.median(v[:, : : plotevery])
+            y = s.median(stat)[: : plotevery] / info.scale
             l = ax.plot(t, y,
                         label = common.get_target_label(target),
                         color = colors[i],
@@ -79,8 +78,8 @@ def _plot_cell(ax, results, country, targets, stat,
                         zorder = 2)
 
             if confidence_level > 0:
-                CI = stats.confidence_interval(v[:, : : plotevery],
-                                               confidence_level)
+                CI = (s.confidence_interval(stat, confidence_level)
+                      [:, : : plotevery] / info.scale)
                 # Draw borders of CI with high alpha,
                 # which is why this is separate from fill_between().
                 # lw = l[0].get_linewidth() / 2
@@ -97,8 +96,8 @@ def _plot_cell(ax, results, country, targets, stat,
                                 alpha = alpha)
 
             if ci_bar > 0:
-                mid = stats.median(v[:, -1])
-                CIB = stats.confidence_interval(v[:, -1], ci_bar)
+                mid = s.median(stat)[-1] / info.scale
+                CIB = s.confidence_interval(stat, ci_bar)[:, -1] / info.scale
                 yerr = numpy.reshape([mid - CIB[0], CIB[1] - mid], (-1, 1))
                 eb = ax.errorbar(common.t[-1] + jitter * (i + 1),
                                  mid, yerr = yerr,
@@ -146,7 +145,7 @@ def plot_one(country, confidence_level = 0.5, ci_bar = 0.9,
 
     fig.suptitle(country, size = 10, va = 'baseline', x = 0.545)
 
-    results = common.get_country_results(country)
+    summaries = common.get_country_summaries(country)
     axes = []
     for (row, stat) in enumerate(common.effectiveness_measures):
         # Get common scale for row.
@@ -154,18 +153,18 @@ def plot_one(country, confidence_level = 0.5, ci_bar = 0.9,
         if (info.scale is None) or (info.units is None):
             data = []
             for target in model.target.all_:
-                if results[target] is not None:
-                    v = getattr(results[target], stat)
+                s = summaries[target]
+                if s is not None:
                     # Store the largest one.
                     if ci_bar > confidence_level:
-                        data.append(stats.confidence_interval(v[:, -1],
-                                                              ci_bar))
+                        data.append(
+                            s.confidence_interval(stat, ci_bar)[:, -1])
                     elif confidence_level > 0:
                         data.append(
-                            stats.confidence_interval(v[:, : : plotevery],
-                                                      confidence_level))
+                            s.confidence_interval(
+                                stat, confidence_level)[:, : : plotevery])
                     else:
-                        data.append(stats.median(v[:, : : plotevery]))
+                        data.append(s.median(stat)[: : plotevery])
             if info.scale is None:
                 info.autoscale(data)
             if info.units is None:
@@ -195,7 +194,7 @@ def plot_one(country, confidence_level = 0.5, ci_bar = 0.9,
             else:
                 stat_label = None
 
-            _plot_cell(ax, results, country, targs, stat,
+            _plot_cell(ax, summaries, country, targs, stat,
                        confidence_level,
                        ci_bar = ci_bar,
                        plotevery = plotevery,
@@ -236,15 +235,16 @@ def plot_some(confidence_level = 0, ci_bar = 0, **kwargs):
         fig, axes = pyplot.subplots(nrows, ncols,
                                     figsize = (common.width_1_5column, 4),
                                     sharex = 'all', sharey = 'none')
-        for (col, country) in enumerate(common.countries_to_plot):
-            results = common.get_country_results(country)
+        summaries_all = common.prefetch_country_summaries(
+            common.countries_to_plot)
+        for (col, (country, summaries)) in enumerate(summaries_all):
             for (row, stat) in enumerate(common.effectiveness_measures):
                 ax = axes[row, col]
 
                 stat_label = 'ylabel' if ax.is_first_col() else None
                 country_label = 'title' if ax.is_first_row() else None
 
-                _plot_cell(ax, results, country, model.target.all_, stat,
+                _plot_cell(ax, summaries, country, model.target.all_, stat,
                            confidence_level,
                            ci_bar = ci_bar,
                            country_label = country_label,
@@ -3,12 +3,12 @@
 Plot the effectiveness of interventions in all countries.
 '''
 
+import functools
 import os.path
 import sys
 import unicodedata
 
 import matplotlib
-from matplotlib import pyplot
 
 sys.path.append(os.path.dirname(__file__))  # For Sphinx.
 import common
@@ -56,15 +56,16 @@ def _get_filebase(country):
 
 def plot_all(plotevery = 10, **kwargs):
     path = common.get_filebase()
+    pages = []
+    filenames = []
     for region_or_country in common.all_regions_and_countries:
-        print(region_or_country)
-        fig = effectiveness.plot_one(region_or_country,
-                                     plotevery = plotevery,
-                                     **kwargs)
+        pages.append(functools.partial(effectiveness.plot_one,
+                                       region_or_country,
+                                       plotevery = plotevery,
+                                       **kwargs))
         filebase = _get_filebase(region_or_country)
-        filename = os.path.join(path, '{}.pgf'.format(filebase))
-        common.savefig(fig, filename)
-        pyplot.close(fig)
+        filenames.append(os.path.join(path, '{}.pgf'.format(filebase)))
+    common.render(pages, filenames)
 
 
 def combine(prefix = '../src/plots'):
@@ -7,12 +7,12 @@ make simulation plots.
           or :mod:`~.plots.vaccine_scenarios`.
 '''
 
+import functools
 import os.path
 import sys
 
 from matplotlib import lines
 from matplotlib import pyplot
-from matplotlib.backends import backend_pdf
 import numpy
 import seaborn
 
@@ -145,12 +145,11 @@ def plot_one(country, **kwargs):
 
 def plot_all(**kwargs):
     filename = '{}_all.pdf'.format(common.get_filebase())
-    with backend_pdf.PdfPages(filename) as pdf:
-        for region_or_country in common.all_regions_and_countries:
-            print(region_or_country)
-            fig = plot_one(region_or_country, **kwargs)
-            pdf.savefig(fig)
-            pyplot.close(fig)
+    common.render_pages((functools.partial(plot_one, region_or_country,
+                                           **kwargs)
+                         for region_or_country
+                         in common.all_regions_and_countries),
+                        filename)
 
 
 def plot_some(**kwargs):
@@ -160,9 +159,10 @@ def plot_some(**kwargs):
         fig, axes = pyplot.subplots(nrows, ncols,
                                     figsize = (common.width_2column, 4.75),
                                     sharex = 'all', sharey = 'none')
-        for (col, country) in enumerate(common.countries_to_plot):
-            results = common.get_country_results(country,
-                                                 parameters_type = 'mode')
+        results_all = common.prefetch_country_results(
+            common.countries_to_plot,
+            parameters_type = 'mode')
+        for (col, (country, results)) in enumerate(results_all):
             parameters = model.parameters.get_parameters(country)
             for (row, stat) in enumerate(common.effectiveness_measures):
                 ax = axes[row, col]
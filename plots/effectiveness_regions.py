@@ -16,7 +16,6 @@ import seaborn
 
 sys.path.append(os.path.dirname(__file__))  # For Sphinx.
 import common
-import stats
 sys.path.append('..')
 import model
 
@@ -38,7 +37,7 @@ region_labels = {
 }
 
 
-def _plot_stat(ax, results, regions, targets, stat, confidence_level,
+def _plot_stat(ax, summaries, regions, targets, stat, confidence_level,
                **kwargs):
     info = common.get_stat_info(stat)
 
@@ -48,13 +47,12 @@ def _plot_stat(ax, results, regions, targets, stat, confidence_level,
                         minor_axis = idx,
                         dtype = float)
     for region, target in itertools.product(regions, targets):
-        r = results[region][target]
-        if r is not None:
-            v = getattr(r, stat)
+        s = summaries[region][target]
+        if s is not None:
             # At the end time.
-            data.loc[region, str(target), 'median'] = stats.median(v[:, -1])
+            data.loc[region, str(target), 'median'] = s.median(stat)[-1]
             data.loc[region, str(target), ['CIlower', 'CIupper']] \
-                = stats.confidence_interval(v[:, -1], confidence_level)
+                = s.confidence_interval(stat, confidence_level)[:, -1]
 
     if info.scale is None:
         info.autoscale(data.max().max().values)
@@ -113,18 +111,17 @@ def _make_legend(fig, targets):
 def plot(confidence_level = 0.5, **kwargs):
     targets = model.target.all_
 
-    results = {region: common.get_country_results(region, targets = targets)
-               for region in regions}
+    summaries = dict(common.prefetch_country_summaries(regions,
+                                                       targets = targets))
 
     # Sort regions by first target, first stat.
     data = pandas.Series(index = regions,
                          dtype = float)
     for region in regions:
-        r = results[region][targets[0]]
-        if r is not None:
-            v = getattr(r, effectiveness_measures[0])
+        s = summaries[region][targets[0]]
+        if s is not None:
             # At the end time.
-            data[region] = stats.median(v[:, -1])
+            data[region] = s.median(effectiveness_measures[0])[-1]
     regions_sorted = data.sort_values(ascending = False).index
 
     nrows = len(effectiveness_measures)
@@ -136,7 +133,7 @@ def plot(confidence_level = 0.5, **kwargs):
                                                    4),
                                         sharex = 'col', sharey = 'none')
             for (ax, stat) in zip(axes, effectiveness_measures):
-                _plot_stat(ax, results, regions_sorted, targets, stat,
+                _plot_stat(ax, summaries, regions_sorted, targets, stat,
                            confidence_level, **kwargs)
                 ax.tick_params(axis = 'x', pad = 11)
                 labels = ax.get_xticklabels()
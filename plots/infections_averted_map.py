@@ -15,7 +15,6 @@ import pandas
 sys.path.append(os.path.dirname(__file__))
 import common
 import mapplot
-import stats
 sys.path.append('..')
 import model
 
@@ -106,25 +105,12 @@ def plot(infections_averted):
 
 
 def _get_infections_averted():
+    cube = model.differences.load_cube()
     infections_averted = pandas.DataFrame(columns = interventions,
                                           index = common.all_countries)
-    for country in common.all_countries:
-        print(country)
-        try:
-            rb = model.results.load(country, baseline)
-        except FileNotFoundError:
-            pass
-        else:
-            x = rb.new_infections[:, -1]
-            for intv in interventions:
-                try:
-                    r = model.results.load(country, intv)
-                except FileNotFoundError:
-                    pass
-                else:
-                    y = r.new_infections[:, -1]
-                    infections_averted.loc[country, intv] = stats.median(
-                        (x - y) / x)
+    for intv in interventions:
+        infections_averted[intv] = cube.get('relative', baseline, intv,
+                                            'new_infections', time)
     return infections_averted
 
 
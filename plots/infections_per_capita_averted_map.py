@@ -11,8 +11,6 @@ from matplotlib import pyplot
 from matplotlib import ticker
 import numpy
 import pandas
-import stats
-from scipy import integrate
 
 sys.path.append(os.path.dirname(__file__))
 import common
@@ -105,36 +103,15 @@ def plot(infections_per_capita_averted):
     common.savefig(fig, '{}.png'.format(common.get_filebase()))
 
 
-def _get_infections_per_capita(country, target):
-    r = model.results.load(country, target)
-    alive = r.alive
-    new_infections = r.new_infections
-    person_years = integrate.trapz(alive, common.t)
-    # exposure is number of 20-person-years lived.
-    exposure = person_years / (common.t[-1] - common.t[0])
-    infections_per_capita = new_infections[:, -1] / exposure
-    return infections_per_capita
-
-
 def _get_infections_per_capita_averted():
+    cube = model.differences.load_cube()
     infections_per_capita_averted = pandas.DataFrame(
         columns = interventions,
         index = common.all_countries)
-    for country in common.all_countries:
-        print(country)
-        try:
-            x = _get_infections_per_capita(country, baseline)
-        except FileNotFoundError:
-            pass
-        else:
-            for intv in interventions:
-                try:
-                    y = _get_infections_per_capita(country, intv)
-                except FileNotFoundError:
-                    pass
-                else:
-                    infections_per_capita_averted.loc[country, intv] \
-                        = stats.median(x - y)
+    for intv in interventions:
+        # The new infections by `time` per average population.
+        infections_per_capita_averted[intv] = cube.get(
+            'absolute', baseline, intv, 'infections_per_capita', time)
     return infections_per_capita_averted
 
 
@@ -109,8 +109,11 @@ class Basemap:
         self._do_basemap()
         self._load_borders()
         self._load_tiny_points()
-        # self.locator = locators.CentroidLocator(self.borders)
-        self.locator = locators.GeocodeLocator()
+        # Offline, unlike locators.GeocodeLocator().
+        # The countries without borders at these resolutions
+        # are in the tiny points.
+        self.locator = locators.IndexLocator({**self.tiny_points,
+                                              **self.borders})
 
     def _do_basemap(self,
                     zorder = 0,
@@ -2,10 +2,20 @@
 Locators to get the coordinates of a country.
 '''
 
+import hashlib
+import json
+import os
+import tempfile
+
 import cartopy
 import numpy
 
 
+# Change this when the locations in the index change,
+# e.g. a new way of computing them, so that old indexes get rebuilt.
+index_version = 1
+
+
 class _Locator:
     '''
     Abstract base class for locators.
@@ -18,7 +28,7 @@ class _Locator:
         Do many calls to :meth:`get_location` and stack results.
         '''
 
-        coords = numpy.vstack(map(self.get_location, countries)).T
+        coords = numpy.vstack(list(map(self.get_location, countries))).T
         return coords
 
 
@@ -52,6 +62,8 @@ class GeocodeLocator(_Locator):
 class CentroidLocator(_Locator):
     '''
     Use the centroid from the country map borders to get country coordinates.
+    The centroids of the parts of a country are weighted by their areas
+    in an equal-area projection.
     '''
 
     _equalarea_crs = cartopy.crs.AlbersEqualArea()
@@ -59,7 +71,7 @@ class CentroidLocator(_Locator):
         self.borders = borders
 
         try:
-            geom = next(self.borders.geometries())
+            geom = next(iter(self.borders.values()))
         except StopIteration:
             self.crs = None
         else:
@@ -71,10 +83,99 @@ class CentroidLocator(_Locator):
         centroids = []
         areas = []
         for g in border.geometries():
-            centroids.append(g.centroid.xy)
-            areas.append(
-                self._equalarea_crs.project_geometry(g, border.crs).area)
-
-        centroid = numpy.average(centroids, weights = areas,
-                                 axis = 0).squeeze()
+            # The polygons of a multipolygon.
+            for p in getattr(g, 'geoms', [g]):
+                centroids.append((p.centroid.x, p.centroid.y))
+                areas.append(
+                    self._equalarea_crs.project_geometry(p, border.crs).area)
+
+        if sum(areas) > 0:
+            centroid = numpy.average(centroids, weights = areas, axis = 0)
+        else:
+            # Points.
+            centroid = numpy.mean(centroids, axis = 0)
         return centroid
+
+
+def get_index_path():
+    return os.path.join(os.path.dirname(__file__), '_index', 'locations.json')
+
+
+def get_digest(borders):
+    '''
+    A digest of the names of the countries in `borders`,
+    to tell whether an index was built from the same borders.
+    '''
+    names = '\n'.join(sorted(borders))
+    return hashlib.sha1(names.encode()).hexdigest()
+
+
+def build_index(borders, path = None):
+    '''
+    Save the coordinates of all the countries in `borders` from
+    :class:`CentroidLocator` to the index at `path`,
+    and return them.
+    '''
+    if path is None:
+        path = get_index_path()
+    locator = CentroidLocator(borders)
+    locations = {country: list(map(float, locator.get_location(country)))
+                 for country in borders}
+    index = dict(version = index_version,
+                 digest = get_digest(borders),
+                 locations = locations)
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok = True)
+    # Write a temporary file and rename it, so that other processes
+    # never see a partial index.
+    fd, tempname = tempfile.mkstemp(dir = dirname, suffix = '.json')
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(index, fp, indent = 0, sort_keys = True)
+    os.replace(tempname, path)
+    return locations
+
+
+def load_index(path = None, borders = None):
+    '''
+    Load the coordinates of the countries from the index at `path`,
+    raising :exc:`ValueError` if it is from a different
+    :data:`index_version` or, if `borders` is given,
+    was built from borders with different countries.
+    '''
+    if path is None:
+        path = get_index_path()
+    with open(path) as fp:
+        index = json.load(fp)
+    if index.get('version') != index_version:
+        raise ValueError('Index "{}" is version {}, not {}.'.format(
+            path, index.get('version'), index_version))
+    if (borders is not None) and (index.get('digest')
+                                  != get_digest(borders)):
+        raise ValueError(
+            'Index "{}" is for different countries.'.format(path))
+    return index['locations']
+
+
+class IndexLocator(_Locator):
+    '''
+    Get country coordinates from the index on disk from
+    :func:`build_index`, without network access.
+    If the index is missing or out of date, or has different
+    countries than `borders`, it is built from `borders`, if given.
+    '''
+
+    crs = cartopy.crs.PlateCarree()
+
+    def __init__(self, borders = None, path = None):
+        try:
+            self.locations = load_index(path, borders)
+        except (FileNotFoundError, ValueError):
+            if borders is None:
+                raise
+            self.locations = build_index(borders, path)
+
+    def get_location(self, country):
+        try:
+            return self.locations[country]
+        except KeyError:
+            raise ValueError('Couldn\'t find country "{}".'.format(country))
@@ -31,8 +31,6 @@ def tornado(ax, results, targets, outcome, t, parameter_samples,
         parameter_names = ['parameter[{}]'.format(i) for i in range(n)]
 
     rho = stats.prcc(parameter_samples, outcome_samples)
-    CI = stats.prcc_CI(rho, len(outcome_samples))
-    xerr = numpy.row_stack((rho - CI[:, 0], CI[:, 1] - rho))
 
     ix = numpy.argsort(numpy.abs(rho))
 
@@ -41,6 +39,8 @@ def tornado(ax, results, targets, outcome, t, parameter_samples,
 
     h = range(n)
     if errorbars:
+        CI = stats.prcc_bootstrap_CI(parameter_samples, outcome_samples)
+        xerr = numpy.row_stack((rho - CI[:, 0], CI[:, 1] - rho))
         kwds = dict(xerr = xerr[:, ix],
                     error_kw = dict(ecolor = 'black',
                                     elinewidth = 1.5,
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+'''
+Plot the PRCCs over time from :mod:`model.sensitivity`.
+'''
+
+import os.path
+import sys
+
+from matplotlib import pyplot
+from matplotlib import ticker
+import numpy
+import seaborn
+
+sys.path.append(os.path.dirname(__file__))  # cwd for Sphinx.
+import common
+sys.path.append('..')
+import model
+
+
+baseline = model.target.StatusQuo()
+intervention = model.target.Vaccine(treatment_target = baseline)
+outcome = 'new_infections'
+
+
+def plot_place(trajectories, place, baseline, intervention, stat,
+               palette = 'Dark2'):
+    '''
+    The PRCCs of all the parameters over time for `place`,
+    with their confidence intervals.
+    '''
+    i = trajectories.places.index(place)
+    j = trajectories.pairs.index(tuple(map(str, (baseline, intervention))))
+    k = trajectories.stats.index(stat)
+    colors = seaborn.color_palette(palette, len(common.parameter_names))
+    with seaborn.axes_style('whitegrid', common.rc_black_text):
+        fig, ax = pyplot.subplots(figsize = (common.width_1_5column, 3))
+        for (p, name) in enumerate(common.parameter_names):
+            rho = trajectories.rho[p, i, j, k]
+            CI = trajectories.CI[p, i, j, k]
+            ax.plot(trajectories.times, rho, color = colors[p],
+                    label = name.replace('\n', ' '))
+            ax.fill_between(trajectories.times, CI[:, 0], CI[:, 1],
+                            facecolor = colors[p], linewidth = 0,
+                            alpha = 0.3)
+        ax.set_ylim(-1, 1)
+        ax.set_ylabel('PRCC')
+        ax.set_title(place)
+        ax.legend(loc = 'center left', bbox_to_anchor = (1, 0.5),
+                  frameon = False)
+    fig.tight_layout()
+    return fig
+
+
+def plot(trajectories, baseline, intervention, stat,
+         cmap = 'RdBu_r'):
+    '''
+    Heat maps of the PRCCs over time for all the places,
+    one for each parameter.
+    '''
+    places = [p for p in common.all_regions_and_countries
+              if p in trajectories.places]
+    i = [trajectories.places.index(p) for p in places]
+    j = trajectories.pairs.index(tuple(map(str, (baseline, intervention))))
+    k = trajectories.stats.index(stat)
+    ncols = 4
+    nrows = int(numpy.ceil(len(common.parameter_names) / ncols))
+    fig, axes = pyplot.subplots(nrows, ncols,
+                                figsize = (common.width_2column,
+                                           common.height_max),
+                                sharex = 'all', sharey = 'all',
+                                squeeze = False)
+    for (p, ax) in enumerate(axes.flat):
+        if p >= len(common.parameter_names):
+            ax.axis('off')
+            continue
+        rho = trajectories.rho[p, i, j, k]
+        mappable = ax.pcolormesh(trajectories.times,
+                                 numpy.arange(len(places)),
+                                 rho,
+                                 cmap = cmap, vmin = -1, vmax = 1,
+                                 shading = 'nearest')
+        ax.set_title(common.parameter_names[p])
+        ax.xaxis.set_major_locator(ticker.MultipleLocator(5))
+        ax.set_yticks(numpy.arange(len(places)))
+        ax.set_yticklabels([common.get_country_short_name(p)
+                            for p in places],
+                           size = 2)
+        ax.invert_yaxis()
+    fig.colorbar(mappable, ax = axes, label = 'PRCC',
+                 orientation = 'horizontal', fraction = 0.03)
+    return fig
+
+
+if __name__ == '__main__':
+    trajectories = model.sensitivity.Trajectories.load()
+    fig = plot(trajectories, baseline, intervention, outcome)
+    common.savefig(fig, '{}.pdf'.format(common.get_filebase()))
+    common.savefig(fig, '{}.png'.format(common.get_filebase()))
+    fig = plot_place(trajectories, 'Global', baseline, intervention, outcome)
+    common.savefig(fig, '{}_Global.pdf'.format(common.get_filebase()))
+    common.savefig(fig, '{}_Global.png'.format(common.get_filebase()))
+    pyplot.show()
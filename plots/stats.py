@@ -2,11 +2,15 @@
 Calculate PRCCs, etc.
 '''
 
+import sys
 import warnings
 
 import numpy
 import scipy.stats
 
+sys.path.append('..')
+import model
+
 
 def median(X, axis = 0):
     '''
@@ -45,7 +49,7 @@ def confidence_interval(X, level, axis = 0):
 
 
 def rankdata(X, axis = 0):
-    return numpy.apply_along_axis(scipy.stats.rankdata, axis, X)
+    return model.prcc.rankdata(X, axis = axis)
 
 
 def cc(X, y):
@@ -70,31 +74,39 @@ def get_residuals(Z, b):
 
 
 def pcc(X, y):
-    n = numpy.shape(X)[-1]
-
-    rho = numpy.empty(n)
-    for i in range(n):
-        # Separate ith column from other columns.
-        mask = numpy.array([j == i for j in range(n)])
-        x = numpy.squeeze(X[..., mask])
-        Z = X[..., ~mask]
-        x_res = get_residuals(Z, x)
-        y_res = get_residuals(Z, y)
-        rho[i], _ = scipy.stats.pearsonr(x_res, y_res)
-    return rho
+    '''
+    `y` can have more axes after the samples, e.g. for
+    many outcomes and times at once.
+    '''
+    return model.prcc.pcc(X, y)
 
 
 def prcc(X, y):
-    return pcc(rankdata(X), rankdata(y))
+    return model.prcc.prcc(X, y)
 
 
 def pcc_CI(rho, N, alpha = 0.05):
-    p = 1
-    z = numpy.arctanh(rho)
-    z_crit = scipy.stats.norm.ppf([alpha / 2, 1 - alpha / 2])
-    z_CI = z[..., numpy.newaxis] + z_crit / numpy.sqrt(N - p - 3)
-    return numpy.tanh(z_CI)
+    return model.prcc.get_CI(rho, N, alpha = alpha)
 
 
 def prcc_CI(rho, N, alpha = 0.05):
     return pcc_CI(rho, N, alpha = alpha)
+
+
+def prcc_bootstrap_CI(X, y, alpha = 0.05, nboot = 1000):
+    '''
+    Bootstrap confidence intervals for :func:`prcc`, which,
+    unlike :func:`prcc_CI`, don't rely on a normal approximation.
+    '''
+    indices = model.bootstrap.get_indices(len(X), nboot = nboot)
+    return model.bootstrap.prcc_CI(X, y, alpha = alpha, indices = indices)
+
+
+def quantile_bootstrap_CI(X, q, alpha = 0.05, nboot = 1000):
+    '''
+    Bootstrap confidence intervals for :func:`quantile`
+    over the first axis of `X`.
+    '''
+    indices = model.bootstrap.get_indices(len(X), nboot = nboot)
+    return model.bootstrap.quantile_CI(X, q, alpha = alpha,
+                                       indices = indices)
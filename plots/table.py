@@ -33,26 +33,16 @@ summaries = ('median', 'CI0', 'CI1')
 alpha = 0.5
 
 
-def _get_summaries(x, alpha = 0.05):
-    y = numpy.asarray(x).copy()
-
-    # Set columns with NaNs to 0.
-    ix = numpy.any(numpy.isnan(y), axis = 0)
-    y[..., ix] = 0
-
-    avg = numpy.median(y, axis = 0)
-    CI = numpy.percentile(y,
-                          [100 * alpha / 2, 100 * (1 - alpha / 2)],
-                          axis = 0)
-    # avg = numpy.mean(y, axis = 0)
-    # std = numpy.std(y, axis = 0, ddof = 1)
-    # CI = numpy.vstack((avg - std, avg + std))
+def _get_summaries(summary, stat, alpha = 0.05):
+    # The quantiles are NaN where any sample is NaN.
+    avg = summary.median(stat)
+    CI = summary.confidence_interval(stat, 1 - alpha)
+    return (avg, CI)
 
-    # Set the columns where y has NaNs to NaN.
-    avg[..., ix] = numpy.nan
-    CI[..., ix] = numpy.nan
 
-    return (avg, CI)
+def _load(country):
+    return {target: model.summaries.load(country, target)
+            for target in targets}
 
 
 def _main():
@@ -62,13 +52,12 @@ def _main():
                                           summaries))
     df = pandas.DataFrame(index = ix.sort_values(),
                           columns = cix.sort_values())
-    for country in countries:
+    for (country, summaries_) in common.Prefetcher(_load, countries):
         print(country)
         for target in targets:
-            results = model.results.load(country, target)
+            summary = summaries_[target]
             for stat in stats:
-                x = getattr(results, stat)
-                avg, CI = _get_summaries(x, alpha = alpha)
+                avg, CI = _get_summaries(summary, stat, alpha = alpha)
                 for (v, s) in zip((avg, CI[0], CI[1]), summaries):
                     z = numpy.interp(times, common.t, v)
                     df.loc[(country, target),
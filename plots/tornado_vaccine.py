@@ -76,8 +76,45 @@ def sensitivity(country, targets, stat, times):
     return (numpy.asarray(rho), labels)
 
 
-def tornado(ax, country, targets, outcome, t, colors):
-    rho, labels = sensitivity(country, targets, outcome, t)
+# Labels for the axes of the sweep, as in `get_target_info()`.
+_sweep_labels = dict(efficacy = 'Efficacy',
+                     coverage = 'Coverage',
+                     time_to_start = 'Start date',
+                     time_to_fifty_percent = 'Scale-up')
+
+
+def sensitivity_sweep(sweep, outcome, time):
+    '''
+    Like `sensitivity()`, but from the designs of a
+    `model.vaccine_sweep.Sweep`, summed over its countries,
+    by fitting the outcome linearly to the design
+    and scaling by the fitted outcome of the default design.
+    '''
+    i = sweep.outcomes.index(outcome)
+    j = list(sweep.years).index(time)
+    y = sweep.values[:, :, i, j].sum(0)
+    designs = sweep.designs.copy()
+    defaults = dict(model.vaccine_sweep.defaults)
+    # Scale-up rate, as in `_get_value()`.
+    designs['time_to_fifty_percent'] = 0.5 / designs['time_to_fifty_percent']
+    defaults['time_to_fifty_percent'] = 0.5 / defaults['time_to_fifty_percent']
+    # Leave out the axes that weren't swept.
+    axes = [k for k in designs.columns if designs[k].nunique() > 1]
+    X = numpy.column_stack([numpy.ones(len(designs))]
+                           + [designs[k] for k in axes])
+    coef = numpy.linalg.lstsq(X, y, rcond = None)[0]
+    x_default = numpy.hstack([1, [defaults[k] for k in axes]])
+    y_default = x_default @ coef
+    rho = coef[1 : ] / y_default
+    labels = [_sweep_labels[k] for k in axes]
+    return (rho, labels)
+
+
+def tornado(ax, country, targets, outcome, t, colors, sweep = None):
+    if sweep is None:
+        rho, labels = sensitivity(country, targets, outcome, t)
+    else:
+        rho, labels = sensitivity_sweep(sweep, outcome, t)
     n = len(rho)
 
     ix = numpy.argsort(numpy.abs(rho))
@@ -102,7 +139,11 @@ def tornado(ax, country, targets, outcome, t, colors):
     return patches
 
 
-def tornados():
+def tornados(sweep = None):
+    '''
+    With `sweep`, a `model.vaccine_sweep.Sweep`,
+    use its designs instead of `model.target.vaccine_scenarios`.
+    '''
     country = 'Global'
     outcome = 'new_infections'
     targets = model.target.vaccine_scenarios
@@ -116,7 +157,7 @@ def tornados():
         fig, ax = pyplot.subplots(1, 1, figsize = figsize)
         seaborn.despine(ax = ax, top = True, bottom = True)
         ax.tick_params(labelsize = pyplot.rcParams['font.size'])
-        tornado(ax, country, targets, outcome, time, colors)
+        tornado(ax, country, targets, outcome, time, colors, sweep = sweep)
         ax.set_xlabel('Sensitivity')
 
     fig.tight_layout(pad = 0)
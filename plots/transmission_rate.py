@@ -3,12 +3,12 @@
 Make a PDF with a page of transmission plots for each country.
 '''
 
+import functools
 import itertools
 import os.path
 import sys
 
 import joblib
-from matplotlib.backends import backend_pdf
 from matplotlib import pyplot
 from matplotlib import ticker
 import numpy
@@ -222,9 +222,11 @@ def plot_one(country, fig = None):
     axes[0].set_ylabel('Transmission rate (per year)')
     axes[0].legend(loc = 'upper right', frameon = False)
 
-    results = joblib.Parallel(n_jobs = -1)(
-        joblib.delayed(model.simulation.Simulation)(parameter_values, target)
-        for target in targets)
+    with model.resources.parallel() as parallel:
+        results = parallel(
+            joblib.delayed(model.simulation.Simulation)(parameter_values,
+                                                        target)
+            for target in targets)
     _plot_cell(axes[1], parameters, targets, results, 'infected')
     _plot_cell(axes[2], parameters, targets, results, 'prevalence')
     _plot_cell(axes[3], parameters, targets, results, 'incidence')
@@ -235,20 +237,24 @@ def plot_one(country, fig = None):
     return fig
 
 
+def _plot_rates_page(countries):
+    fig, ax = plot_transmission_rates(countries, savefig = False)
+    return fig
+
+
+def _plot_one_page(country):
+    fig = pyplot.figure(figsize = (11, 8.5))
+    plot_one(country, fig = fig)
+    return fig
+
+
 def plot_all():
     countries = common.all_countries
     filename = '{}.pdf'.format(common.get_filebase())
-    with backend_pdf.PdfPages(filename) as pdf:
-        fig, ax = plot_transmission_rates(countries, savefig = False)
-        pdf.savefig(fig)
-        pyplot.close(fig)
-
-        for country in countries:
-            print(country)
-            fig = pyplot.figure(figsize = (11, 8.5))
-            plot_one(country, fig = fig)
-            pdf.savefig(fig)
-            pyplot.close(fig)
+    pages = [functools.partial(_plot_rates_page, countries)]
+    pages.extend(functools.partial(_plot_one_page, country)
+                 for country in countries)
+    common.render_pages(pages, filename)
 
 
 if __name__ == '__main__':
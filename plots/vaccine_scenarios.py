@@ -4,13 +4,13 @@ Using the modes of the parameter distributions,
 make plots for sensitivity to vaccine parameters.
 '''
 
+import functools
 import os.path
 import sys
 
 from matplotlib import lines
 from matplotlib import pyplot
 from matplotlib import ticker
-from matplotlib.backends import backend_pdf
 import numpy
 import seaborn
 
@@ -165,12 +165,11 @@ def plot_one(country, treatment_target = model.target.StatusQuo()):
 
 def plot_all(treatment_target = model.target.StatusQuo()):
     filename = '{}_all.pdf'.format(common.get_filebase())
-    with backend_pdf.PdfPages(filename) as pdf:
-        for region_or_country in common.all_regions_and_countries:
-            print(region_or_country)
-            fig = plot_one(region_or_country, treatment_target)
-            pdf.savefig(fig)
-            pyplot.close(fig)
+    common.render_pages((functools.partial(plot_one, region_or_country,
+                                           treatment_target)
+                         for region_or_country
+                         in common.all_regions_and_countries),
+                        filename)
 
 
 def plot_some(treatment_target = model.target.StatusQuo()):
@@ -182,10 +181,11 @@ def plot_some(treatment_target = model.target.StatusQuo()):
         fig, axes = pyplot.subplots(nrows, ncols,
                                     figsize = (common.width_1_5column, 4),
                                     sharex = 'all', sharey = 'none')
-        for (col, country) in enumerate(common.countries_to_plot):
-            results = common.get_country_results(country,
-                                                 targets = targets,
-                                                 parameters_type = 'mode')
+        results_all = common.prefetch_country_results(
+            common.countries_to_plot,
+            targets = targets,
+            parameters_type = 'mode')
+        for (col, (country, results)) in enumerate(results_all):
             for (row, stat) in enumerate(common.effectiveness_measures):
                 ax = axes[row, col]
 
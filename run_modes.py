@@ -2,6 +2,11 @@
 '''
 Using the modes of the parameter distributions,
 run simulations.
+
+By default, the countries and targets are solved one at a time
+with the default solver.  Use ``_main(batched = True)`` to instead
+solve them all together with :mod:`model.batched_modes`,
+which uses the exponential integrator and so differs slightly.
 '''
 
 import joblib
@@ -16,12 +21,15 @@ def _run_one(country, target):
     model.results.dump(results)
 
 
-def _main(targets = model.target.all_):
-    joblib.Parallel(n_jobs = -1)(
-        joblib.delayed(_run_one)(country, target)
-        for country in model.datasheet.get_country_list()
-        for target in targets
-        if not model.results.exists(country, target, 'mode'))
+def _main(targets = model.target.all_, batched = False):
+    if batched:
+        model.batched_modes.run(targets = targets)
+    else:
+        with model.resources.parallel() as parallel:
+            parallel(joblib.delayed(_run_one)(country, target)
+                     for country in model.datasheet.get_country_list()
+                     for target in targets
+                     if not model.results.exists(country, target, 'mode'))
 
     model.multicountry.build_regionals(targets, 'mode')
 
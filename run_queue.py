@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+'''
+Run simulations with parameter samples as a worker of the work queue
+in :mod:`model.work_queue`.  Start this on each of the hosts
+that share `sim_data`: the workers split up the runs between them
+and take over the runs of workers that died.
+'''
+
+import model
+
+
+def _main():
+    model.work_queue.work()
+
+    model.multicountry.build_regionals()
+
+    model.summaries.build_all()
+    model.differences.build_all()
+    model.sensitivity.build_all()
+
+
+if __name__ == '__main__':
+    _main()
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 '''
-Run simulations with parameter samples.
+Run simulations with parameter samples, and solve only the new samples
+for results from before the samples were extended.
 '''
 
 import model
@@ -26,13 +27,32 @@ def _run_one(country, target):
     model.results.dump(results)
 
 
+def _extend_one(country, target):
+    print('Extending {}, {!s}.'.format(country, target))
+    results = model.simulation.MultiSim.extend(country, target)
+    model.results.dump(results)
+
+
 def _main():
+    nsamples = len(model.parameters._get_samples())
+    # Whether any results got new samples.
+    extended = False
     for country in countries:
         for target in model.target.all_:
             if not model.results.exists(country, target):
                 _run_one(country, target)
-
-    model.multicountry.build_regionals()
+            elif ((model.results.get_nsamples(country, target) < nsamples)
+                  and not model.adaptive.exists(country, target)):
+                _extend_one(country, target)
+                extended = True
+
+    # The regional results and the summaries are stale
+    # if any of their countries got new samples.
+    model.multicountry.build_regionals(overwrite = extended)
+
+    model.summaries.build_all(overwrite = extended)
+    model.differences.build_all(overwrite = extended)
+    model.sensitivity.build_all(overwrite = extended)
 
 
 if __name__ == '__main__':
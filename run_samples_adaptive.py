@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+'''
+Run simulations with parameter samples like :mod:`run_samples`,
+but stop each country-target run once the quantiles of the outcomes
+have converged, with :class:`model.adaptive.AdaptiveMultiSim`.
+
+The sample counts of the results on disk:
+
+* Each country-target result holds the samples run up to convergence,
+  ``model.adaptive.load(country, target).nsamples`` of them,
+  the first samples of :class:`model.parameters.Samples`.
+* Each regional result holds as many samples as the country
+  in the region with the most, with the countries that stopped early
+  resampled with replacement up to that, by
+  :func:`model.multicountry.build_regionals`.
+* The differences and sensitivities of a country use the samples
+  common to its targets.
+'''
+
+import model
+import run_samples
+
+
+def _run_one(country, target, tolerance):
+    print('Running {}, {!s}.'.format(country, target))
+    parameter_samples = model.parameters.Samples(country)
+    results = model.adaptive.AdaptiveMultiSim(parameter_samples, target,
+                                              tolerance = tolerance)
+    results.dump()
+    print('{} samples, precision {:g}.'.format(
+        results.convergence.nsamples, results.convergence.worst))
+
+
+def _main(tolerance = 0.05):
+    for country in run_samples.countries:
+        for target in model.target.all_:
+            if not model.results.exists(country, target):
+                _run_one(country, target, tolerance)
+
+    print(model.adaptive.get_table(run_samples.countries,
+                                   model.target.all_))
+
+    model.multicountry.build_regionals()
+
+    model.summaries.build_all()
+    model.differences.build_all()
+    model.sensitivity.build_all()
+
+
+if __name__ == '__main__':
+    _main()
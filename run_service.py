@@ -0,0 +1,20 @@
+#!/usr/bin/python3
+'''
+Run the local results service of :mod:`model.service`
+until it is interrupted.  Scripts can then get results through
+:class:`model.service.Client` instead of :func:`model.results.load`.
+'''
+
+import model
+
+
+def _main():
+    print('Listening on {}.'.format(model.service.socket_path))
+    try:
+        model.service.Service().run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    _main()
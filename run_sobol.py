@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+'''
+Compute the Sobol sensitivity indices of the outcomes
+to the parameters with :mod:`model.sobol` for the countries to plot,
+solving with the exponential integrator, ``integrator = 'expo'``,
+as :class:`model.sobol.Indices` does by default.
+'''
+
+import model
+
+
+countries = ['United States of America',
+             'South Africa',
+             'Uganda',
+             'Nigeria',
+             'India',
+             'Rwanda']
+
+
+def _main(N = 1024, target = model.target.StatusQuo(), integrator = 'expo'):
+    for country in countries:
+        print('Running {}, {!s}.'.format(country, target))
+        indices = model.sobol.run(country, target, N = N,
+                                  integrator = integrator)
+        print(indices.to_frame().round(3))
+
+
+if __name__ == '__main__':
+    _main()
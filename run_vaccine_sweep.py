@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+'''
+Using the modes of the parameter distributions,
+run simulations for a Latin hypercube sample of vaccine designs
+with :mod:`model.vaccine_sweep` for all the countries.
+'''
+
+import joblib
+
+import model
+
+
+def _run_one(country, designs, treatment_target):
+    print('Running {}.'.format(country))
+    return model.vaccine_sweep.Sweep([country], designs,
+                                     treatment_target = treatment_target)
+
+
+def _main(ndesigns = 1000, treatment_target = model.target.StatusQuo()):
+    designs = model.vaccine_sweep.get_lhs(ndesigns)
+    # The solutions for all the designs of a country are in memory at once.
+    job_memory = model.resources.get_job_memory(ndesigns)
+    with model.resources.parallel(job_memory) as parallel:
+        sweeps = parallel(
+            joblib.delayed(_run_one)(country, designs, treatment_target)
+            for country in model.datasheet.get_country_list())
+    model.vaccine_sweep.Sweep.concat(sweeps).dump()
+
+
+if __name__ == '__main__':
+    _main()
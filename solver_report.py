@@ -0,0 +1,23 @@
+#!/usr/bin/python3
+'''
+Report the slowest simulation runs from the solver statistics
+saved alongside the results.
+'''
+
+import pandas
+
+import model
+
+
+if __name__ == '__main__':
+    stats = model.solver_stats.load_all()
+    if len(stats) == 0:
+        print('No solver statistics found.')
+    else:
+        with pandas.option_context('display.width', 200,
+                                   'display.max_columns', None):
+            print('Slowest country & target combinations:')
+            print(model.solver_stats.get_totals(stats).head(20))
+            print()
+            print('Slowest runs:')
+            print(model.solver_stats.get_slowest(stats))
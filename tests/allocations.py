@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+'''
+Benchmark the memory allocated per call of the right-hand sides
+:func:`model.ODEs.rhs` and :func:`model.ODEs.rhs_log`
+with and without preallocated buffers.
+
+The allocations are measured with :mod:`tracemalloc`
+as the peak memory above what was already allocated,
+so temporaries freed within the call are counted.
+The control rates are counted separately from the rest
+of the right-hand side, both as the record arrays
+of :func:`model.control_rates.get` and as the plain arrays
+of :func:`model.control_rates.get_array`.
+'''
+
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+sys.path.append('..')
+import model
+
+
+def _get_allocated(fcn, n = 100):
+    '''
+    The smallest peak memory, in bytes, allocated by one call of `fcn`.
+    '''
+    fcn()
+    allocated = []
+    for _ in range(n):
+        tracemalloc.start()
+        (start, _) = tracemalloc.get_traced_memory()
+        fcn()
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        allocated.append(peak - start)
+    return min(allocated)
+
+
+def _get_time(fcn, n = 1000):
+    time_start = time.time()
+    for _ in range(n):
+        fcn()
+    return (time.time() - time_start) / n
+
+
+def _main():
+    country = 'South Africa'
+    target = model.target.UNAIDS90()
+    parameters = model.parameters.Mode.from_country(country)
+    t = 2020.
+    state = parameters.initial_conditions.values + 1
+    state_trans = model.ODEs.transform(state)
+    # Fix the control rates to leave them out.
+    control_rates_ = model.control_rates.get_array(t, state, target,
+                                                   parameters)
+    def controls(t, state, target, parameters):
+        return control_rates_
+    args = (target, parameters, 0)
+    out = numpy.empty(len(model.ODEs.variables))
+    state_buffer = numpy.empty(len(model.ODEs.variables))
+    control_rates_buffer = numpy.empty(len(model.control_rates.names))
+    target_values_buffer = numpy.empty(len(model.control_rates.names))
+
+    calls = (
+        ('transform_inv()',
+         lambda: model.ODEs.transform_inv(state_trans)),
+        ('transform_inv(out)',
+         lambda: model.ODEs.transform_inv(state_trans, out = state_buffer)),
+        ('control_rates.get()',
+         lambda: model.control_rates.get(t, state, target, parameters)),
+        ('control_rates.get_array(out)',
+         lambda: model.control_rates.get_array(
+             t, state, target, parameters,
+             out = control_rates_buffer,
+             target_values = target_values_buffer)),
+        ('rhs()',
+         lambda: model.ODEs.rhs(t, state.copy(), *args, controls)),
+        ('rhs(out)',
+         lambda: model.ODEs.rhs(t, state.copy(), *args, controls,
+                                out = out)),
+        ('rhs_log()',
+         lambda: model.ODEs.rhs_log(t, state_trans, *args, controls)),
+        ('rhs_log(out, state)',
+         lambda: model.ODEs.rhs_log(t, state_trans, *args, controls,
+                                    out = out, state = state_buffer)),
+    )
+    for (name, fcn) in calls:
+        print('{:>28}: {:5d} bytes, {:6.1f} µs per call.'.format(
+            name, _get_allocated(fcn), 1e6 * _get_time(fcn)))
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+'''
+Test solving with :mod:`model.exponential_integrator` versus
+:func:`scipy.integrate.odeint` for correctness and speed,
+both one run at a time and for all the samples together.
+'''
+
+import sys
+import time
+
+import joblib
+
+sys.path.append('..')
+import model
+
+
+def _main(targets = model.target.all_):
+    for country in model.datasheet.get_country_list():
+        parameters = model.parameters.Mode.from_country(country)
+        for target in targets:
+            comparison = model.exponential_integrator.validate(parameters,
+                                                               target)
+            time_odeint = comparison.pop('time_odeint')
+            time_expo = comparison.pop('time_expo')
+            (variable, maxrelerr) = max(comparison.items(),
+                                        key = lambda x: x[1])
+            print('{}, {!s}: odeint {:.2f} sec, expo {:.2f} sec, '
+                  'max relative error = {:g} ({}).'.format(
+                      country, target, time_odeint, time_expo,
+                      maxrelerr, variable))
+
+
+def _main_samples(country = 'Nigeria', target = model.target.UNAIDS90(),
+                  nsamples = 100):
+    samples = list(model.parameters.Samples(country))[ : nsamples]
+    time_start = time.time()
+    with joblib.Parallel(n_jobs = -1) as parallel:
+        parallel(joblib.delayed(model.ODEs.solve)(model.simulation.t,
+                                                  target, p)
+                 for p in samples)
+    time_odeint = time.time() - time_start
+    time_start = time.time()
+    model.exponential_integrator.solve(model.simulation.t, target, samples)
+    time_expo = time.time() - time_start
+    print('{}, {!s}, {} samples: odeint (parallel) {:.2f} sec, '
+          'expo (batched) {:.2f} sec.'.format(
+              country, target, len(samples), time_odeint, time_expo))
+
+
+if __name__ == '__main__':
+    _main()
+    _main_samples()
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+'''
+Benchmark the data sent between the processes by
+:class:`model.simulation.MultiSim`: the samples and solutions
+copied through pickles versus passed in memmaps shared with the
+worker processes.
+
+The bytes are those of pickling the arguments and return values of
+each task, with memmaps pickled by reference as :mod:`joblib` does.
+The peak memory is that allocated in the parent process,
+measured with :mod:`tracemalloc`.
+'''
+
+import copyreg
+import io
+import itertools
+import os.path
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import joblib
+from joblib._memmapping_reducer import reduce_array_memmap_backward
+import numpy
+
+sys.path.append('..')
+import model
+
+
+def _get_pickled_bytes(obj):
+    fp = io.BytesIO()
+    pickler = pickle.Pickler(fp, protocol = -1)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[numpy.memmap] = reduce_array_memmap_backward
+    pickler.dump(obj)
+    return len(fp.getvalue())
+
+
+def _get_bytes_copied(samples, target):
+    sample = next(iter(samples))
+    (state, info) = model.simulation._solve_sample(sample, target, (), {})
+    return (_get_pickled_bytes((sample, target, (), {}))
+            + _get_pickled_bytes((state, info)))
+
+
+def _get_bytes_shared(samples, target):
+    sample = next(iter(samples))
+    with tempfile.TemporaryDirectory() as dir_:
+        out = numpy.memmap(os.path.join(dir_, 'state'),
+                           dtype = float,
+                           mode = 'w+',
+                           shape = (1,
+                                    len(model.simulation.t),
+                                    len(model.ODEs.variables)))
+        args = (samples.country, samples.values, 0, target, (), {}, out)
+        info = model.simulation._solve_sample_shared(*args)
+        nbytes = _get_pickled_bytes(args) + _get_pickled_bytes(info)
+        del out
+    return nbytes
+
+
+def _run(params, target, nsamples):
+    time_start = time.time()
+    tracemalloc.start()
+    with joblib.Parallel(n_jobs = -1) as parallel:
+        model.simulation._solve_samples(params, 0, nsamples, target,
+                                        (), {}, parallel)
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (time.time() - time_start, peak)
+
+
+def _main(country = 'Nigeria', target = model.target.UNAIDS90(),
+          nsamples = 100):
+    samples = model.parameters.Samples(country)
+    # A plain list goes through the pickles.
+    samples_list = list(itertools.islice(samples, nsamples))
+    results = (
+        ('copied', _get_bytes_copied(samples, target),
+         _run(samples_list, target, nsamples)),
+        ('shared', _get_bytes_shared(samples, target),
+         _run(samples, target, nsamples)),
+    )
+    print('{} samples for {}, {!s}:'.format(nsamples, country, target))
+    for (name, nbytes, (time_, peak)) in results:
+        print('{:>8}: {:7d} bytes per sample, {:.1f} sec, '
+              '{:.1f} MB peak memory in the parent.'.format(
+                  name, nbytes, time_, peak / 1e6))
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,30 @@
+#!/usr/bin/python3
+'''
+Test solving with the control rates switched exactly by
+:mod:`model.sliding_mode` versus smoothed by
+:func:`model.control_rates.ramp` for correctness and speed.
+'''
+
+import sys
+
+sys.path.append('..')
+import model
+
+
+def _main(targets = model.target.all_):
+    for country in model.datasheet.get_country_list():
+        parameters = model.parameters.Mode.from_country(country)
+        for target in targets:
+            comparison = model.sliding_mode.validate(parameters, target)
+            time_ramp = comparison.pop('time_ramp')
+            time_sliding = comparison.pop('time_sliding')
+            (variable, maxrelerr) = max(comparison.items(),
+                                        key = lambda x: x[1])
+            print('{}, {!s}: ramp {:.2f} sec, sliding {:.2f} sec, '
+                  'max relative error = {:g} ({}).'.format(
+                      country, target, time_ramp, time_sliding,
+                      maxrelerr, variable))
+
+
+if __name__ == '__main__':
+    _main()
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+'''
+Test :mod:`model.work_queue` on one host by running several local
+workers on the runs with the modal parameter values
+for a few countries, in a temporary directory.
+'''
+
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.append('..')
+import model
+
+
+def _main(countries = ('Nigeria', 'South Africa', 'Uganda', 'Rwanda'),
+          targets = (model.target.StatusQuo(), model.target.UNAIDS90()),
+          nworkers = 3):
+    with tempfile.TemporaryDirectory() as output_dir:
+        # The workers are forked so they inherit this.
+        model.output_dir.output_dir = output_dir
+        workers = [multiprocessing.Process(target = model.work_queue.work,
+                                           args = (countries, targets),
+                                           kwargs = dict(
+                                               parameters_type = 'mode',
+                                               n_jobs = 1))
+                   for _ in range(nworkers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        for country in countries:
+            for target in targets:
+                assert model.results.exists(country, target, 'mode')
+        for (dirpath, _, filenames) in os.walk(output_dir):
+            for filename in filenames:
+                assert not filename.endswith('.lock'), filename
+    print('All {} runs done by {} workers.'.format(
+        len(countries) * len(targets), nworkers))
+
+
+if __name__ == '__main__':
+    _main()
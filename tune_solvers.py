@@ -0,0 +1,43 @@
+#!/usr/bin/python3
+'''
+Tune the solver settings for each country
+using the modes of the parameter distributions.
+The sample runs of :mod:`run_samples` then use them.
+'''
+
+import joblib
+import pandas
+
+import model
+
+
+def _tune_one(country):
+    print('Tuning {}.'.format(country))
+    try:
+        return model.solver_tuning.tune(country)
+    except RuntimeError as exc:
+        # Leave it on the default settings.
+        print(exc)
+        return None
+
+
+def _main():
+    profiles = model.solver_tuning.load_profiles()
+    countries = [country
+                 for country in model.datasheet.get_country_list()
+                 if country not in profiles]
+    with model.resources.parallel() as parallel:
+        tuned = parallel(joblib.delayed(_tune_one)(country)
+                         for country in countries)
+    profiles.update((country, profile)
+                    for (country, profile) in zip(countries, tuned)
+                    if profile is not None)
+    model.solver_tuning.dump_profiles(profiles)
+    with pandas.option_context('display.width', 200,
+                               'display.max_rows', None,
+                               'display.max_columns', None):
+        print(pandas.DataFrame.from_dict(profiles, orient = 'index'))
+
+
+if __name__ == '__main__':
+    _main()